@@ -0,0 +1,199 @@
+#Headless batch runner
+#   python batch.py manifest.json [-o report.jsonl] [-j workers]
+#
+#A manifest is a JSON object, every run is "defaults" overlaid with one
+#   entry of "runs". A run with a "sweep" expands into one run per
+#   combination of the listed values:
+#
+#   {
+#       "defaults": {"programs": ["bots"], "max_ticks": 10000},
+#       "runs": [
+#           {"name": "hello", "entry": "hello_world"},
+#           {"name": "list", "entry": "main_list_test",
+#            "sweep": {"dimensions": [2,3], "register_count": [2,4]}}
+#       ]
+#   }
+#
+#Programs are compiled once, through the program cache, before the pool
+#   forks, so workers inherit them instead of each compiling its own.
+#   Results are written as JSON lines as runs finish, each with the reason
+#   Simulation.run stopped (see Run_Result) or "error".
+import argparse
+import concurrent.futures
+import io
+import itertools
+import json
+import multiprocessing
+import os
+import sys
+import time
+import traceback
+
+from cell_bots import Simulation, Program_Cache
+from state_hash import State_Hasher
+
+RUN_DEFAULTS = {
+    "name": None,
+    #directories or .cb files, sys_programs are loaded as sys bots
+    "programs": ["bots"],
+    "sys_programs": ["sys_bots"],
+    "entry": None,
+    #defaults to the origin
+    "coords": None,
+    "dimensions": 2,
+    "register_count": 2,
+    "max_ticks": 10000,
+    #seconds of wall clock a run may tick for, None is no limit
+    "timeout": None,
+    #bytes fed to STDIN, given as text or read from a file
+    "stdin": "",
+    "stdin_file": None,
+    #bot name -> path, or [path, writable], see Simulation.map_file
+    "mapped_files": {},
+    #None, "stop" to end a run once its state repeats, or "skip" to jump
+    #   the rest of max_ticks (see state_hash)
+    "cycles": None,
+    #any other Simulation keyword arguments, e.g. jit or fast_forward
+    "sim_args": {},
+}
+
+#(programs, sys_programs) -> {bot name: (Instruction_Set, is_sys)}, filled
+#   in before the pool forks
+PROGRAM_SETS = {}
+
+def expand_runs(manifest):
+    defaults = dict(RUN_DEFAULTS)
+    for key,value in manifest.get("defaults",{}).items():
+        if key not in RUN_DEFAULTS:
+            raise ValueError(f"Unknown run setting: {key}")
+        defaults[key] = value
+
+    runs = []
+    for entry in manifest["runs"]:
+        entry = dict(entry)
+        sweep = entry.pop("sweep",{})
+        for key in list(entry) + list(sweep):
+            if key not in RUN_DEFAULTS:
+                raise ValueError(f"Unknown run setting: {key}")
+        keys = sorted(sweep)
+        for values in itertools.product(*(sweep[key] for key in keys)):
+            run = dict(defaults)
+            run.update(entry)
+            run.update(zip(keys,values))
+            if run["entry"] is None:
+                raise ValueError(f"Run {run['name']} has no entry bot")
+            if keys:
+                run["name"] = f"{run['name'] or run['entry']}[" + ",".join(f"{key}={value}" for key,value in zip(keys,values)) + "]"
+            runs.append(run)
+    return runs
+
+def program_files(paths):
+    for path in paths:
+        if os.path.isdir(path):
+            for file_name in sorted(os.listdir(path)):
+                if file_name.endswith(".cb"):
+                    yield os.path.join(path,file_name)
+        else:
+            yield path
+
+def load_program_sets(runs,cache):
+    for run in runs:
+        key = (tuple(run["programs"]),tuple(run["sys_programs"]))
+        if key in PROGRAM_SETS:
+            continue
+        programs = {}
+        for paths,is_sys in ((run["programs"],False),(run["sys_programs"],True)):
+            for file_path in program_files(paths):
+                bot_name = os.path.basename(file_path).split(".")[0]
+                programs[bot_name] = (cache.load(file_path),is_sys)
+        PROGRAM_SETS[key] = programs
+
+def execute_run(index,run):
+    result = {"index": index,"name": run["name"],"entry": run["entry"],
+              "dimensions": run["dimensions"],"register_count": run["register_count"],
+              "exit_code": None,"reason": None,"period": None,"ticks": 0,"peak_bots": 0,"peak_messages": 0}
+    stdout = io.BytesIO()
+    stderr = io.BytesIO()
+    start = time.perf_counter()
+    sim = None
+    try:
+        sim_args = dict(run["sim_args"])
+        if run["cycles"] is not None:
+            sim_args["hasher"] = State_Hasher(skip_cycles=run["cycles"] == "skip")
+        sim = Simulation(run["dimensions"],run["register_count"],**sim_args)
+        for bot_name,(instruction_set,is_sys) in PROGRAM_SETS[(tuple(run["programs"]),tuple(run["sys_programs"]))].items():
+            if is_sys:
+                sim.add_sys_bot_code(bot_name,instruction_set)
+            else:
+                sim.add_bot_code(bot_name,instruction_set)
+        for bot_name,target in run["mapped_files"].items():
+            path,writable = (target,False) if isinstance(target,str) else target
+            sim.map_file(bot_name,path,writable)
+
+        if run["stdin_file"] is not None:
+            with open(run["stdin_file"],"rb") as stdin_fp:
+                sim.stdin = io.BytesIO(stdin_fp.read())
+        else:
+            sim.stdin = io.BytesIO(run["stdin"].encode())
+        sim.stdout = stdout
+        sim.stderr = stderr
+
+        coords = tuple(run["coords"]) if run["coords"] is not None else (0,) * run["dimensions"]
+        sim.register_bot(run["entry"],coords)
+
+        deadline = None if run["timeout"] is None else time.monotonic() + run["timeout"]
+        outcome = sim.run(max_ticks=run["max_ticks"] - sim.time,deadline=deadline)
+        sim.flush_output()
+        result.update(reason=outcome.reason,exit_code=outcome.exit_code,period=outcome.period,ticks=sim.time,
+                      peak_bots=outcome.peak_bots,peak_messages=outcome.peak_messages)
+    except Exception:
+        result.update(reason="error",error=traceback.format_exc())
+        if sim is not None:
+            result["ticks"] = sim.time
+    finally:
+        #pool workers live on across runs, mapped files mustn't pile up
+        if sim is not None:
+            sim.close()
+
+    result["elapsed"] = round(time.perf_counter() - start,6)
+    #bytes that aren't utf-8 come out as \x escapes
+    result["stdout"] = stdout.getvalue().decode("utf-8","backslashreplace")
+    result["stderr"] = stderr.getvalue().decode("utf-8","backslashreplace")
+    return result
+
+def run_batch(runs,report,workers=None,cache_dir=".cb_cache"):
+    load_program_sets(runs,Program_Cache(cache_dir))
+    reasons = {}
+    #fork, so workers inherit PROGRAM_SETS as already compiled
+    context = multiprocessing.get_context("fork")
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers,mp_context=context) as pool:
+        futures = [pool.submit(execute_run,index,run) for index,run in enumerate(runs)]
+        for future in concurrent.futures.as_completed(futures):
+            result = future.result()
+            reasons[result["reason"]] = reasons.get(result["reason"],0) + 1
+            report.write(json.dumps(result) + "\n")
+            report.flush()
+    return reasons
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run a manifest of cell bot simulations in parallel")
+    parser.add_argument("manifest",help="JSON manifest of runs")
+    parser.add_argument("-o","--output",help="JSONL report, default stdout")
+    parser.add_argument("-j","--workers",type=int,default=None,help="worker processes, default one per CPU")
+    parser.add_argument("--cache-dir",default=".cb_cache",help="compiled program cache")
+    args = parser.parse_args(argv)
+
+    with open(args.manifest,"r") as manifest_fp:
+        runs = expand_runs(json.load(manifest_fp))
+
+    report = open(args.output,"w") if args.output else sys.stdout
+    try:
+        reasons = run_batch(runs,report,args.workers,args.cache_dir)
+    finally:
+        if report is not sys.stdout:
+            report.close()
+    print(f"{len(runs)} runs: " + ", ".join(f"{count} {reason}" for reason,count in sorted(reasons.items())),file=sys.stderr)
+    return 1 if "error" in reasons else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
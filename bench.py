@@ -0,0 +1,634 @@
+#Benchmarks for the cell bot interpreter, run from the repo root
+#   python bench.py                         scenario suite, one table row each
+#   python bench.py --save baseline.json    ...and keep the numbers
+#   python bench.py --compare baseline.json exit 1 on a regression past --threshold
+#   python bench.py --micro                 the micro-benchmarks
+#   python bench.py --profile               the suite with a Profiler attached
+#
+#Profiling off should sit within noise of a baseline saved before the
+#   profiler hooks existed, --compare against one checks exactly that
+#
+#Every scenario runs in a forked child, so peak RSS is its own, and the
+#   best of --repeat runs is kept
+import io
+import os
+import sys
+import json
+import time
+import argparse
+import resource
+import tempfile
+import tracemalloc
+import multiprocessing
+
+import cell_bots
+import checkpoint
+import profiling
+import recording
+import sharding
+import frames
+import state_hash
+from cell_bots import Simulation, Instruction_Set, Program_Cache
+
+#drives a 1_2_list chain forever, alternating writes and reads
+LIST_DRIVER = """
+spawn 1_2_list X+
+put 50 X+
+loop:
+    put 1 X+
+    put 3 X+
+    put 5 X+
+    put 0 X+
+    put 3 X+
+    put Q r0
+    jmp loop
+"""
+
+#fires messages into empty space, nothing ever absorbs them
+FLOOD = """
+loop:
+    put 1 X+
+    put 1 Y+
+    jmp loop
+"""
+
+#copies STDIN to STDOUT, up to 64 bytes per request
+CAT = """
+@qmax 255
+@spawn STDIN X+
+@spawn STDOUT X-
+read:
+    put 64 X+
+    put Q r0
+    teq r0 0
+    +jmp done
+copy:
+    put Q X-
+    sub r0 1 r0
+    teq r0 0
+    -jmp copy
+    jmp read
+done:
+    nop
+    nop
+    nop
+    exec EXIT_SUCCESS
+"""
+
+#walks a mapped file 4 bytes at a time through its own MAPPED_FILE bot
+LOOKUP = """
+@spawn DATA X+
+loop:
+    put 0 X+
+    put r0 X+
+    put 4 X+
+    put Q r1
+    add r0 4 r0
+    jmp loop
+"""
+
+#spawns a bot that dies straight away, forever
+SPAWNER = """
+loop:
+    spawn blip Y+
+    jmp loop
+"""
+
+#one link of a relay chain, forwards whatever reaches it
+RELAY = """
+loop:
+    put Q X+
+    jmp loop
+"""
+
+#feeds a relay chain
+SOURCE = """
+loop:
+    put 1 X+
+    jmp loop
+"""
+
+#register-only arithmetic loop, never talks to anyone
+COMPUTE = """
+loop:
+    add r0 1 r0
+    mul r0 3 r1
+    sub r1 r0 r1
+    tgt r0 1000
+    +put 0 r0
+    jmp loop
+"""
+
+def load_programs(sim,extra=None):
+    for code_dir,add in (("bots",sim.add_bot_code),("sys_bots",sim.add_sys_bot_code)):
+        for bot in sorted(os.listdir(code_dir)):
+            if not bot.endswith(".cb"):
+                continue
+            instr = Instruction_Set()
+            instr.load(os.path.join(code_dir,bot))
+            add(bot.split(".")[0],instr)
+
+    for bot_name,code in (extra or {}).items():
+        instr = Instruction_Set()
+        instr.compile(code.splitlines(True))
+        sim.add_bot_code(bot_name,instr)
+
+def run_ticks(sim,ticks):
+    start = time.perf_counter()
+    for _ in range(ticks):
+        sim.tick()
+        if len(sim.bot_grid) == 0:
+            break
+    return time.perf_counter() - start
+
+def bench_count_to_ten(bot_count=500,rounds=5,**sim_args):
+    #a column of count_to_ten bots, each on its own row
+    elapsed = 0
+    ticks = 0
+    for _ in range(rounds):
+        sim = Simulation(dimensions=2,register_count=2,**sim_args)
+        load_programs(sim)
+        for i in range(bot_count):
+            sim.register_bot("count_to_ten",(0,i * 2))
+        elapsed += run_ticks(sim,1000)
+        ticks += sim.time
+    report("count_to_ten" + label(sim_args),bot_count * ticks,elapsed)
+
+def bench_1_2_list(chain_count=20,ticks=2000,**sim_args):
+    sim = Simulation(dimensions=2,register_count=2,**sim_args)
+    load_programs(sim,{"list_driver":LIST_DRIVER})
+    for i in range(chain_count):
+        sim.register_bot("list_driver",(0,i * 2))
+    elapsed = run_ticks(sim,ticks)
+    report("1_2_list" + label(sim_args),len(sim.bot_grid) * sim.time,elapsed)
+
+def bench_compute(bot_count=200,ticks=500,**sim_args):
+    sim = Simulation(dimensions=2,register_count=2,**sim_args)
+    load_programs(sim,{"compute":COMPUTE})
+    for i in range(bot_count):
+        sim.register_bot("compute",(0,i))
+    elapsed = run_ticks(sim,ticks)
+    report("compute" + label(sim_args),bot_count * sim.time,elapsed)
+
+def label(sim_args):
+    return "".join("/" + key for key,value in sim_args.items() if value)
+
+def bench_message_flood(bot_count=20,ticks=600,message_backend="python"):
+    sim = Simulation(dimensions=2,register_count=2,message_backend=message_backend)
+    load_programs(sim,{"flood":FLOOD})
+    for i in range(bot_count):
+        sim.register_bot("flood",(-i * 1000,i * 1000))
+    moved = 0
+    start = time.perf_counter()
+    for _ in range(ticks):
+        moved += len(sim.messages)
+        sim.tick()
+    elapsed = time.perf_counter() - start
+    print(f"{'flood/' + message_backend:<28} {elapsed:8.3f}s {moved / elapsed:12.0f} messages moved/s")
+
+def bench_bot_memory(bot_count=20000):
+    #bytes allocated per live bot, measured right after spawning and after
+    #   every bot has run a few instructions
+    sim = Simulation(dimensions=2,register_count=2)
+    load_programs(sim,{"idle":"put Q r0\n"})
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    for i in range(bot_count):
+        sim.register_bot("idle",(i,0))
+    spawned = tracemalloc.get_traced_memory()[0]
+    sim.tick()
+    ticked = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    print(f"{'bot_memory':<28} {(spawned - before) / bot_count:8.0f} bytes/bot spawned {(ticked - before) / bot_count:8.0f} bytes/bot blocked")
+
+def bench_spawns(bot_count=2000,ticks=200):
+    #spawn and exec churn, spawns/s and how many bot objects were built
+    programs = {"spawner":SPAWNER,"blip":"die\n","ping":"exec pong\n","pong":"exec ping\n"}
+    built = [0]
+    init = cell_bots.Cell_Bot.__init__
+    def counting_init(bot,*args,**kwargs):
+        built[0] += 1
+        init(bot,*args,**kwargs)
+
+    for bot_name in ("spawner","ping"):
+        sim = Simulation(dimensions=2,register_count=2)
+        load_programs(sim,programs)
+        for i in range(bot_count):
+            sim.register_bot(bot_name,(i * 2,0))
+        first_id = sim.bot_id_itr
+        built[0] = 0
+        cell_bots.Cell_Bot.__init__ = counting_init
+        try:
+            elapsed = run_ticks(sim,ticks)
+        finally:
+            cell_bots.Cell_Bot.__init__ = init
+        spawns = sim.bot_id_itr - first_id
+        print(f"{'spawns/' + bot_name:<28} {elapsed:8.3f}s {spawns / elapsed:12.0f} spawns/s {built[0]:10d} bots built")
+
+def bench_stream(byte_count=20000):
+    #CAT between two in-memory files, counting calls that reach the output
+    class Counting_Output(io.BytesIO):
+        writes = 0
+        def write(self,data):
+            Counting_Output.writes += 1
+            return super().write(data)
+
+    data = bytes(range(256)) * (byte_count // 256)
+    sim = Simulation(dimensions=2,register_count=2)
+    load_programs(sim,{"cat":CAT})
+    sim.stdin = io.BytesIO(data)
+    sim.stdout = Counting_Output()
+    sim.register_bot("cat",(0,0))
+    start = time.perf_counter()
+    assert sim.run().reason == "exit"
+    elapsed = time.perf_counter() - start
+    assert sim.stdout.getvalue() == data
+    print(f"{'stream':<28} {elapsed:8.3f}s {len(data) / elapsed:12.0f} bytes/s {Counting_Output.writes:8} writes")
+
+def bench_mapped_file(bot_count=200,ticks=500,file_size=1 << 24):
+    #every reader shares one mapping, nothing is streamed through STDIN
+    with tempfile.NamedTemporaryFile() as data_file:
+        data_file.truncate(file_size)
+        sim = Simulation(dimensions=2,register_count=2)
+        load_programs(sim,{"lookup":LOOKUP})
+        sim.map_file("DATA",data_file.name)
+        for i in range(bot_count):
+            sim.register_bot("lookup",(0,i * 2))
+        elapsed = run_ticks(sim,ticks)
+        lookups = sum(bot.registers[0] // 4 for bot in sim.bot_grid.values() if bot.bot_name == "lookup")
+        print(f"{'mapped_file':<28} {elapsed:8.3f}s {lookups / elapsed:12.0f} lookups/s")
+
+def bench_checkpoint(bot_count=20000,ticks=20):
+    #full save, a delta after a few ticks, and restoring both, half the bots
+    #   sit blocked and only show up in the full checkpoint
+    sim = Simulation(dimensions=2,register_count=2)
+    load_programs(sim,{"compute":COMPUTE,"idle":"put Q r0\n"})
+    for i in range(bot_count):
+        sim.register_bot("compute" if i % 2 else "idle",(0,i * 2))
+    run_ticks(sim,ticks)
+    checkpointer = checkpoint.Checkpointer(sim)
+    files = []
+    for kind in ("full","delta"):
+        buffer = io.BytesIO()
+        start = time.perf_counter()
+        checkpointer.save(buffer)
+        elapsed = time.perf_counter() - start
+        files.append(buffer.getvalue())
+        print(f"{'checkpoint/' + kind:<28} {elapsed:8.3f}s {len(buffer.getvalue()) / bot_count:12.1f} bytes/bot")
+        run_ticks(sim,ticks)
+    start = time.perf_counter()
+    checkpoint.restore([io.BytesIO(data) for data in files],sim.bot_code)
+    elapsed = time.perf_counter() - start
+    print(f"{'checkpoint/restore':<28} {elapsed:8.3f}s {bot_count / elapsed:12.0f} bots/s")
+
+def bench_recording(chain_count=20,ticks=20000,keyframe_every=4096):
+    #1_2_list chains under a Recorder, then rebuilding the last tick from
+    #   its keyframe against re-simulating from the start
+    sim = Simulation(dimensions=2,register_count=2)
+    load_programs(sim,{"list_driver":LIST_DRIVER})
+    for i in range(chain_count):
+        sim.register_bot("list_driver",(0,i * 2))
+    buffer = io.BytesIO()
+    recorder = recording.Recorder(sim,buffer,keyframe_every=keyframe_every)
+    elapsed = run_ticks(sim,ticks)
+    recorder.close()
+    print(f"{'recording':<28} {elapsed:8.3f}s {len(buffer.getvalue()) / ticks:12.1f} bytes/tick")
+
+    buffer.seek(0)
+    start = time.perf_counter()
+    frame = recording.Recording(buffer).frame(ticks - 1)
+    elapsed = time.perf_counter() - start
+    assert len(frame.grid) == len(sim.bot_grid)
+    print(f"{'recording/seek':<28} {elapsed:8.3f}s {ticks / elapsed:12.0f} ticks/s reached")
+
+def bench_frames(chain_count=20,ticks=2000,size=1024):
+    #1_2_list chains drawn into a size x size viewport, a tick should cost
+    #   what changed in it, not the million pixels
+    class Null_Sink:
+        def write(self,tick,exporter,changes):
+            pass
+        def close(self):
+            pass
+
+    for export in (False,True):
+        sim = Simulation(dimensions=2,register_count=2)
+        load_programs(sim,{"list_driver":LIST_DRIVER})
+        for i in range(chain_count):
+            sim.register_bot("list_driver",(0,i * 2))
+        if export:
+            frames.Frame_Exporter(sim,frames.Viewport((-size // 2,-size // 2),size,size),Null_Sink())
+        elapsed = run_ticks(sim,ticks)
+        print(f"{'frames' if export else 'frames/off':<28} {elapsed:8.3f}s {ticks / elapsed:12.0f} ticks/s")
+
+def bench_box_queries(bot_count=200000,queries=2000,size=32):
+    #size x size boxes over a 2000 x 2000 colony, chunks against scanning
+    #   every bot, and what keeping the chunks up to date costs per spawn
+    import random
+    rng = random.Random(1)
+    cells = list({(rng.randrange(2000),rng.randrange(2000)): None for _ in range(bot_count)})
+    index = cell_bots.Chunk_Index(2)
+
+    start = time.perf_counter()
+    for coords in cells:
+        index.add(coords,coords)
+    for coords in cells:
+        index.remove(coords)
+    for coords in cells:
+        index.add(coords,coords)
+    upkeep = time.perf_counter() - start
+
+    found = 0
+    start = time.perf_counter()
+    for x,y in cells[:queries]:
+        found += index.count((x,y),(x + size,y + size))
+    box_time = time.perf_counter() - start
+
+    #a handful of full scans, scaled up to the same number of queries
+    start = time.perf_counter()
+    for x,y in cells[:queries // 400]:
+        found += sum(1 for bx,by in cells if x <= bx < x + size and y <= by < y + size)
+    scan_time = (time.perf_counter() - start) * 400
+    print(f"{'chunks/add+remove':<28} {upkeep:8.3f}s {3 * len(cells) / upkeep:12.0f} ops/s")
+    print(f"{'chunks/box':<28} {box_time:8.3f}s {queries / box_time:12.0f} queries/s")
+    print(f"{'chunks/scan':<28} {scan_time:8.3f}s {queries / scan_time:12.0f} queries/s")
+
+def bench_program_cache(program_count=300):
+    #a library of distinct programs, compiled cold then loaded from the cache
+    programs = [(COMPUTE + f"    put {i} r1\n" + LIST_DRIVER.replace("loop","drive")).splitlines(True) for i in range(program_count)]
+    with tempfile.TemporaryDirectory() as cache_dir:
+        for kind in ("cold","warm"):
+            cache = Program_Cache(cache_dir)
+            start = time.perf_counter()
+            for code in programs:
+                cache.compile(code)
+            elapsed = time.perf_counter() - start
+            print(f"{'program_cache/' + kind:<28} {elapsed:8.3f}s {program_count / elapsed:12.0f} programs/s")
+
+def generate_program(line_count):
+    #every syntax form the compiler takes: labels, @ and +/- prefixes,
+    #   comments, D- and X-style directions, blank lines
+    lines = []
+    for i in range(line_count // 10):
+        lines += [
+            f"# block {i}\n",
+            f"block_{i}:\n",
+            f"    @put {i} r0\n",
+            "    add r0 1 r0\n",
+            "    tgt r0 1000\n",
+            f"    +jmp block_{(i + 1) % (line_count // 10)}\n",
+            "    -put r0 D1+\n",
+            "    put Q r1 # read\n",
+            "    spawn count_to_ten X-\n",
+            f"    jmp block_{i // 2}\n",
+        ]
+    return lines
+
+def bench_compile(line_count=100000):
+    code = generate_program(line_count)
+    start = time.perf_counter()
+    Instruction_Set().compile(code)
+    elapsed = time.perf_counter() - start
+    print(f"{'compile':<28} {elapsed:8.3f}s {line_count / elapsed:12.0f} lines/s")
+
+def report(name,bot_ticks,elapsed):
+    print(f"{name:<28} {elapsed:8.3f}s {bot_ticks / elapsed:12.0f} bot ticks/s")
+
+class Counting_Simulation(Simulation):
+    #Simulation that counts bot slots and messages in flight, once per tick
+    def __init__(self,*args,**kwargs):
+        super().__init__(*args,**kwargs)
+        self.instructions = 0
+        self.messages_moved = 0
+
+    def tick(self):
+        self.messages_moved += len(self.messages)
+        super().tick()
+
+    def prepare_runnable(self):
+        super().prepare_runnable()
+        self.instructions += len(self.runnable)
+
+def compiled_programs(extra=None):
+    #(bot name, Instruction_Set, is_sys), compiled once and shared by every round
+    sim = Simulation(dimensions=2,register_count=2)
+    load_programs(sim,extra)
+    return [(bot_name,instr,bot_name in sim.system_bots) for bot_name,instr in sim.bot_code.items()]
+
+def run_scenario(bot_name,copies,ticks,rounds=1,extra=None,spacing=2,**sim_args):
+    #rounds of copies bots in a column, ticked until they exit, the grid
+    #   empties or ticks run out, only the ticking is timed
+    programs = compiled_programs(extra)
+    sims = []
+    elapsed = 0
+    for _ in range(rounds):
+        sim = Counting_Simulation(dimensions=2,register_count=2,**sim_args)
+        for name,instr,is_sys in programs:
+            (sim.add_sys_bot_code if is_sys else sim.add_bot_code)(name,instr)
+        sim.stdout = io.BytesIO()
+        for i in range(copies):
+            sim.register_bot(bot_name,(0,i * spacing))
+        start = time.perf_counter()
+        try:
+            for _ in range(ticks):
+                sim.tick()
+                if len(sim.bot_grid) == 0:
+                    break
+        except SystemExit:
+            pass
+        elapsed += time.perf_counter() - start
+        sims.append(sim)
+    return sim_metrics(sims,elapsed)
+
+def sim_metrics(sims,elapsed):
+    return {
+        "seconds": elapsed,
+        "ticks_per_s": sum(sim.time for sim in sims) / elapsed,
+        "instructions_per_s": sum(sim.instructions for sim in sims) / elapsed,
+        "messages_per_s": sum(sim.messages_moved for sim in sims) / elapsed,
+    }
+
+def scenario_relay_chain(length=2000,ticks=400,**sim_args):
+    sim = Counting_Simulation(dimensions=2,register_count=2,**sim_args)
+    load_programs(sim,{"relay":RELAY,"source":SOURCE})
+    sim.register_bot("source",(0,0))
+    for i in range(length):
+        sim.register_bot("relay",(i + 1,0))
+    return sim_metrics([sim],run_ticks(sim,ticks))
+
+def scenario_compile(line_count=100000):
+    start = time.perf_counter()
+    for code_dir in ("bots","sys_bots"):
+        for bot in os.listdir(code_dir):
+            if bot.endswith(".cb"):
+                Instruction_Set().load(os.path.join(code_dir,bot))
+    code = generate_program(line_count)
+    Instruction_Set().compile(code)
+    elapsed = time.perf_counter() - start
+    return {"seconds": elapsed,"lines_per_s": line_count / elapsed}
+
+def scenario_slabs(workers=0,columns=256,rows=100,ticks=30,**sim_args):
+    #a block of compute bots spanning eight slabs along X, in one process or
+    #   sharded over workers, the first tick forks them and isn't timed.
+    #   Peak RSS only covers the coordinator
+    if workers:
+        sim = sharding.Sharded_Simulation(2,2,workers=workers,slab_width=columns // 8,**sim_args)
+    else:
+        sim = Simulation(dimensions=2,register_count=2,**sim_args)
+    load_programs(sim,{"compute":COMPUTE})
+    for x in range(columns):
+        for y in range(rows):
+            sim.register_bot("compute",(x,y))
+    sim.tick()
+    start = time.perf_counter()
+    for _ in range(ticks):
+        sim.tick()
+    elapsed = time.perf_counter() - start
+    if workers:
+        sim.close()
+    #compute bots never block, every one runs every tick
+    return {"seconds": elapsed,"ticks_per_s": ticks / elapsed,"instructions_per_s": columns * rows * ticks / elapsed}
+
+#name -> function(**sim_args) returning its metrics
+SCENARIOS = {
+    "hello_world": lambda **sim_args: run_scenario("hello_world",1,1000,rounds=200,**sim_args),
+    "main_list_test": lambda **sim_args: run_scenario("main_list_test",1,1000,rounds=100,**sim_args),
+    "spawn_and_wait": lambda **sim_args: run_scenario("spawn_and_wait",2000,100,**sim_args),
+    "count_to_ten": lambda **sim_args: run_scenario("count_to_ten",2000,1000,**sim_args),
+    "1_2_list": lambda **sim_args: run_scenario("list_driver",20,2000,extra={"list_driver":LIST_DRIVER},**sim_args),
+    "spawners": lambda **sim_args: run_scenario("spawner",2000,200,extra={"spawner":SPAWNER,"blip":"die\n"},**sim_args),
+    "flood": lambda **sim_args: run_scenario("flood",200,300,extra={"flood":FLOOD},spacing=1000,**sim_args),
+    "relay_chain": scenario_relay_chain,
+    "slabs": scenario_slabs,
+    "slabs/sharded": lambda **sim_args: scenario_slabs(workers=4,**sim_args),
+    "compile": lambda **sim_args: scenario_compile(),
+}
+
+#metric -> 1 when bigger is better, -1 when smaller is
+METRICS = {
+    "ticks_per_s": 1,
+    "instructions_per_s": 1,
+    "messages_per_s": 1,
+    "lines_per_s": 1,
+    "peak_rss_kb": -1,
+}
+
+def measure_child(name,sim_args,connection,profile=False):
+    if profile:
+        sim_args = dict(sim_args,profiler=profiling.Profiler())
+    metrics = SCENARIOS[name](**sim_args)
+    #kilobytes on linux
+    metrics["peak_rss_kb"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    connection.send(metrics)
+    connection.close()
+
+def measure(name,repeat=3,sim_args=None,profile=False):
+    #best of repeat runs, each in its own forked child
+    context = multiprocessing.get_context("fork")
+    best = None
+    for _ in range(repeat):
+        parent,child = context.Pipe()
+        process = context.Process(target=measure_child,args=(name,sim_args or {},child,profile))
+        process.start()
+        metrics = parent.recv()
+        process.join()
+        if best is None:
+            best = metrics
+            continue
+        for metric,value in metrics.items():
+            if METRICS.get(metric,0) > 0:
+                best[metric] = max(best[metric],value)
+            elif METRICS.get(metric,0) < 0:
+                best[metric] = min(best[metric],value)
+    return best
+
+def run_suite(names,repeat=3,sim_args=None,profile=False):
+    results = {}
+    print(f"{'scenario':<20} {'ticks/s':>12} {'instr/s':>12} {'messages/s':>12} {'lines/s':>12} {'peak RSS':>10}")
+    for name in names:
+        metrics = results[name] = measure(name,repeat,sim_args,profile)
+        columns = [f"{metrics[metric]:12.0f}" if metric in metrics else f"{'-':>12}"
+                   for metric in ("ticks_per_s","instructions_per_s","messages_per_s","lines_per_s")]
+        print(f"{name:<20} " + " ".join(columns) + f" {metrics['peak_rss_kb'] / 1024:8.1f}MB")
+    return results
+
+def find_regressions(baseline,results,threshold):
+    #(scenario, metric, baseline value, new value) past threshold either way
+    regressions = []
+    for name,metrics in results.items():
+        for metric,direction in METRICS.items():
+            if metric not in metrics or metric not in baseline.get(name,{}):
+                continue
+            old = baseline[name][metric]
+            new = metrics[metric]
+            if direction > 0 and new < old * (1 - threshold):
+                regressions.append((name,metric,old,new))
+            elif direction < 0 and new > old * (1 + threshold):
+                regressions.append((name,metric,old,new))
+    return regressions
+
+def micro():
+    bench_count_to_ten()
+    bench_count_to_ten(jit=True)
+    bench_count_to_ten(profiler=profiling.Profiler())
+    bench_1_2_list()
+    bench_1_2_list(jit=True)
+    bench_1_2_list(profiler=profiling.Profiler())
+    bench_1_2_list(hasher=state_hash.State_Hasher())
+    bench_compute()
+    bench_compute(jit=True)
+    bench_compute(fast_forward=256)
+    bench_compute(jit=True,fast_forward=256)
+    bench_message_flood()
+    if cell_bots.numpy is not None:
+        bench_message_flood(message_backend="numpy")
+    bench_bot_memory()
+    bench_spawns()
+    bench_stream()
+    bench_mapped_file()
+    bench_checkpoint()
+    bench_recording()
+    bench_frames()
+    bench_box_queries()
+    bench_compile()
+    bench_program_cache()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Cell bot benchmark suite")
+    parser.add_argument("--micro",action="store_true",help="run the micro-benchmarks instead")
+    parser.add_argument("--only",help="comma separated scenarios, default all")
+    parser.add_argument("--repeat",type=int,default=3,help="runs per scenario, the best is kept")
+    parser.add_argument("--sim-args",default="{}",help="JSON Simulation keyword arguments, e.g. '{\"jit\": true}'")
+    parser.add_argument("--profile",action="store_true",help="attach a profiling.Profiler to every simulation")
+    parser.add_argument("--save",help="write results as a JSON baseline")
+    parser.add_argument("--compare",help="JSON baseline to check for regressions")
+    parser.add_argument("--threshold",type=float,default=0.15,help="allowed fractional regression")
+    args = parser.parse_args(argv)
+
+    if args.micro:
+        micro()
+        return 0
+
+    names = args.only.split(",") if args.only else list(SCENARIOS)
+    for name in names:
+        if name not in SCENARIOS:
+            parser.error(f"unknown scenario {name}, expected one of {', '.join(SCENARIOS)}")
+    sim_args = json.loads(args.sim_args)
+    results = run_suite(names,args.repeat,sim_args,args.profile)
+
+    if args.save:
+        with open(args.save,"w") as baseline_fp:
+            json.dump({"sim_args": sim_args,"profile": args.profile,"scenarios": results},baseline_fp,indent=2,sort_keys=True)
+
+    if args.compare:
+        with open(args.compare,"r") as baseline_fp:
+            baseline = json.load(baseline_fp)["scenarios"]
+        regressions = find_regressions(baseline,results,args.threshold)
+        for name,metric,old,new in regressions:
+            print(f"REGRESSION {name} {metric}: {old:.0f} -> {new:.0f} ({(new - old) / old:+.1%})")
+        if regressions:
+            return 1
+        print(f"no regressions past {args.threshold:.0%}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,22 +1,122 @@
+import io
+import os
 import re
 import sys
+import mmap
+import time
+import stat
+import copy
+import codecs
+import marshal
+import hashlib
 import logging
+import itertools
+import operator
+
+try:
+    import numpy
+except ImportError:
+    #optional, only needed for message_backend="numpy"
+    numpy = None
 
 class Simulation:
-    def __init__(self,dimensions,register_count):
+    def __init__(self,dimensions,register_count,message_backend="python",tracer=None,jit=False,fast_forward=0,profiler=None,hasher=None):
         self.dimensions = dimensions
         self.register_count = register_count
         
         #indexs bots by location
         self.bot_grid = {}
+        #Chunk_Index of bot_grid for region queries, built by the first one
+        #   and kept up to date by register_bot and kill from then on
+        self.bot_chunks = None
 
         #set of live bots and their ids
         self.bot_id_set = set()
-        self.messages = []
+        if message_backend == "python":
+            self.messages = Message_Transport(dimensions)
+        elif message_backend == "numpy":
+            self.messages = Numpy_Message_Transport(dimensions)
+        else:
+            raise ValueError(f"Unknown message backend: {message_backend}")
+        self.add_coords = coord_adder(dimensions)
+
+        #Default heading of X+, shared by every bot spawned without one
+        heading = [0] * dimensions
+        if len(heading) >= 1:
+            heading[0] = 1
+        self.default_heading = tuple(heading)
+        #registers of a newly spawned bot
+        self.zero_registers = (0,) * register_count
+
+        #bumped whenever a bot is added to or removed from bot_grid
+        self.grid_version = 0
+        #bot coords by axis line for quiescent, rebuilt when the grid changes
+        self.ray_index = None
+        self.ray_index_version = None
+
+        #optional tracing.Tracer, sampled once per tick
+        self.tracer = tracer
+
+        #optional profiling.Profiler, an observer that tick and tick_bot
+        #   also time and count for
+        self.profiler = profiler
+
+        #compile added programs down to python closures, see Instruction_Set.jit
+        self.jit = jit
+
+        #file handles for the STDIN/STDOUT/STDERR sys bots, None means use
+        #   whatever sys.stdin/sys.stdout/sys.stderr are when the bot spawns
+        self.stdin = None
+        self.stdout = None
+        self.stderr = None
+
+        #Byte_Sink/Byte_Source per file handle, shared by every sys bot using it
+        self.sinks = {}
+        self.sources = {}
+        #bot name -> File_Map, the only files MAPPED_FILE bots can reach
+        self.file_maps = {}
+        #buffered output is written out at the end of the first tick it
+        #   reaches this many bytes, at __EXIT__, and once the grid is empty
+        #   terminals and pipes get it at the end of every tick that wrote
+        self.flush_size = 1 << 16
+
+        #max instructions a bot may run in one slot while nothing it does
+        #   can be seen by anyone else, 0 keeps strict lock-step
+        self.fast_forward = fast_forward
+        #bots that ran ahead, keyed by the tick they execute next
+        self.sleeping = {}
+        if tracer is not None:
+            tracer.check_simulation(self)
+
+        #optional state_hash.State_Hasher, an observer that lets run stop at,
+        #   or skip over, a repeating state
+        self.hasher = hasher
+        if hasher is not None:
+            hasher.check_simulation(self)
+
+        #Observer instances told about spawns, deaths, messages, moves and
+        #   sys bot I/O as they happen, see recording and frames. The
+        #   profiler and hasher go first
+        self.observers = []
+        if profiler is not None:
+            self.observers.append(profiler)
+        if hasher is not None:
+            self.observers.append(hasher)
+
+        #live bots by id, split into bots that can execute this tick and
+        #   bots parked on a Q read until recv fills their remaining args
+        self.runnable = {}
+        self.blocked = {}
+        self.runnable_sorted = True
 
         self.bot_id_itr = 0
 
-        self.recently_deceased = set()
+        #Cell_Bots that died this tick, the tick loop may still hold them so
+        #   they only join bot_pool once it ends
+        self.recently_deceased = []
+        #dead Cell_Bots register_bot restarts instead of building new ones
+        self.bot_pool = []
+        self.bot_pool_limit = 1 << 16
         self.bot_code = {}
         self.bot_type_counts = {}
         self.time = 0
@@ -30,14 +130,97 @@ class Simulation:
         
         
 
-    def run(self):
-        while True:
-            self.print_summary()
-            self.tick()
-            if len(self.bot_grid) == 0:
-                break
-            #input()
-        logging.debug("Done.")
+    def run(self,max_ticks=None,deadline=None):
+        #tick until the grid empties, a bot exits, nothing can ever happen
+        #   again, the state starts repeating (with a hasher), max_ticks more
+        #   ticks have run or time.monotonic() passes deadline, returns a
+        #   Run_Result saying which
+        #decide once, the summary is too expensive to build and throw away
+        summarize = logging.getLogger().isEnabledFor(logging.DEBUG)
+        last_tick = None if max_ticks is None else self.time + max_ticks
+        result = Run_Result(self.time)
+        result.peak_bots = len(self.bot_grid)
+        start = time.perf_counter()
+        try:
+            while True:
+                if len(self.bot_grid) == 0:
+                    result.reason = "empty"
+                    break
+                #only worth looking for once every bot is parked
+                if not self.runnable and not self.sleeping and self.quiescent():
+                    result.reason = "quiescent"
+                    break
+                if last_tick is not None and self.time >= last_tick:
+                    result.reason = "max_ticks"
+                    break
+                if deadline is not None and time.monotonic() >= deadline:
+                    result.reason = "deadline"
+                    break
+                if self.hasher is not None and self.hasher.cycle is not None:
+                    result.period = self.hasher.cycle[1]
+                    if last_tick is None or not self.hasher.can_skip(self):
+                        result.reason = "cycle"
+                        break
+                    #whole periods are jumped, the rest is ticked
+                    self.hasher.skip(self,last_tick - self.time)
+                    if self.time >= last_tick:
+                        continue
+
+                if summarize:
+                    self.print_summary()
+                if self.tracer is not None and self.tracer.wants(self.time):
+                    self.tracer.trace(self)
+                self.tick()
+                if len(self.bot_grid) > result.peak_bots:
+                    result.peak_bots = len(self.bot_grid)
+                if len(self.messages) > result.peak_messages:
+                    result.peak_messages = len(self.messages)
+        except SystemExit as e:
+            result.reason = "exit"
+            result.exit_code = e.code
+        finally:
+            #whatever stopped the run, nothing printed so far is held back
+            self.flush_output()
+        result.ticks = self.time - result.ticks
+        result.elapsed = time.perf_counter() - start
+        logging.debug("Done, %s.",result)
+        return result
+
+    def quiescent(self):
+        #True when no bot can run and no message in flight will ever reach a
+        #   bot, nothing moves until something outside the simulation changes
+        if self.runnable or self.sleeping:
+            return False
+        if not self.messages:
+            return True
+        if self.ray_index_version != self.grid_version:
+            self.ray_index = ray_index(self.bot_grid.keys())
+            self.ray_index_version = self.grid_version
+        for coords,velocity,_,_,expires in self.messages:
+            #a message is checked where it is and then after each move, the
+            #   move on its expiry tick is its last
+            moves = None if expires is None else expires - self.time + 1
+            if ray_hits(self.ray_index,self.bot_grid,coords,velocity,moves):
+                return False
+        return True
+
+    def chunk_index(self):
+        if self.bot_chunks is None:
+            self.bot_chunks = Chunk_Index(self.dimensions)
+            for coords,bot in self.bot_grid.items():
+                self.bot_chunks.add(coords,bot)
+        return self.bot_chunks
+
+    def bots_in_box(self,low,high):
+        #bots with low <= coords < high on every axis, in no set order
+        return self.chunk_index().box(low,high)
+
+    def count_bots(self,low,high):
+        return self.chunk_index().count(low,high)
+
+    def neighbours(self,coords,radius=1):
+        #bots within radius cells of coords on every axis, not counting it
+        return self.chunk_index().neighbours(coords,radius)
 
     def print_summary(self):
             logging.debug(f"Step {self.time}:")
@@ -52,7 +235,7 @@ class Simulation:
             """
             logging.debug("Bot Listing")
             for bot in self.bot_grid.values():
-                logging.debug(f"\t{bot.bot_name} id:{bot.id} ip@{bot.instr_ptr} R:{bot.registers} Q:{bot.queue} coords:{bot.coords} arg_buf:{bot.arg_buffer}")
+                logging.debug(f"\t{bot.bot_name} id:{bot.id} ip@{bot.instr_ptr} R:{bot.registers} Q:{bot.queue_values()} coords:{bot.coords} arg_buf:{bot.arg_buffer}")
                 logging.debug(f"\t\t{bot.instruction_list[bot.instr_ptr]}")
             logging.debug("_________________\n\n")
 
@@ -60,130 +243,855 @@ class Simulation:
     def add_bot_code(self,bot_name,instruction_list):
         assert bot_name not in self.system_bots
         assert bot_name not in self.bot_code
-        self.bot_code[bot_name] = instruction_list
+        instruction_list.bind(Cell_Bot)
+        self.bot_code[bot_name] = instruction_list.for_tier(self.jit)
 
     def add_sys_bot_code(self,bot_name,instruction_list):
         assert bot_name not in self.system_bots
         self.system_bots.add(bot_name)
-        self.bot_code[bot_name] = instruction_list
+        instruction_list.bind(Sys_Cell_Bot)
+        self.bot_code[bot_name] = instruction_list.for_tier(self.jit)
+
+    def map_file(self,bot_name,path,writable=False):
+        #spawning bot_name gives a MAPPED_FILE bot with random access to path
+        #   bots only ever name entries of this table, never paths
+        assert "MAPPED_FILE" in self.system_bots
+        assert bot_name not in self.bot_code and bot_name not in self.file_maps
+        self.file_maps[bot_name] = File_Map(path,writable)
 
     def register_bot(self,bot_name,coords,heading=None):
-        if bot_name in self.system_bots:
+        if bot_name in self.file_maps:
+            bot_obj = Sys_Cell_Bot("MAPPED_FILE",coords,self,heading=heading)
+            bot_obj.file_map = self.file_maps[bot_name]
+            bot_obj.stream = bot_name
+
+        elif bot_name in self.system_bots:
             sys_call = bot_name 
             if sys_call == "STDIN":
                 #set file handle to sys.stdin,READ ONLY
                 bot_obj = Sys_Cell_Bot("READ_FILE",coords,self,heading=heading)
-                bot_obj.give_file_handle(sys.stdin.buffer)
+                bot_obj.give_file_handle(self.stdin if self.stdin is not None else sys.stdin.buffer)
+                bot_obj.stream = "STDIN"
 
             elif sys_call == "STDOUT":
                 #set file handle to sys.stdout,WRITE ONLY
                 bot_obj = Sys_Cell_Bot("WRITE_FILE",coords,self,heading=heading)
-                bot_obj.give_file_handle(sys.stdout)
+                bot_obj.give_file_handle(self.stdout if self.stdout is not None else sys.stdout)
+                bot_obj.stream = "STDOUT"
 
             elif sys_call == "STDERR":
                 #set file handle to sys.stderr,WRITE ONLY
                 bot_obj = Sys_Cell_Bot("WRITE_FILE",coords,self,heading=heading)
-                bot_obj.give_file_handle(sys.stderr)
+                bot_obj.give_file_handle(self.stderr if self.stderr is not None else sys.stderr)
+                bot_obj.stream = "STDERR"
             else:
                 bot_obj = Sys_Cell_Bot(bot_name,coords,self,heading=heading)
+        elif self.bot_pool:
+            bot_obj = self.bot_pool.pop()
+            bot_obj.reset(bot_name,coords,heading)
         else:
-            assert bot_name in self.bot_code
             bot_obj = Cell_Bot(bot_name,coords,self,heading=heading)
-            
 
         if coords in self.bot_grid:
             #bot is overlapping another bot, kill it
             self.kill(self.bot_grid[bot_obj.coords])
 
         bot_obj.id = self.bot_id_itr
-        self.bot_grid[bot_obj.coords] = bot_obj
         self.bot_type_counts[bot_obj.bot_name] = self.bot_type_counts.get(bot_obj.bot_name,0) + 1
         self.bot_id_itr += 1
+        self.place_bot(bot_obj)
         return self.bot_id_itr
 
-    def register_message(self,message):
-        self.messages.append(message)
-        return 0
+    def place_bot(self,bot_obj,blocked=False,wake_tick=None):
+        #put a numbered bot on an empty cell, in the table it runs from, and
+        #   tell everything watching the grid. register_bot places new bots,
+        #   checkpoint.restore places saved ones blocked or asleep as they were
+        self.bot_grid[bot_obj.coords] = bot_obj
+        if self.bot_chunks is not None:
+            self.bot_chunks.add(bot_obj.coords,bot_obj)
+        self.grid_version += 1
+        if wake_tick is not None:
+            self.sleeping.setdefault(wake_tick,[]).append(bot_obj)
+        elif blocked:
+            self.blocked[bot_obj.id] = bot_obj
+            if self.profiler is not None:
+                self.profiler.blocked(bot_obj,self.time)
+        else:
+            self.runnable[bot_obj.id] = bot_obj
+        for observer in self.observers:
+            observer.spawned(self,bot_obj)
+
+    def register_message(self,coords,velocity,value,kill=False,ttl=0):
+        #a message moves ttl times before it expires, ttl 0 never expires
+        expires = self.time + ttl if ttl > 0 else None
+        self.messages.add(coords,velocity,value,kill,expires)
+        if self.observers:
+            for observer in self.observers:
+                observer.sent(self,coords,velocity,value,kill,expires)
+
+    def crush(self,coords):
+        #whatever bot is at coords gets crushed
+        if coords in self.bot_grid:
+            logging.debug("Crushed a bot at %s",coords)
+            self.bot_grid[coords].die()
 
-    def kill(self,bot_obj):
+    def kill(self,bot_obj,recycle=True):
         bot_obj.dead = True
-        self.recently_deceased.add(bot_obj.id)
         self.bot_type_counts[bot_obj.bot_name] -= 1
         del self.bot_grid[bot_obj.coords]
-
+        if self.bot_chunks is not None:
+            self.bot_chunks.remove(bot_obj.coords)
+        self.grid_version += 1
+        listed = self.runnable.pop(bot_obj.id,None) or self.blocked.pop(bot_obj.id,None)
+        #a bot on neither list ran ahead and sleeping still holds it, that
+        #   one is left to the GC
+        if recycle and listed is not None and type(bot_obj) is Cell_Bot:
+            self.recently_deceased.append(bot_obj)
+        for observer in self.observers:
+            observer.died(self,bot_obj)
+
+    def block(self,bot_obj):
+        del self.runnable[bot_obj.id]
+        self.blocked[bot_obj.id] = bot_obj
+        if self.profiler is not None:
+            self.profiler.blocked(bot_obj,self.time)
+
+    def wake(self,bot_obj):
+        del self.blocked[bot_obj.id]
+        if self.profiler is not None:
+            self.profiler.woke(bot_obj,self.time)
+        self.runnable[bot_obj.id] = bot_obj
+        #woken bots are out of id order until the next tick re-sorts
+        self.runnable_sorted = False
 
     def tick(self):
+        profiler = self.profiler
+        if self.observers:
+            self.start_tick()
+
         #check for message collision, move message, then check again
-        i = 0
-        while i < len(self.messages):
-            mesg = self.messages[i]
-            
+        self.messages.tick(self.bot_grid,self.grid_version,self.time)
+        if profiler is not None:
+            profiler.phase_ended(self,"messages")
+
+        self.prepare_runnable()
+        if self.fast_forward or profiler is not None:
+            for bot in list(self.runnable.values()):
+                self.tick_bot(bot)
+        else:
+            for bot in list(self.runnable.values()):
+                if not bot.dead:
+                    bot.tick()
+        if profiler is not None:
+            profiler.phase_ended(self,"bots")
+
+        self.end_tick()
+        if profiler is not None:
+            profiler.phase_ended(self,"output")
+
+    def start_tick(self):
+        for observer in self.observers:
+            observer.tick_started(self)
+
+    def end_tick(self):
+        self.time += 1
+        if self.observers:
+            for observer in self.observers:
+                observer.ticked(self)
+        if self.sinks:
+            self.flush_output(self.flush_size if self.bot_grid else 0)
+        if self.recently_deceased:
+            self.recycle_bots()
+
+    def recycle_bots(self):
+        #between ticks nothing holds a dead bot any more
+        room = self.bot_pool_limit - len(self.bot_pool)
+        if room > 0:
+            self.bot_pool.extend(self.recently_deceased[:room])
+        self.recently_deceased.clear()
+
+    def sink_for(self,file_handle):
+        #objects that take bytes one at a time themselves are used unbuffered
+        if hasattr(file_handle,"write_byte"):
+            return file_handle
+        sink = self.sinks.get(id(file_handle))
+        if sink is None:
+            sink = self.sinks[id(file_handle)] = Byte_Sink(file_handle)
+        return sink
+
+    def source_for(self,file_handle):
+        source = self.sources.get(id(file_handle))
+        if source is None:
+            source = self.sources[id(file_handle)] = Byte_Source(file_handle)
+        return source
+
+    def flush_output(self,min_size=0):
+        for sink in self.sinks.values():
+            if sink.buffer and (sink.interactive or len(sink.buffer) >= min_size):
+                sink.flush()
+        if min_size == 0:
+            for file_map in self.file_maps.values():
+                file_map.flush()
+
+    def close(self):
+        #writes out buffered output and releases every mapped file, the
+        #   simulation can't run on afterwards
+        self.flush_output()
+        for file_map in self.file_maps.values():
+            file_map.close()
+
+    def prepare_runnable(self):
+        #bots that ran ahead rejoin on the tick they caught up to
+        if self.sleeping:
+            for bot in self.sleeping.pop(self.time,()):
+                if not bot.dead:
+                    self.runnable[bot.id] = bot
+                    self.runnable_sorted = False
+
+        #Tick bots in order, blocked bots have nothing to do
+        if not self.runnable_sorted:
+            self.runnable = dict(sorted(self.runnable.items()))
+            self.runnable_sorted = True
+
+    def tick_bot(self,bot):
+        #one bot's slot in the tick. With fast_forward, after its normal step
+        #   a bot keeps going through local instructions, then sits out the
+        #   ticks it already ran
+        if bot.dead:
+            return
+        profiler = self.profiler
+        if profiler is not None:
+            profiler.bot_started(self,bot)
+        bot_id = bot.id
+        bot.tick()
+        #a bot that exec'd is a new bot, it starts next tick
+        if self.fast_forward and not (bot.dead or bot.waiting_for_mesg or bot.id != bot_id):
+            ran = bot.run_local(self.fast_forward - 1)
+            if ran:
+                del self.runnable[bot.id]
+                self.sleeping.setdefault(self.time + ran + 1,[]).append(bot)
+        if profiler is not None:
+            profiler.bot_ended(self)
+
+
+class Run_Result:
+    #why Simulation.run stopped: "empty", "exit", "quiescent", "cycle",
+    #   "max_ticks" or "deadline", ticks and elapsed cover that one call
+    def __init__(self,ticks):
+        self.reason = None
+        self.ticks = ticks
+        self.elapsed = 0.0
+        self.exit_code = None
+        #length of the state cycle a hasher found
+        self.period = None
+        self.peak_bots = 0
+        self.peak_messages = 0
+
+    def to_dict(self):
+        return {"reason": self.reason,"ticks": self.ticks,"elapsed": self.elapsed,"exit_code": self.exit_code,"period": self.period,
+                "peak_bots": self.peak_bots,"peak_messages": self.peak_messages}
+
+    def __repr__(self):
+        period = "" if self.period is None else f", period {self.period}"
+        return f"Run_Result({self.reason} after {self.ticks} ticks, exit code {self.exit_code}{period})"
+
+class Observer:
+    #base for Simulation.observers, every hook does nothing until overridden
+    #   hooks run inside the tick, between the change and whatever follows
+    def spawned(self,sim,bot):
+        pass
+
+    def died(self,sim,bot):
+        pass
+
+    def sent(self,sim,coords,velocity,value,kill,expires):
+        pass
+
+    def delivered(self,sim,bot,value,kill,accepted):
+        #after recv, a kill message has already killed the bot
+        pass
+
+    def moved(self,sim,bot,position):
+        #before whatever is at position gets crushed
+        pass
+
+    def io(self,sim,bot,op,value,offset=None):
+        #op is "read" or "write", offset is set for MAPPED_FILE bots
+        pass
+
+    def tick_started(self,sim):
+        #before the message phase
+        pass
+
+    def ticked(self,sim):
+        #after time moves on, before output is flushed
+        pass
+
+def ray_index(bot_coords):
+    #(axis, coords without that axis) -> positions along the axis, so the
+    #   bots on a message's line are one lookup away
+    index = {}
+    for coords in bot_coords:
+        for axis in range(len(coords)):
+            line = (axis,coords[:axis] + coords[axis + 1:])
+            index.setdefault(line,[]).append(coords[axis])
+    return index
+
+def ray_hits(index,bot_grid,coords,velocity,moves=None):
+    #does a message at coords reach a bot within moves moves, None is forever
+    axes = [axis for axis,step in enumerate(velocity) if step != 0]
+    if len(axes) != 1:
+        #diagonal or standing messages, check every bot
+        targets = bot_grid.keys()
+    else:
+        axis = axes[0]
+        targets = [coords[:axis] + (position,) + coords[axis + 1:]
+                   for position in index.get((axis,coords[:axis] + coords[axis + 1:]),())]
+    for target in targets:
+        distance = None
+        for c,t,v in zip(coords,target,velocity):
+            if v == 0:
+                if c != t:
+                    break
+            elif (t - c) % v != 0 or (distance is not None and (t - c) // v != distance):
+                break
+            else:
+                distance = (t - c) // v
+        else:
+            if distance is None:
+                #standing message, only hits a bot already on its cell
+                return True
+            if distance >= 0 and (moves is None or distance <= moves):
+                return True
+    return False
+
+def coord_adder(dimensions):
+    #build a coords + offset function without a per-call generator
+    if dimensions == 1:
+        return lambda a,b: (a[0] + b[0],)
+    if dimensions == 2:
+        return lambda a,b: (a[0] + b[0],a[1] + b[1])
+    if dimensions == 3:
+        return lambda a,b: (a[0] + b[0],a[1] + b[1],a[2] + b[2])
+    return lambda a,b: tuple(map(operator.add,a,b))
+
+#cells per Chunk_Index chunk when no chunk_size is given, a 64x64 square in 2D
+CHUNK_CELLS = 4096
+
+class Chunk_Index:
+    #bots filed into fixed size chunks, dense lists of chunk_size ** dimensions
+    #   cells keyed by coords // chunk_size, for region queries that would
+    #   otherwise scan every bot. A chunk is allocated when a bot lands in it
+    #   and dropped when its last bot goes, so box, count and neighbour
+    #   queries only visit chunks that overlap the region and have bots
+    def __init__(self,dimensions,chunk_size=None):
+        self.dimensions = dimensions
+        if chunk_size is None:
+            chunk_size = max(2,round(CHUNK_CELLS ** (1 / dimensions)))
+        self.chunk_size = chunk_size
+        #cell index = sum of local coord * stride, x varies fastest
+        self.strides = tuple(chunk_size ** d for d in range(dimensions))
+        self.locate = chunk_locator(dimensions,chunk_size)
+        #chunk key -> Grid_Chunk
+        self.chunks = {}
+
+    def add(self,coords,bot):
+        #coords must be empty, a bot taking over a cell replaces a dead one
+        key,index = self.locate(coords)
+        chunk = self.chunks.get(key)
+        if chunk is None:
+            chunk = self.chunks[key] = Grid_Chunk(self.chunk_size ** self.dimensions)
+        chunk.cells[index] = bot
+        chunk.count += 1
+
+    def remove(self,coords):
+        key,index = self.locate(coords)
+        chunk = self.chunks[key]
+        chunk.cells[index] = None
+        chunk.count -= 1
+        if chunk.count == 0:
+            del self.chunks[key]
+
+    def chunk_key(self,coords):
+        size = self.chunk_size
+        return tuple(c // size for c in coords)
+
+    def box(self,low,high):
+        #every bot with low <= coords < high on each axis, in no set order
+        if any(l >= h for l,h in zip(low,high)):
+            return
+        size = self.chunk_size
+        low_key = self.chunk_key(low)
+        high_key = self.chunk_key([c - 1 for c in high])
+
+        #a box bigger than the colony walks the allocated chunks instead
+        spanned = 1
+        for l,h in zip(low_key,high_key):
+            spanned *= h - l + 1
+        if spanned > len(self.chunks):
+            keys = [key for key in self.chunks
+                    if all(l <= k <= h for k,l,h in zip(key,low_key,high_key))]
+        else:
+            keys = itertools.product(*(range(l,h + 1) for l,h in zip(low_key,high_key)))
+
+        strides = self.strides
+        for key in keys:
+            chunk = self.chunks.get(key)
+            if chunk is None:
+                continue
+            cells = chunk.cells
+            #the box clipped to this chunk, in local coords
+            ranges = []
+            for k,l,h in zip(key,low,high):
+                origin = k * size
+                ranges.append((max(l - origin,0),min(h - origin,size)))
+            (x_low,x_high),rest = ranges[0],ranges[1:]
+            if x_low == 0 and x_high == size and all(r == (0,size) for r in rest):
+                #whole chunk is inside the box
+                for bot in cells:
+                    if bot is not None:
+                        yield bot
+                continue
+            #runs along x are contiguous, step through the other axes
+            for local in itertools.product(*(range(l,h) for l,h in rest)):
+                start = sum(c * stride for c,stride in zip(local,strides[1:]))
+                for bot in cells[start + x_low:start + x_high]:
+                    if bot is not None:
+                        yield bot
+
+    def count(self,low,high):
+        #number of bots in the box, see box
+        return sum(1 for _ in self.box(low,high))
+
+    def neighbours(self,coords,radius=1):
+        #bots within radius cells on every axis, coords itself left out
+        low = tuple(c - radius for c in coords)
+        high = tuple(c + radius + 1 for c in coords)
+        for bot in self.box(low,high):
+            if bot.coords != coords:
+                yield bot
+
+def chunk_locator(dimensions,size):
+    #build a coords -> (chunk key,cell index) function, like coord_adder
+    if dimensions == 1:
+        return lambda a: ((a[0] // size,),a[0] % size)
+    if dimensions == 2:
+        return lambda a: ((a[0] // size,a[1] // size),a[0] % size + a[1] % size * size)
+    if dimensions == 3:
+        area = size * size
+        return lambda a: ((a[0] // size,a[1] // size,a[2] // size),a[0] % size + a[1] % size * size + a[2] % size * area)
+    strides = tuple(size ** d for d in range(dimensions))
+    return lambda a: (tuple([c // size for c in a]),sum([c % size * stride for c,stride in zip(a,strides)]))
+
+class Grid_Chunk:
+    __slots__ = ("cells","count")
+
+    def __init__(self,size):
+        self.cells = [None] * size
+        self.count = 0
+
+class Message_Transport:
+    #messages in flight, kept as parallel arrays in age order (older = firster)
+    #   a tick compacts survivors in place, so delivery, removal and TTL
+    #   expiry are all O(1) per message
+    def __init__(self,dimensions):
+        self.dimensions = dimensions
+        self.step = coord_adder(dimensions)
+        self.coords = []
+        self.velocity = []
+        self.value = []
+        self.kill = []
+        #tick of the last move before the message dies, None for never
+        self.expires = []
+
+    def __len__(self):
+        return len(self.coords)
+
+    def __iter__(self):
+        return zip(self.coords,self.velocity,self.value,self.kill,self.expires)
+
+    def shift_expiry(self,ticks):
+        #time jumped ahead by ticks, TTLs keep what they had left
+        expires = self.expires
+        for i in range(len(expires)):
+            if expires[i] is not None:
+                expires[i] += ticks
+
+    def add(self,coords,velocity,value,kill=False,expires=None):
+        self.coords.append(coords)
+        self.velocity.append(velocity)
+        self.value.append(value)
+        self.kill.append(kill)
+        self.expires.append(expires)
+
+    def tick(self,bot_grid,grid_version,now):
+        coords = self.coords
+        velocity = self.velocity
+        value = self.value
+        kill = self.kill
+        expires = self.expires
+        step = self.step
+
+        count = len(coords)
+        keep = 0
+        for i in range(count):
             #check for collision before moving -> bot moved into a message
-            if mesg.coords in self.bot_grid:
-                self.bot_grid[mesg.coords].recv(mesg)
-                self.messages.pop(i)
+            bot = bot_grid.get(coords[i])
+            if bot is not None:
+                bot.recv(value[i],kill[i])
                 continue
             #move and check again -> message moved into a bot
-            mesg.tick()
-            if mesg.coords in self.bot_grid:
-                self.bot_grid[mesg.coords].recv(mesg)
-                self.messages.pop(i)
+            position = step(coords[i],velocity[i])
+            bot = bot_grid.get(position)
+            if bot is not None:
+                bot.recv(value[i],kill[i])
+                continue
+            #TTL ran out on this move
+            if expires[i] == now:
                 continue
-            i += 1
 
-        #Tick bots in order
-        for bot in list(self.bot_grid.values()):
-            if not bot.dead:
-                bot.tick()
+            coords[keep] = position
+            velocity[keep] = velocity[i]
+            value[keep] = value[i]
+            kill[keep] = kill[i]
+            expires[keep] = expires[i]
+            keep += 1
+
+        #drop delivered messages, anything added during delivery stays queued
+        del coords[keep:count]
+        del velocity[keep:count]
+        del value[keep:count]
+        del kill[keep:count]
+        del expires[keep:count]
+
+class Numpy_Message_Transport:
+    #Message_Transport with coords and velocities held in N x D int64 arrays
+    #   all messages move in one vector add, bot collisions are found in bulk
+    #   by looking up hashed coords in a sorted array of hashed bot coords
+    def __init__(self,dimensions):
+        if numpy is None:
+            raise ImportError("message_backend='numpy' requires numpy")
+        self.dimensions = dimensions
+        self.count = 0
+        self.coords = numpy.empty((64,dimensions),dtype=numpy.int64)
+        self.velocity = numpy.empty((64,dimensions),dtype=numpy.int64)
+        #values are python ints of any size, so they stay objects
+        self.value = numpy.empty(64,dtype=object)
+        self.kill = numpy.empty(64,dtype=bool)
+        #-1 for messages that never expire
+        self.expires = numpy.empty(64,dtype=numpy.int64)
+
+        #messages added during the bot phase, merged at the next tick
+        self.pending = []
+
+        #odd multipliers for folding a coord row into a single int64 key
+        #   distinct coords may share a key, every hit is checked in bot_grid
+        self.key_mult = numpy.array([(0x9E3779B97F4A7C15 >> (7 * d)) | 1 for d in range(dimensions)],dtype=numpy.uint64).view(numpy.int64)
+        self.bot_keys = None
+        self.bot_keys_version = None
+
+    def __len__(self):
+        return self.count + len(self.pending)
+
+    def __iter__(self):
+        for i in range(self.count):
+            expires = int(self.expires[i])
+            yield tuple(self.coords[i].tolist()),tuple(self.velocity[i].tolist()),self.value[i],bool(self.kill[i]),(None if expires < 0 else expires)
+        yield from self.pending
+
+    def add(self,coords,velocity,value,kill=False,expires=None):
+        self.pending.append((coords,velocity,value,kill,expires))
+
+    def shift_expiry(self,ticks):
+        expires = self.expires[:self.count]
+        expires[expires >= 0] += ticks
+        self.pending = [(coords,velocity,value,kill,None if expires is None else expires + ticks)
+                        for coords,velocity,value,kill,expires in self.pending]
+
+    def merge_pending(self):
+        added = len(self.pending)
+        if added == 0:
+            return
+        needed = self.count + added
+        if needed > len(self.value):
+            capacity = max(needed,2 * len(self.value))
+            self.coords = self.grow(self.coords,capacity)
+            self.velocity = self.grow(self.velocity,capacity)
+            self.value = self.grow(self.value,capacity)
+            self.kill = self.grow(self.kill,capacity)
+            self.expires = self.grow(self.expires,capacity)
+
+        coords,velocity,value,kill,expires = zip(*self.pending)
+        self.coords[self.count:needed] = coords
+        self.velocity[self.count:needed] = velocity
+        self.value[self.count:needed] = value
+        self.kill[self.count:needed] = kill
+        self.expires[self.count:needed] = [-1 if e is None else e for e in expires]
+        self.count = needed
+        self.pending = []
+
+    def grow(self,array,capacity):
+        bigger = numpy.empty((capacity,) + array.shape[1:],dtype=array.dtype)
+        bigger[:self.count] = array[:self.count]
+        return bigger
+
+    def keys(self,coords):
+        #wrapping int64 arithmetic, collisions are fine
+        return coords @ self.key_mult
+
+    def hits(self,coords,bot_grid,grid_version):
+        if grid_version is None or grid_version != self.bot_keys_version:
+            bot_coords = numpy.array(list(bot_grid.keys()),dtype=numpy.int64).reshape(-1,self.dimensions)
+            self.bot_keys = numpy.sort(self.keys(bot_coords))
+            self.bot_keys_version = grid_version
+        if len(self.bot_keys) == 0:
+            return numpy.zeros(len(coords),dtype=bool)
+        keys = self.keys(coords)
+        index = numpy.searchsorted(self.bot_keys,keys)
+        index[index == len(self.bot_keys)] = 0
+        return self.bot_keys[index] == keys
+
+    def tick(self,bot_grid,grid_version,now):
+        self.merge_pending()
+        count = self.count
+        if count == 0:
+            return
 
-        self.time += 1
+        coords = self.coords[:count]
+        moved = coords + self.velocity[:count]
+        value = self.value
+        kill = self.kill
+
+        #bots only leave bot_grid while messages are delivered, so any
+        #   message that hits a bot is among these candidates
+        pre_hit = self.hits(coords,bot_grid,grid_version)
+        post_hit = self.hits(moved,bot_grid,grid_version)
+        candidates = numpy.flatnonzero(pre_hit | post_hit)
+        expired = self.expires[:count] == now
+        if len(candidates) == 0 and not expired.any():
+            coords[:] = moved
+            return
 
-        
-class Message:
-    def __init__(self,coords,velocity,value,simulation,kill=False):
-        self.coords = coords
-        self.velocity = velocity
-        assert len(coords) == len(velocity) 
-        assert len(coords) == simulation.dimensions
-        self.value = value
-        self.id = simulation.register_message(self)
-        self.kill = kill
+        delivered = numpy.zeros(count,dtype=bool)
+        for i in candidates.tolist():
+            #same order as the scalar path: oldest message first, check
+            #   before moving, then after
+            if pre_hit[i]:
+                bot = bot_grid.get(tuple(coords[i].tolist()))
+                if bot is not None:
+                    bot.recv(value[i],bool(kill[i]))
+                    delivered[i] = True
+                    continue
+            if post_hit[i]:
+                bot = bot_grid.get(tuple(moved[i].tolist()))
+                if bot is not None:
+                    bot.recv(value[i],bool(kill[i]))
+                    delivered[i] = True
+
+        #undelivered messages whose TTL ran out on this move die too
+        keep = ~(delivered | expired)
+        survivors = int(keep.sum())
+        self.coords[:survivors] = moved[keep]
+        self.velocity[:survivors] = self.velocity[:count][keep]
+        self.value[:survivors] = value[:count][keep]
+        self.kill[:survivors] = kill[:count][keep]
+        self.expires[:survivors] = self.expires[:count][keep]
+        self.value[survivors:count] = None
+        self.count = survivors
+
+def is_interactive(file_handle):
+    #terminals, pipes and sockets, as opposed to files and in-memory buffers
+    try:
+        fd = file_handle.fileno()
+        mode = os.fstat(fd).st_mode
+    except (AttributeError,OSError,ValueError):
+        return False
+    return os.isatty(fd) or stat.S_ISFIFO(mode) or stat.S_ISSOCK(mode)
+
+class Byte_Sink:
+    #bytes written by sys bots pile up here and reach the file in one write
+    #   binary handles get the bytes as is, text handles with a binary buffer
+    #   (sys.stdout) are written through it, other text handles get utf-8 text
+    def __init__(self,file_handle):
+        if file_handle is None:
+            raise ValueError("sys bot has no file handle to write to")
+        self.file_handle = file_handle
+        self.raw = getattr(file_handle,"buffer",None)
+        self.decoder = None
+        if self.raw is None and isinstance(file_handle,io.TextIOBase):
+            #a character split across two flushes is held back until complete
+            self.decoder = codecs.getincrementaldecoder("utf-8")("replace")
+        self.buffer = bytearray()
+        #someone may be reading along, so don't hold bytes back for long
+        self.interactive = is_interactive(file_handle)
+
+    def write_byte(self,byte):
+        self.buffer.append(byte)
+
+    def flush(self):
+        if self.raw is not None:
+            #anything already printed through the text layer goes first
+            self.file_handle.flush()
+            self.raw.write(self.buffer)
+            self.raw.flush()
+        elif self.decoder is not None:
+            self.file_handle.write(self.decoder.decode(bytes(self.buffer)))
+            self.file_handle.flush()
+        else:
+            self.file_handle.write(self.buffer)
+            self.file_handle.flush()
+        self.buffer = bytearray()
+
+class Byte_Source:
+    #reads ahead in large chunks into one preallocated buffer, regular files
+    #   are mapped and read in place instead. The handle's own position only
+    #   moves when chunks are read, not for mapped files
+    chunk_size = 1 << 16
+
+    def __init__(self,file_handle):
+        if file_handle is None:
+            raise ValueError("sys bot has no file handle to read from")
+        self.file_handle = getattr(file_handle,"buffer",file_handle)
+        self.map = None
+        self.start = 0
+        self.end = 0
+        try:
+            fd = self.file_handle.fileno()
+            info = os.fstat(fd)
+            if stat.S_ISREG(info.st_mode) and info.st_size > 0:
+                self.map = mmap.mmap(fd,0,access=mmap.ACCESS_READ)
+                self.start = self.file_handle.tell()
+                self.end = len(self.map)
+        except (AttributeError,OSError,ValueError):
+            #pipes, terminals and in-memory files are read in chunks
+            self.map = None
+
+        if self.map is None:
+            self.chunk = bytearray(self.chunk_size)
+            self.view = memoryview(self.chunk)
+            #readinto1 returns whatever one read gives, so a pipe or terminal
+            #   never blocks waiting for a full chunk
+            self.readinto = getattr(self.file_handle,"readinto1",None) or getattr(self.file_handle,"readinto",None)
+
+    def read(self,count):
+        #up to count bytes that are ready, b"" at end of file
+        if self.start == self.end and self.map is None:
+            self.fill()
+        count = min(count,self.end - self.start)
+        if self.map is not None:
+            data = self.map[self.start:self.start + count]
+        else:
+            data = bytes(self.view[self.start:self.start + count])
+        self.start += count
+        return data
 
-    def tick(self):
-        self.coords = tuple(self.coords[i] + self.velocity[i] for i in range(len(self.coords)))
+    def fill(self):
+        if self.readinto is not None:
+            self.end = self.readinto(self.view) or 0
+        else:
+            #text handle, read characters and hand out their utf-8 bytes
+            data = self.file_handle.read(self.chunk_size // 4).encode()
+            self.end = len(data)
+            self.chunk[:self.end] = data
+        self.start = 0
+
+class File_Map:
+    #a host file mapped into memory for MAPPED_FILE bots, shared by every bot
+    #   spawned under the same name. Values are little endian and unsigned,
+    #   1 to 8 bytes wide
+    def __init__(self,path,writable=False):
+        self.path = path
+        self.writable = writable
+        self.file_handle = open(path,"r+b" if writable else "rb")
+        self.size = os.fstat(self.file_handle.fileno()).st_size
+        #an empty file can't be mapped, every access to it is out of range
+        self.map = None
+        if self.size > 0:
+            access = mmap.ACCESS_WRITE if writable else mmap.ACCESS_READ
+            self.map = mmap.mmap(self.file_handle.fileno(),0,access=access)
+
+    def in_range(self,offset,width):
+        return 1 <= width <= 8 and 0 <= offset and offset + width <= self.size
+
+    def read(self,offset,width):
+        #-1 for anything outside the file
+        if not self.in_range(offset,width):
+            return -1
+        if width == 1:
+            return self.map[offset]
+        return int.from_bytes(self.map[offset:offset + width],"little")
+
+    def write(self,offset,width,value):
+        #writes outside the file or to a read only file are dropped
+        if not self.writable or not self.in_range(offset,width):
+            logging.debug("Dropped write of %s bytes at %s to %s",width,offset,self.path)
+            return
+        if width == 1:
+            self.map[offset] = value & 0xFF
+        else:
+            self.map[offset:offset + width] = (value & ((1 << (8 * width)) - 1)).to_bytes(width,"little")
+
+    def flush(self):
+        if self.writable and self.map is not None:
+            self.map.flush()
+
+    def close(self):
+        if self.map is not None:
+            self.flush()
+            self.map.close()
+            self.map = None
+        self.file_handle.close()
 
 class Cell_Bot:
+    #no per-bot __dict__, colonies can run to millions of bots
+    __slots__ = ("bot_name","coords","simulation","instr_ptr","registers",
+                 "queue","q_head","q_len","queue_size","ttl","cond_state","dead",
+                 "instruction_list","label_index","executed_inits","heading",
+                 "waiting_for_mesg","remaining_args","arg_buffer","id")
+
     def __init__(self,bot_name,coords,simulation,heading=None):
+        self.simulation = simulation
+        self.registers = []
+        #fixed capacity ring buffer, q_head is the oldest message
+        self.queue = []
+        #holds Q args while waiting, allocated the first time a bot waits
+        self.arg_buffer = None
+        self.reset(bot_name,coords,heading)
+
+    def reset(self,bot_name,coords,heading=None):
+        #start over as a new bot_name bot, a pooled bot keeps its lists
+        simulation = self.simulation
         assert bot_name in simulation.bot_code
         assert len(coords) == simulation.dimensions
+        code = simulation.bot_code[bot_name]
 
         self.bot_name = bot_name
         self.coords = coords
-        self.simulation = simulation
 
         self.instr_ptr = 0
-        self.registers = [0]*simulation.register_count
-        self.queue = []
+        self.registers[:] = simulation.zero_registers
         self.queue_size = 4
+        self.queue[:] = (None,) * 4
+        self.q_head = 0
+        self.q_len = 0
         self.ttl = 255
         self.cond_state = False
         self.dead = False
-        self.instruction_list = simulation.bot_code[self.bot_name].instructions
-        self.label_index = simulation.bot_code[self.bot_name].label_index
-        self.executed_inits = set()
+        self.instruction_list = code.instructions
+        self.label_index = code.label_index
+        #bit i is set once the @ instruction at offset i has run
+        self.executed_inits = 0
         
-        #Default heading of X+
         if heading is None:
-            self.heading = [0] * simulation.dimensions
-            if len(self.heading) >= 1:
-                self.heading[0] = 1
-            self.heading = tuple(self.heading)
+            self.heading = simulation.default_heading
         else:
             self.heading = heading
 
 
         self.waiting_for_mesg = False
-        self.arg_buffer = []
+        self.remaining_args = 0
+        if self.arg_buffer:
+            self.arg_buffer.clear()
 
         #given by simulation when registered
         self.id = None
@@ -192,12 +1100,33 @@ class Cell_Bot:
         if self.dead:
             return
         instruction = self.instruction_list[self.instr_ptr]
-        self.execute(instruction)
+        if instruction.fast is not None:
+            instruction.fast(self)
+        else:
+            self.execute(instruction)
     
     def die(self):
         self.dead = True
         self.simulation.kill(self)
 
+    def run_local(self,budget):
+        #run ahead through instructions no other bot can observe or affect,
+        #   see Action.is_local, returns how many ran
+        ran = 0
+        profiler = self.simulation.profiler
+        while ran < budget:
+            instruction = self.instruction_list[self.instr_ptr]
+            if not instruction.is_local:
+                break
+            if profiler is not None:
+                profiler.count(self)
+            if instruction.fast is not None:
+                instruction.fast(self)
+            else:
+                self.execute(instruction)
+            ran += 1
+        return ran
+
     def f_die(self,args=None,srcs=None):
         self.die()
     
@@ -236,10 +1165,21 @@ class Cell_Bot:
         pass
 
     def f_ttl(self,args=None,srcs=None):
-        pass
+        #[0-255] where 0 means infinite TTL
+        self.ttl = max(0,min(255,srcs[0]))
 
     def f_qmax(self,args=None,srcs=None):
-        self.qmax = srcs[0]
+        #[0-255], queued messages that no longer fit are dropped, newest first
+        queue_size = max(0,min(255,srcs[0]))
+        kept = self.queue_values()[:queue_size]
+        self.queue = kept + [None]*(queue_size - len(kept))
+        self.q_head = 0
+        self.q_len = len(kept)
+        self.queue_size = queue_size
+
+    def queue_values(self):
+        #queued messages, oldest first
+        return [self.queue[(self.q_head + i) % self.queue_size] for i in range(self.q_len)]
 
     def f_tlt(self,args=None,srcs=None):
         self.cond_state = srcs[0] < srcs[1]
@@ -264,12 +1204,11 @@ class Cell_Bot:
         self.heading = self.dir_to_coords(args[0])
 
     def f_move(self,args=None,srcs=None):
-        position = self.coords
-        position = tuple(position[i] + self.heading[i] for i in range(len(position)))
+        position = self.simulation.add_coords(self.coords,self.heading)
+        for observer in self.simulation.observers:
+            observer.moved(self.simulation,self,position)
         #check if we are about to crush a bot
-        if position in self.simulation.bot_grid:
-            logging.debug(f"Crushed a bot at {position}")
-            self.simulation.bot_grid[position].die()
+        self.simulation.crush(position)
 
     def f_rcw(self,args=None,srcs=None):
         pass
@@ -279,19 +1218,27 @@ class Cell_Bot:
 
     def f_spawn(self,args=None,srcs=None):
         bot_name = srcs[0]
-        position = self.coords
         if args[1][1] == "DIR":
             direction = self.heading
         else:
             direction = self.dir_to_coords(args[1])
-        position = tuple(position[i] + direction[i] for i in range(len(position)))
+        position = self.simulation.add_coords(self.coords,direction)
         self.simulation.register_bot(bot_name,position,heading=direction)
 
     def f_exec(self,args=None,srcs=None):
         bot_name = srcs[0]
-        self.die()
-        logging.debug(f"Execing {bot_name} @ {self.coords}")
-        self.simulation.register_bot(bot_name,self.coords)
+        simulation = self.simulation
+        if type(self) is Cell_Bot and bot_name in simulation.bot_code and bot_name not in simulation.system_bots:
+            #this object is already done with for the tick, so a new program
+            #   bot restarts it in place, see Action.is_exec. register_bot
+            #   pops it straight back off bot_pool
+            simulation.kill(self,recycle=False)
+            simulation.bot_pool.append(self)
+        else:
+            #sys bots are built fresh, this one waits for the tick to end
+            simulation.kill(self)
+        logging.debug("Execing %s @ %s",bot_name,self.coords)
+        simulation.register_bot(bot_name,self.coords)
         
     def handle_dst(self,arg_info,value):
         arg_type = arg_info[0]
@@ -301,8 +1248,8 @@ class Cell_Bot:
             else:
                 direction = self.dir_to_coords(arg_info)
             #spawn a new message
-            spawn_location = tuple(direction[i] + self.coords[i] for i in range(len(self.coords))) 
-            Message(spawn_location,direction,value,self.simulation,kill=(value == "KILL"))
+            spawn_location = self.simulation.add_coords(self.coords,direction)
+            self.simulation.register_message(spawn_location,direction,value,kill=(value == "KILL"),ttl=self.ttl)
             
         elif arg_type == "R":
             register_index = arg_info[1]
@@ -318,96 +1265,120 @@ class Cell_Bot:
         return tuple(coords)
         
 
-    def parse_source(self,args):
+    def parse_source(self,instruction):
+        #Q args come from arg_buffer after a wait, else straight off the queue
+        arg_buffer = None
+
         #If we are in the waiting state, check
         if self.waiting_for_mesg:
             if self.remaining_args != 0:
                 #We don't have enough args to execute the instr
-                return True,[]
+                return True,None
             else:
                 #we were waiting, but got enough messages to execute,
                 #   set waiting to failed and then
                 #   flow to normal path
                 self.waiting_for_mesg = False
-        else:
-            #place items from queue into arg buffer
-            q_args = sum(1 for a in args if a[0] == "Q")
-            while q_args > 0 and len(self.queue) > 0:
-                self.arg_buffer.append(self.queue.pop())
-                q_args -= 1
-            if q_args != 0:
-                #Couldn't fill args from, Q, enter waiting state
-                self.remaining_args = q_args
-                self.waiting_for_mesg = True
-                return True,[]
-            
+                arg_buffer = self.arg_buffer
+        elif instruction.q_count > self.q_len:
+            #Couldn't fill args from, Q, move what there is into the arg
+            #   buffer and enter waiting state
+            if self.arg_buffer is None:
+                self.arg_buffer = []
+            while self.q_len > 0:
+                self.arg_buffer.append(self.queue_pop())
+            self.remaining_args = instruction.q_count - len(self.arg_buffer)
+            self.waiting_for_mesg = True
+            self.simulation.block(self)
+            return True,None
+
+        #sources known at compile time were resolved by Action.decode
+        if instruction.const_srcs is not None:
+            return False,instruction.const_srcs
+
         ret = []
-        for arg in args:
-            source_type = arg[0]
+        q_index = 0
+        for source_type,value in instruction.srcs:
             if source_type == "I":
-                ret.append(arg[1])
+                ret.append(value)
             elif source_type == "R":
-                ret.append(self.registers[arg[1]])
+                ret.append(self.registers[value])
             elif source_type == "Q":
-                ret.append(self.arg_buffer.pop(0))
-            elif source_type == "BOT":
-                ret.append(arg[1])
-            elif source_type == "LABEL":
-                ret.append(arg[1])
-            elif source_type == "DIR":
-                ret.append(self.heading)
+                if arg_buffer is None:
+                    ret.append(self.queue_pop())
+                else:
+                    ret.append(arg_buffer[q_index])
+                    q_index += 1
             else:
-                raise Exception("UNKNOWN SRC TYPE: " + source_type)
-        assert len(self.arg_buffer) == 0
+                ret.append(self.heading)
+        if arg_buffer is not None:
+            arg_buffer.clear()
         return False,ret
+
+    def queue_pop(self):
+        value = self.queue[self.q_head]
+        self.q_head += 1
+        if self.q_head == self.queue_size:
+            self.q_head = 0
+        self.q_len -= 1
+        return value
             
 
-    def recv(self,mesg):
-        logging.debug(f"{self.bot_name} id:{self.id} recv message {mesg.value}")
-        if mesg.kill:
+    def recv(self,value,kill=False):
+        logging.debug("%s id:%s recv message %s",self.bot_name,self.id,value)
+        if kill:
             self.die()
-        
-        if self.waiting_for_mesg and self.remaining_args > 0:
+            accepted = True
+        elif self.waiting_for_mesg and self.remaining_args > 0:
             self.remaining_args -= 1
-            self.arg_buffer.append(mesg.value)
-            return True
+            self.arg_buffer.append(value)
+            if self.remaining_args == 0:
+                self.simulation.wake(self)
+            accepted = True
+        elif self.q_len < self.queue_size:
+            tail = self.q_head + self.q_len
+            if tail >= self.queue_size:
+                tail -= self.queue_size
+            self.queue[tail] = value
+            self.q_len += 1
+            accepted = True
+        else:
+            accepted = False
 
-        if len(self.queue) < self.queue_size:
-            self.queue.insert(0,mesg.value)
-            return True
-        return False
+        if self.simulation.observers:
+            for observer in self.simulation.observers:
+                observer.delivered(self.simulation,self,value,kill,accepted)
+        return accepted
 
     def execute(self,instruction):
-        logging.debug(self.bot_name,self.id,instruction)
-        
-        #dont inc pointer after jmp
-        skip_inc_ip = "jmp" in instruction.instr_type
-
         #Check if we can actually fetch src's from Q 
-        instr_arg_template = Instruction_Set.instr_args[instruction.instr_type] 
-        src_arg_indexs = [i for i in range(len(instr_arg_template)) if "src_" in instr_arg_template[i][0]]
-        src_args = [instruction.args[index] for index in src_arg_indexs]
-        enter_wait,ret = self.parse_source(src_args)
+        enter_wait,ret = self.parse_source(instruction)
         if enter_wait:
             return
 
-        assert len(instruction.args) == len(Instruction_Set.instr_args[instruction.instr_type])
-        f = getattr(self,"f_" + instruction.instr_type) 
-
-        f(args=instruction.args,srcs=ret)
+        handler = instruction.handler
+        if handler is None:
+            raise AttributeError(f"{type(self).__name__} has no handler for '{instruction.instr_type}'")
+        handler(self,instruction.args,ret)
+        if instruction.is_exec:
+            #the bot was replaced, maybe by a fresh start of this object
+            return
 
         if instruction.is_init:
-            self.executed_inits.add(self.instr_ptr)
+            self.executed_inits |= 1 << self.instr_ptr
         
-        #finally increment instr ptr 
-        if not skip_inc_ip:
+        #finally increment instr ptr, dont inc pointer after jmp
+        if not instruction.is_jmp:
             self.adv_ip()
 
+        self.skip_invalid()
+
+    def skip_invalid(self):
         #find next valid instruction
         start = self.instr_ptr
         while True:
             next_instr = self.instruction_list[self.instr_ptr]
-            if ((next_instr.is_init and self.instr_ptr in self.executed_inits) or (next_instr.is_cond and next_instr.cond_type != self.cond_state)):
+            if ((next_instr.is_init and (self.executed_inits >> self.instr_ptr) & 1) or (next_instr.is_cond and next_instr.cond_type != self.cond_state)):
                 self.adv_ip()
                 if self.instr_ptr == start:
                     self.die()
@@ -420,9 +1391,19 @@ class Cell_Bot:
             self.instr_ptr = 0
 
 class Sys_Cell_Bot(Cell_Bot):
+    __slots__ = ("file_handle","is_file","stream","sink","source","file_map","byte_buffer","byte_buffer_index","byte_buffer_remaining")
+
     def __init__(self,bot_name,coords,simulation,heading=None):
         self.file_handle = None
         self.is_file = False
+        #"STDIN"/"STDOUT"/"STDERR" when file_handle is one of the simulation's
+        #   streams, the bot name it was spawned as for a mapped file
+        self.stream = None
+        #the simulation's Byte_Sink/Byte_Source for file_handle, looked up on first use
+        self.sink = None
+        self.source = None
+        #File_Map for MAPPED_FILE bots, see Simulation.map_file
+        self.file_map = None
         self.byte_buffer = b""
         self.byte_buffer_index = 0
         self.byte_buffer_remaining = 0
@@ -432,44 +1413,61 @@ class Sys_Cell_Bot(Cell_Bot):
     def give_file_handle(self,file_handle):
         self.file_handle = file_handle
         self.is_file = file_handle is not None
+        self.sink = None
+        self.source = None
         
-    def f___BYTESAVAIL__(self,args=None,srcs=None):
-        bytes_to_read = srcs[0]
-        if bytes_to_read <= byte_buffer_remaining:
-            bytes_avail = bytes_to_read
-        elif byte_buffer_remaining != 0:
-            #try to read the difference
-            difference = bytes_to_read - byte_buffer_remaining
-            new_bytes = self.file_handle.read(difference)
-            self.byte_buffer += new_bytes
-            byte_buffer_remaining += len(new_bytes)
-            bytes_avail = byte_buffer_remaining
-        else:
-            #just read the end
-            self.byte_buffer = self.file_handle.read(bytes_to_read)
-            self.byte_buffer_remaining = len(self.byte_buffer)
+    def f___BYTES_AVAIL__(self,args=None,srcs=None):
+        #top the buffer up to srcs[0] bytes, dst gets how many are ready
+        #   0 usually means end of file
+        bytes_to_read = max(0,srcs[0])
+        if self.byte_buffer_remaining < bytes_to_read:
+            if self.source is None:
+                self.source = self.simulation.source_for(self.file_handle)
+            unread = self.byte_buffer[self.byte_buffer_index:]
+            self.byte_buffer = unread + self.source.read(bytes_to_read - len(unread))
             self.byte_buffer_index = 0
-            bytes_avail = self.byte_buffer_remaining
-            
-        self.handle_dst(args[1],value=byte_avail)
-        
+            self.byte_buffer_remaining = len(self.byte_buffer)
+        bytes_avail = min(bytes_to_read,self.byte_buffer_remaining)
+        self.handle_dst(args[1],value=bytes_avail)
 
     def f___WRITEBYTE__(self,args=None,srcs=None):
-        self.file_handle.write(chr(srcs[0] & 0xFF))
+        if self.sink is None:
+            self.sink = self.simulation.sink_for(self.file_handle)
+        self.sink.write_byte(srcs[0] & 0xFF)
+        for observer in self.simulation.observers:
+            observer.io(self.simulation,self,"write",srcs[0] & 0xFF)
 
     def f___READBYTE__(self,args=None,srcs=None):
         if self.byte_buffer_remaining > 0:
-            self.handle_dst(args[0],value=int(self.byte_buffer[byte_buffer_index]))
+            for observer in self.simulation.observers:
+                observer.io(self.simulation,self,"read",self.byte_buffer[self.byte_buffer_index])
+            self.handle_dst(args[0],value=self.byte_buffer[self.byte_buffer_index])
             self.byte_buffer_index += 1
             self.byte_buffer_remaining -= 1
             return
             
         #This shouldn't happen in a well behaved sys_bot
-        raise Exception("__READBYTE__ was not prepped by __BYTESAVAIL__")
-        b = self.file_handle.read(1)
-        self.handle_dst(args[0],value=int(b))
+        raise Exception("__READBYTE__ was not prepped by __BYTES_AVAIL__")
+
+    #a MAPPED_FILE bot spawned by that name has no file_map and acts as an
+    #   empty file, reads are out of range and writes are dropped
+    def f___READAT__(self,args=None,srcs=None):
+        value = -1 if self.file_map is None else self.file_map.read(srcs[0],srcs[1])
+        for observer in self.simulation.observers:
+            observer.io(self.simulation,self,"read",value,srcs[0])
+        self.handle_dst(args[2],value=value)
+
+    def f___WRITEAT__(self,args=None,srcs=None):
+        if self.file_map is not None:
+            self.file_map.write(srcs[0],srcs[1],srcs[2])
+        for observer in self.simulation.observers:
+            observer.io(self.simulation,self,"write",srcs[2],srcs[0])
+
+    def f___SIZE__(self,args=None,srcs=None):
+        self.handle_dst(args[0],value=0 if self.file_map is None else self.file_map.size)
 
     def f___EXIT__(self,args=None,srcs=None):
+        self.simulation.flush_output()
         sys.exit(srcs[0])
         
 #struct to hold information about a single instruction
@@ -481,6 +1479,77 @@ class Action: #lawsuit
         self.cond_type = cond_type
         self.is_init = is_init
         self.is_cond = cond_type is not None
+        #replaces the bot that runs it, nothing after the handler applies
+        self.is_exec = instr_type == "exec"
+
+        #pre-decoded form used by Cell_Bot.execute, filled in by decode/bind
+        self.srcs = None
+        self.const_srcs = None
+        self.q_count = 0
+        self.is_jmp = False
+        self.is_local = False
+        self.handler = None
+        #closure built by Instruction_Set.jit, runs the whole tick when set
+        self.fast = None
+
+    def decode(self):
+        template = Instruction_Set.instr_args[self.instr_type]
+        assert len(self.args) == len(template)
+
+        #resolve each src operand down to (source type, value)
+        #   BOT and LABEL names are constants, same as immediates
+        srcs = []
+        for (slot,_),arg in zip(template,self.args):
+            if "src_" not in slot:
+                continue
+            source_type = arg[0]
+            if source_type in ("I","BOT","LABEL"):
+                srcs.append(("I",arg[1]))
+            elif source_type == "R":
+                srcs.append(("R",arg[1]))
+            elif source_type == "Q":
+                srcs.append(("Q",None))
+            elif source_type == "DIR":
+                srcs.append(("DIR",None))
+            else:
+                raise Exception("UNKNOWN SRC TYPE: " + source_type)
+
+        self.srcs = tuple(srcs)
+        self.q_count = sum(1 for source_type,_ in srcs if source_type == "Q")
+        if all(source_type == "I" for source_type,_ in srcs):
+            self.const_srcs = [value for _,value in srcs]
+        else:
+            self.const_srcs = None
+        self.is_jmp = "jmp" in self.instr_type
+
+        #only touches the bot's own registers, cond flag, heading or ttl
+        dsts = [arg[0] for (slot,_),arg in zip(template,self.args) if "dst_" in slot]
+        self.is_local = (self.instr_type in self.local_instrs and self.q_count == 0
+                         and "DIR" not in dsts)
+
+    #instructions whose effects stay inside the bot, given no Q or DIR writes
+    local_instrs = {"put","add","sub","mul","div","mod","tgt","tlt","teq",
+                    "jmp","nop","not","flip","face","ttl"}
+
+    def to_record(self):
+        #plain data for Program_Cache, handler and fast are rebuilt by bind/jit
+        return (self.instr_type,self.args,self.cond_type,self.is_init,self.srcs,
+                self.const_srcs,self.q_count,self.is_jmp,self.is_local)
+
+    @staticmethod
+    def from_record(record):
+        instr_type,args,cond_type,is_init,srcs,const_srcs,q_count,is_jmp,is_local = record
+        act = Action(instr_type,args,cond_type=cond_type,is_init=is_init)
+        act.srcs = srcs
+        act.const_srcs = const_srcs
+        act.q_count = q_count
+        act.is_jmp = is_jmp
+        act.is_local = is_local
+        return act
+
+    def bind(self,bot_cls):
+        #look up the f_ handler once, unknown instructions fail when executed
+        self.handler = getattr(bot_cls,"f_" + self.instr_type,None)
 
     def __repr__(self):
         if self.cond_type is not None and self.is_init:
@@ -492,318 +1561,512 @@ class Action: #lawsuit
         else:
             return f"{self.instr_type} {self.args}"
 
+class Diagnostic:
+    #one problem found while compiling, line_number counts from 1
+    def __init__(self,line_number,line,message):
+        self.line_number = line_number
+        self.line = line.strip()
+        self.message = message
+
+    def __str__(self):
+        return f"Error on line {self.line_number}: {self.message}\n\t\"{self.line}\""
+
+class Compilation_Error(Exception):
+    def __init__(self,diagnostics):
+        self.diagnostics = diagnostics
+        super().__init__("\n".join(["Compilation Error"] + [str(diagnostic) for diagnostic in diagnostics]))
+
 class Instruction_Set:
+    #operand types per slot, tried in the order listed
     instr_args = {
-        "put":  [   ("src_0",{"R","I","Q"}),
-                    ("dst_0",{"R","DIR"})],
+        "put":  [   ("src_0",("R","I","Q")),
+                    ("dst_0",("R","DIR"))],
 
-        "add":  [   ("src_0",{"R","I","Q"}),
-                    ("src_1",{"R","I","Q"}),
-                    ("dst_0",{"R","DIR"})],
+        "add":  [   ("src_0",("R","I","Q")),
+                    ("src_1",("R","I","Q")),
+                    ("dst_0",("R","DIR"))],
 
-        "sub":  [   ("src_0",{"R","I","Q"}),
-                    ("src_1",{"R","I","Q"}),
-                    ("dst_0",{"R","DIR"})],
+        "sub":  [   ("src_0",("R","I","Q")),
+                    ("src_1",("R","I","Q")),
+                    ("dst_0",("R","DIR"))],
 
-        "mul":  [   ("src_0",{"R","I","Q"}),
-                    ("src_1",{"R","I","Q"}),
-                    ("dst_0",{"R","DIR"})],
+        "mul":  [   ("src_0",("R","I","Q")),
+                    ("src_1",("R","I","Q")),
+                    ("dst_0",("R","DIR"))],
 
-        "div":  [   ("src_0",{"R","I","Q"}),
-                    ("src_1",{"R","I","Q"}),
-                    ("dst_0",{"R","DIR"})],
+        "div":  [   ("src_0",("R","I","Q")),
+                    ("src_1",("R","I","Q")),
+                    ("dst_0",("R","DIR"))],
 
-        "mod":  [   ("src_0",{"R","I","Q"}),
-                    ("src_1",{"R","I","Q"}),
-                    ("dst_0",{"R","DIR"})],
+        "mod":  [   ("src_0",("R","I","Q")),
+                    ("src_1",("R","I","Q")),
+                    ("dst_0",("R","DIR"))],
 
-        "tgt":  [   ("src_0",{"R","I","Q"}),
-                    ("src_1",{"R","I","Q"})],
+        "tgt":  [   ("src_0",("R","I","Q")),
+                    ("src_1",("R","I","Q"))],
 
-        "teq":  [   ("src_0",{"R","I","Q"}),
-                    ("src_1",{"R","I","Q"})],
+        "teq":  [   ("src_0",("R","I","Q")),
+                    ("src_1",("R","I","Q"))],
 
-        "tlt":  [   ("src_0",{"R","I","Q"}),
-                    ("src_1",{"R","I","Q"})],
+        "tlt":  [   ("src_0",("R","I","Q")),
+                    ("src_1",("R","I","Q"))],
         
-        "qmax": [   ("src_0",{"R","I","Q"})],
-        "ttl":  [   ("src_0",{"R","I","Q"})],
-        "jmpr": [   ("src_0",{"R","I","Q"})],
+        "qmax": [   ("src_0",("R","I","Q"))],
+        "ttl":  [   ("src_0",("R","I","Q"))],
+        "jmpr": [   ("src_0",("R","I","Q"))],
 
-        "jmp":  [   ("src_0",{"L"})],
-        "not":  [   ("dst_0",{"R"})],
-        "id":   [   ("dst_0",{"R","DIR"})],
+        "jmp":  [   ("src_0",("L",))],
+        "not":  [   ("dst_0",("R",))],
+        "id":   [   ("dst_0",("R","DIR"))],
 
-        "rcw":  [   ("src_0",{"R","I","Q"}),
-                    ("src_1",{"R","I","Q"})],
+        "rcw":  [   ("src_0",("R","I","Q")),
+                    ("src_1",("R","I","Q"))],
 
-        "rccw": [   ("src_0",{"R","I","Q"}),
-                    ("src_1",{"R","I","Q"})],
+        "rccw": [   ("src_0",("R","I","Q")),
+                    ("src_1",("R","I","Q"))],
         "flip": [],
         "move": [],
-        "face": [   ("src_0",{"DIR"})],
+        "face": [   ("src_0",("DIR",))],
 
-        "count":[   ("src_0",{"BOT"}),
-                    ("dst_0",{"R","DIR"})],
+        "count":[   ("src_0",("BOT",)),
+                    ("dst_0",("R","DIR"))],
 
-        "spawn":[   ("src_0",{"BOT"}),
-                    ("dst_0",{"DIR"})],
+        "spawn":[   ("src_0",("BOT",)),
+                    ("dst_0",("DIR",))],
         
-        "fork": [   ("src_0",{"DIR"})],
-        "exec": [   ("src_0",{"BOT"})],
+        "fork": [   ("src_0",("DIR",))],
+        "exec": [   ("src_0",("BOT",))],
 
-        "kill": [   ("src_0",{"DIR"})],
+        "kill": [   ("src_0",("DIR",))],
         "nop":  [],
         "die":  [],
 
-        "__BYTES_AVAIL__": [("src_0",{"R","I","Q"}),
-                            ("dst_0",{"R","DIR"})],
+        "__BYTES_AVAIL__": [("src_0",("R","I","Q")),
+                            ("dst_0",("R","DIR"))],
+
+        "__READBYTE__": [("dst_0",("R","DIR"))],
+        "__WRITEBYTE__":[("src_0",("R","I","Q"))],
+        "__EXIT__": [("src_0",("R","I","Q"))],
+
+        "__READAT__": [("src_0",("R","I","Q")),
+                       ("src_1",("R","I","Q")),
+                       ("dst_0",("R","DIR"))],
+
+        "__WRITEAT__":[("src_0",("R","I","Q")),
+                       ("src_1",("R","I","Q")),
+                       ("src_2",("R","I","Q"))],
 
-        "__READBYTE__": [("dst_0",{"R","DIR"})],
-        "__WRITEBYTE__":[("src_0",{"R","I","Q"})],
-        "__EXIT__": [("src_0",{"R","I","Q"})]
+        "__SIZE__": [("dst_0",("R","DIR"))]
 
     }
   
+    #instructions the jit tier specializes, anything else runs through execute
+    jit_ops = {"put":None,"add":"+","sub":"-","mul":"*","div":"//","tgt":">","tlt":"<","teq":"=="}
+    jit_tests = {"tgt","tlt","teq"}
+
     def __init__(self):
         self.label_index = None
         self.raw_code = None
         self.instructions = None
+        self.diagnostics = []
+        #True once jit() has run on the instructions, False once unjit() has
+        self.jitted = None
+
+    def bind(self,bot_cls):
+        for instr in self.instructions or []:
+            instr.bind(bot_cls)
+
+    def jit(self):
+        #generate one python function per specializable instruction, operands
+        #   inlined and the following +/-/@ skip chain resolved ahead of time
+        source = []
+        namespace = {}
+        for offset,instr in enumerate(self.instructions or []):
+            body = self.jit_body(offset,instr,namespace)
+            if body is not None:
+                source.append(f"def step_{offset}(bot):")
+                source.extend("    " + line for line in body)
+        exec(compile("\n".join(source) + "\n","<cell_bots jit>","exec"),namespace)
+        for offset,instr in enumerate(self.instructions or []):
+            instr.fast = namespace.get(f"step_{offset}")
+        self.jitted = True
+
+    def unjit(self):
+        for instr in self.instructions or []:
+            instr.fast = None
+        self.jitted = False
+
+    def for_tier(self,jit):
+        #this set run by the jit tier or the interpreter. Simulations can
+        #   share a set, one already given the other tier is copied so the
+        #   simulation running it keeps its own
+        if self.jitted is not None and self.jitted != jit:
+            return self.copy().for_tier(jit)
+        if jit:
+            if not self.jitted:
+                self.jit()
+        elif self.jitted is None:
+            self.unjit()
+        return self
+
+    def copy(self):
+        #fresh Actions, which carry the tier, over the same code and labels
+        other = Instruction_Set()
+        other.label_index = self.label_index
+        other.raw_code = self.raw_code
+        other.diagnostics = self.diagnostics
+        other.instructions = [copy.copy(instr) for instr in self.instructions or []]
+        return other
+
+    def jit_body(self,offset,instr,namespace):
+        instr_type = instr.instr_type
+        body = []
+        test = False
+        if instr_type == "jmp":
+            raw_next = self.label_index[instr.args[0][1]]
+        elif instr_type == "nop" or instr_type in self.jit_ops:
+            raw_next = (offset + 1) % len(self.instructions)
+        else:
+            return None
+
+        if instr_type in self.jit_ops:
+            operands = []
+            for source_type,value in instr.srcs:
+                if source_type == "R":
+                    operands.append(f"regs[{value}]")
+                elif source_type == "I" and type(value) is int:
+                    operands.append(repr(value))
+                else:
+                    return None
+            dst = instr.args[-1]
+            if instr_type not in self.jit_tests and dst[0] != "R" and dst[0] != "DIR":
+                return None
+
+            body.append("regs = bot.registers")
+            if instr_type == "put":
+                expr = operands[0]
+            else:
+                expr = f"{operands[0]} {self.jit_ops[instr_type]} {operands[1]}"
+
+            if instr_type in self.jit_tests:
+                test = True
+                body.append(f"cond = {expr}")
+                body.append("bot.cond_state = cond")
+            elif dst[0] == "R":
+                body.append(f"regs[{dst[1]}] = {expr}")
+            else:
+                namespace[f"dst_{offset}"] = dst
+                body.append(f"bot.handle_dst(dst_{offset},{expr})")
+
+        if instr.is_init:
+            #Cell_Bot.execute marks instr_ptr after the handler ran, which a
+            #   jmp has already pointed at its target
+            body.append(f"bot.executed_inits |= {1 << (raw_next if instr.is_jmp else offset)}")
+
+        on_true = self.jit_next(raw_next,True)
+        on_false = self.jit_next(raw_next,False)
+        if on_true == on_false:
+            body.extend(on_true)
+        else:
+            body.append("if cond:" if test else "if bot.cond_state:")
+            body.extend("    " + line for line in on_true)
+            body.append("else:")
+            body.extend("    " + line for line in on_false)
+        return body
+
+    def jit_next(self,raw_next,cond_state):
+        #same walk as Cell_Bot.skip_invalid, for a known cond_state
+        count = len(self.instructions)
+        offset = raw_next
+        for _ in range(count):
+            instr = self.instructions[offset]
+            if instr.is_init:
+                #depends on which inits already ran, resolve at runtime
+                return [f"bot.instr_ptr = {raw_next}","bot.skip_invalid()"]
+            if instr.is_cond and instr.cond_type != cond_state:
+                offset = (offset + 1) % count
+                continue
+            return [f"bot.instr_ptr = {offset}"]
+        #every instruction would be skipped
+        return [f"bot.instr_ptr = {raw_next}","bot.die()"]
+
+    def content_hash(self):
+        #sha256 of the source, names a program independently of what it's called
+        return hashlib.sha256("".join(self.raw_code).encode()).digest()
 
     def load(self,file_path):
         with open(file_path,"r") as code_fp:
             code = code_fp.readlines()
         self.compile(code)
 
-    #simple parser, doesn't check for poor BOT names or LABEL names
-    #   not all errors will be caught and explained
+    #one pass over the source, a label resolves to the offset of the next
+    #   instruction as soon as it is defined. Every problem found is kept as a
+    #   Diagnostic and they are raised together as one Compilation_Error
+    #   BOT names are still only checked at runtime
     def compile(self,code):
         self.raw_code = code
         instr_list = []
-        tokenize_regex = r"\s+"
-
-        #regex for matching different kinds of args
-        register_regex = r"r\d+"
-        d_style_dir_regex = r"D(?P<dim>\d)\s*(?P<dir>[\+\-])"
-        x_style_dir_regex = r"(?P<dim>[XYZ])\s*(?P<dir>[\+\-])"
-        register_regex = r"r(?P<reg_num>\d+)"
-        immediate_regex = r"(?P<num>\d+)"
-
         label_offsets = {}
-                
-        line_number = -1
-        for line in code:
-            #always increment line_number
-            line_number += 1
-
-            symbol_offset = 0
-            is_init_line = False
-            is_cond_line = False
-            cond_line_type = None
-
-            line_symbols = re.split(tokenize_regex,line.strip())
-            
-            current_symbol = line_symbols[symbol_offset] 
-            #skip empty lines
-            if len(line_symbols) == 0 or current_symbol == "":
+        #(label, line number, line) for every label used as an argument
+        label_refs = []
+        diagnostics = []
+
+        for line_number,line in enumerate(code,1):
+            #everything after a # is a comment
+            symbols = line.split("#",1)[0].split()
+            if not symbols:
                 continue
-            
-            #skip comments
-            if current_symbol.startswith("#"):
-                continue
-            #print(line_symbols)
-
-            #check for a label
-            if ":" in current_symbol:
-                label = current_symbol.split(":",1)[0]
 
+            if ":" in symbols[0]:
+                label,remaining = symbols[0].split(":",1)
                 if label in label_offsets:
-                    print(f"Error on line {line_number}:")
-                    print('"'," ".join(line_symbols),'"')
-                    print(f"2nd definition of label '{label}'")
-                    raise Exception("Compilation Error")
-
-                label_offsets[label] = line_number
-
-                remaining = current_symbol.split(":",1)[1]
-                
+                    diagnostics.append(Diagnostic(line_number,line,f"2nd definition of label '{label}'"))
+                else:
+                    label_offsets[label] = len(instr_list)
+                symbols = [remaining] + symbols[1:] if remaining else symbols[1:]
                 #single label line
-                if len(line_symbols) == 1:
+                if not symbols:
                     continue
 
-                if remaining == "":
-                        symbol_offset += 1
-                        current_symbol = line_symbols[symbol_offset] 
-                else:
-                        current_symbol = remaining
-            
-            #check if init token @ is present
-            if current_symbol.startswith("@"): 
-                is_init_line = True
-                if len(current_symbol) > 1:
-                    #strip @ token off this symbol
-                    current_symbol = current_symbol[1:]
-                else:
-                    #go to the next symbol
-                    symbol_offset += 1
-                    current_symbol = line_symbols[symbol_offset]
-             
-            #check if + or - is present
-            if current_symbol.startswith("+") or current_symbol.startswith("-"):
-                is_cond_line = True
-                cond_line_type = current_symbol.startswith("+")
-                if len(current_symbol) > 1:
-                    #strip +/- token off this symbol
-                    current_symbol = current_symbol[1:]
-                else:
-                    #go to the next symbol
-                    symbol_offset += 1
-                    current_symbol = line_symbols[symbol_offset]
-
-            #Ensure instruction type is valid
-            instr_type = current_symbol
-            if instr_type not in self.instr_args:
-                print(f"Error on line {line_number}:")
-                print('"'," ".join(line_symbols),'"')
-                print(f"Unimplemented instruction '{instr_type}'")
-                raise Exception("Compilation Error")
-
-            #verify arg count and ensure they match regex 
-            expected_args = self.instr_args[instr_type]
-            expected_arg_count = len(expected_args)
-
-            arg_offset = 0
-            args = []
-            if expected_arg_count > len(line_symbols)-symbol_offset:
-                print(f"Error on line {line_number}:")
-                print('"'," ".join(line_symbols),'"')
-                print(f"Instruction '{instr_type}' expects {expected_arg_count} arguments.")
-                print(f"\tsyntax: {instr_type} {expected_args}")
-                raise Exception("Compilation Error")
-
-            while arg_offset < expected_arg_count:
-                #get next token
-                symbol_offset += 1
-                current_symbol = line_symbols[symbol_offset]
-           
-                #stop if we hit a comment 
-                if current_symbol.startswith("#"):
-                    break
-
-                #ensure arg matches one of the expected inputs
-                matched = False
-                
-                for arg_type in expected_args[arg_offset][1]:
-                    if arg_type == "R":
-                        m = re.match(register_regex,current_symbol)
-                        if m:
-                            args.append(["R",int(m.group("reg_num"))])
-                            matched = True
-                            break
-
-                    elif arg_type == "I":
-                        m = re.match(immediate_regex,current_symbol)
-                        if m:
-                            matched = True
-                            args.append(["I",int(m.group("num"))])
-                            break
-
-                    elif arg_type == "Q":
-                        if current_symbol == "Q":
-                            matched = True
-                            args.append(["Q"])
-                            break
-
-                    elif arg_type == "DIR":
-                        #Use bots internal DIR register
-                        if current_symbol == "DIR":
-                            matched = True
-                            args.append(["DIR","DIR"])
-                            break
-                        m = re.match(d_style_dir_regex,current_symbol)
-                        if m:
-                            matched = True
-                            args.append(["DIR",m.group("dim"),m.group("dir")])
-                            break
-
-                        #Normalize X,Y,Z style DIR into 0,1,2
-                        m = re.match(x_style_dir_regex,current_symbol)
-                        if m:
-                            matched = True
-                            x_dim = m.group("dim")
-                            d = {"X":0,"Y":1,"Z":2}
-                            args.append(["DIR",d[x_dim],m.group("dir")])
-                            break
-                    elif arg_type == "L":
-                        #Labels are checked for validity at end of compile
-                        matched = True
-                        args.append(["LABEL",current_symbol])
-                        break
+            try:
+                act = self.parse_instruction(symbols)
+            except ValueError as e:
+                diagnostics.append(Diagnostic(line_number,line,str(e)))
+                continue
 
-                    elif arg_type == "BOT":
-                        #BOT names are checked for validity at RUNTIME!!!
-                        matched = True
-                        args.append(["BOT",current_symbol])
-                        break
-                        
-                if not matched:
-                    print(f"Error on line {line_number}:")
-                    print('"'," ".join(line_symbols),'"')
-                    print(f"expected argument {arg_offset+1} to be of type {expected_args[arg_offset]}, but none matched.")
-                    raise Exception("Compilation Error")
-
-                arg_offset += 1
-            if arg_offset < expected_arg_count:
-                print(f"Error on line {line_number}:")
-                print('"'," ".join(line_symbols),'"')
-                print(f"Instruction '{instr_type}' expects {expected_arg_count} arguments, but only {arg_offset+1} were given")
-                print(f"\tsyntax: {instr_type} {expected_args}")
-                raise Exception("Compilation Error")
-
-            #ensure if there are remaining symbols, the ensure next one starts with an '#' as to start a comment
-            symbol_offset += 1
-            if symbol_offset < len(line_symbols):
-                if not line_symbols[symbol_offset].startswith("#"):
-                    print(f"Error on line {line_number}:")
-                    print('"'," ".join(line_symbols),'"')
-                    print(f"Instruction '{instr_type}' expects {expected_arg_count} arguments, but more were given")
-                    print(f"\tsyntax: {instr_type} {expected_args}")
-                    raise Exception("Compilation Error")
-            act = Action(instr_type,args,cond_type=cond_line_type,is_init=is_init_line)
-            instr_list.append([line_number,act]) 
-            logging.debug(act)
-    
+            for arg in act.args:
+                if arg[0] == "LABEL":
+                    label_refs.append((arg[1],line_number,line))
+            act.decode()
+            instr_list.append(act)
 
-        #mangle label index from raw line numbers to compiled line number
-        for label in label_offsets.keys():
-            index = label_offsets[label]
-            #find first instruction >= label index
-            instr_offset = 0
-            while instr_offset < len(instr_list) and instr_list[instr_offset][0] < index:
-                instr_offset += 1
-            
-            if instr_offset == len(instr_list):
-                #set trailing labels to jump to start
+        #set trailing labels to jump to start
+        for label,offset in label_offsets.items():
+            if offset == len(instr_list):
                 label_offsets[label] = 0
-            else:
-                label_offsets[label] = instr_offset
-
-        #get rid of raw line numbers now that labels are adjusted
-        instr_list = [x for _,x in instr_list]
-        logging.debug(label_offsets)
 
         #check that labels actually exist
-        for instr in instr_list:
-            for arg_tup in instr.args:
-                arg_type,*args = arg_tup
-                if arg_type == "LABEL" and args[0] not in label_offsets: 
-                    print(f"Error in instruction '{instr}'")
-                    print(f"label '{arg}' was never defined")
-                    raise Exception("Compilation Error")
+        for label,line_number,line in label_refs:
+            if label not in label_offsets:
+                diagnostics.append(Diagnostic(line_number,line,f"label '{label}' was never defined"))
+
+        self.diagnostics = diagnostics
+        if diagnostics:
+            diagnostics.sort(key=lambda diagnostic: diagnostic.line_number)
+            raise Compilation_Error(diagnostics)
+
+        #a program made only of @ and +/- lines can skip every instruction
+        #   and die, that death is visible so it can never run ahead
+        if all(instr.is_init or instr.is_cond for instr in instr_list):
+            for instr in instr_list:
+                instr.is_local = False
 
         self.instructions = instr_list
         self.label_index = label_offsets
-        return
+        return diagnostics
+
+    def parse_instruction(self,symbols):
+        #[@][+|-]instr arg..., the prefixes may stand alone or be glued on
+        offset = 0
+        current_symbol = symbols[0]
+        is_init_line = current_symbol.startswith("@")
+        if is_init_line:
+            current_symbol,offset = self.strip_prefix(current_symbol,symbols,offset)
+
+        cond_line_type = None
+        if current_symbol.startswith("+") or current_symbol.startswith("-"):
+            cond_line_type = current_symbol.startswith("+")
+            current_symbol,offset = self.strip_prefix(current_symbol,symbols,offset)
+
+        instr_type = current_symbol
+        expected_args = self.instr_args.get(instr_type)
+        if expected_args is None:
+            raise ValueError(f"Unimplemented instruction '{instr_type}'")
+
+        arg_symbols = symbols[offset + 1:]
+        if len(arg_symbols) != len(expected_args):
+            raise ValueError(f"Instruction '{instr_type}' expects {len(expected_args)} arguments, but {len(arg_symbols)} were given"
+                             f"\n\tsyntax: {self.syntax(instr_type)}")
+
+        args = [self.parse_arg(symbol,arg_types,i) for i,(symbol,(_,arg_types)) in enumerate(zip(arg_symbols,expected_args))]
+        return Action(instr_type,args,cond_type=cond_line_type,is_init=is_init_line)
+
+    def strip_prefix(self,symbol,symbols,offset):
+        #drop symbol's one character prefix, moving on to the next symbol if
+        #   the prefix stood alone
+        if len(symbol) > 1:
+            return symbol[1:],offset
+        offset += 1
+        if offset == len(symbols):
+            raise ValueError(f"Expected an instruction after '{symbols[offset - 1]}'")
+        return symbols[offset],offset
+
+    #precompiled operand patterns, an operand must match one in full
+    register_regex = re.compile(r"r(\d+)")
+    immediate_regex = re.compile(r"\d+")
+    dir_regex = re.compile(r"(?:D(\d+)|([XYZ]))([\+\-])")
+    x_style_dims = {"X":0,"Y":1,"Z":2}
+
+    def parse_arg(self,symbol,arg_types,arg_offset):
+        #arg types are tried in the order instr_args lists them
+        for arg_type in arg_types:
+            if arg_type == "R":
+                m = self.register_regex.fullmatch(symbol)
+                if m:
+                    return ["R",int(m.group(1))]
+            elif arg_type == "I":
+                if self.immediate_regex.fullmatch(symbol):
+                    return ["I",int(symbol)]
+            elif arg_type == "Q":
+                if symbol == "Q":
+                    return ["Q"]
+            elif arg_type == "DIR":
+                #Use bots internal DIR register
+                if symbol == "DIR":
+                    return ["DIR","DIR"]
+                #Normalize X,Y,Z style DIR into 0,1,2
+                m = self.dir_regex.fullmatch(symbol)
+                if m:
+                    dim = int(m.group(1)) if m.group(1) is not None else self.x_style_dims[m.group(2)]
+                    return ["DIR",dim,m.group(3)]
+            elif arg_type == "L":
+                return ["LABEL",symbol]
+            elif arg_type == "BOT":
+                return ["BOT",symbol]
+        raise ValueError(f"expected argument {arg_offset+1} to be of type {'/'.join(arg_types)}, but got '{symbol}'")
+
+    def syntax(self,instr_type):
+        return " ".join([instr_type] + ["/".join(arg_types) for _,arg_types in self.instr_args[instr_type]])
+
+#bump whenever compile output or the Action record layout changes, cached
+#   programs from any other version are thrown away
+COMPILER_VERSION = 2
+
+class Program_Cache:
+    #compiled programs on disk, one marshal file per program keyed by the
+    #   hash of its source, so a warm start never parses anything
+    #   files are touched on every hit and the least recently used are
+    #   evicted past max_entries. A cache that can't be written to only
+    #   costs the compile, programs still load
+    def __init__(self,cache_dir=".cb_cache",max_entries=1024):
+        self.cache_dir = cache_dir
+        self.max_entries = max_entries
+        self.prefix = f"v{COMPILER_VERSION}-{sys.implementation.cache_tag}-"
+        self.hits = 0
+        self.misses = 0
+        #cleared by the first failed write, after that nothing is written
+        self.writable = True
+        #entries in cache_dir, counted once and kept up to date by writes.
+        #   Other processes writing the same cache only show up when an
+        #   eviction lists it again
+        self.entry_count = 0
+        try:
+            os.makedirs(cache_dir,exist_ok=True)
+            self.evict_stale()
+        except OSError as e:
+            logging.debug("Program cache %s unusable, compiling without it: %s",cache_dir,e)
+            self.writable = False
+
+    def entry_path(self,code):
+        key = hashlib.sha256("".join(code).encode()).hexdigest()
+        return os.path.join(self.cache_dir,self.prefix + key + ".cbc")
+
+    def load(self,file_path):
+        with open(file_path,"r") as code_fp:
+            code = code_fp.readlines()
+        return self.compile(code)
+
+    def compile(self,code):
+        path = self.entry_path(code)
+        instr = self.read_entry(path,code)
+        if instr is not None:
+            self.hits += 1
+            return instr
+
+        self.misses += 1
+        instr = Instruction_Set()
+        instr.compile(code)
+        if self.writable:
+            self.write_entry(path,instr)
+        return instr
+
+    def read_entry(self,path,code):
+        try:
+            with open(path,"rb") as entry_fp:
+                raw_code,label_index,records = marshal.loads(entry_fp.read())
+        except OSError:
+            #missing, or a cache directory we can't read
+            return None
+        except (EOFError,ValueError,TypeError):
+            #torn or foreign file, compile over it
+            return None
+        if raw_code != "".join(code):
+            return None
+        try:
+            os.utime(path)
+        except OSError:
+            #read-only cache, it just can't keep track of use
+            pass
+
+        instr = Instruction_Set()
+        instr.raw_code = code
+        instr.label_index = label_index
+        instr.instructions = [Action.from_record(record) for record in records]
+        return instr
+
+    def write_entry(self,path,instr):
+        entry = ("".join(instr.raw_code),instr.label_index,[act.to_record() for act in instr.instructions])
+        #write then rename, readers never see half an entry
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_path,"wb") as entry_fp:
+                entry_fp.write(marshal.dumps(entry))
+            new_entry = not os.path.exists(path)
+            os.replace(tmp_path,path)
+            if new_entry:
+                self.entry_count += 1
+                if self.entry_count > self.max_entries:
+                    self.evict_lru()
+        except OSError as e:
+            logging.debug("Can't write to program cache %s, compiling without it: %s",self.cache_dir,e)
+            self.writable = False
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+
+    def entries(self):
+        return [name for name in os.listdir(self.cache_dir) if name.endswith(".cbc")]
+
+    def evict_stale(self):
+        #entries written by another compiler or python version can't be used,
+        #   the rest are counted
+        self.entry_count = 0
+        for name in self.entries():
+            if name.startswith(self.prefix):
+                self.entry_count += 1
+            else:
+                self.remove(name)
+
+    def evict_lru(self):
+        names = self.entries()
+        self.entry_count = len(names)
+        if len(names) <= self.max_entries:
+            return
+        def last_used(name):
+            try:
+                return os.stat(os.path.join(self.cache_dir,name)).st_mtime
+            except FileNotFoundError:
+                return 0
+        for name in sorted(names,key=last_used)[:len(names) - self.max_entries]:
+            self.remove(name)
+        self.entry_count = self.max_entries
+
+    def remove(self,name):
+        try:
+            os.remove(os.path.join(self.cache_dir,name))
+        except FileNotFoundError:
+            pass
 
 def test_bad_bots():
     import os
@@ -823,8 +2086,8 @@ def test_bad_bots():
 
 
 def main():
-    import os
     sim = Simulation(register_count=2,dimensions=2)
+    cache = Program_Cache()
     bot_code_dir = "bots"
     sys_bot_code_dir = "sys_bots"
     for bot in os.listdir(bot_code_dir):
@@ -834,8 +2097,7 @@ def main():
         try:
             logging.debug("compiling",bot)
             bot_fp = os.path.join(bot_code_dir,bot)
-            instr = Instruction_Set()
-            instr.load(bot_fp)
+            instr = cache.load(bot_fp)
             logging.debug(f"compiled {bot} successfully.")
             sim.add_bot_code(bot_name,instr)
         except Exception as e:
@@ -850,8 +2112,7 @@ def main():
         try:
             logging.debug(f"compiling sys_bot {bot}")
             bot_fp = os.path.join(sys_bot_code_dir,bot)
-            instr = Instruction_Set()
-            instr.load(bot_fp)
+            instr = cache.load(bot_fp)
             logging.debug(f"compiled sys_bot {bot} successfully.")
             sim.add_sys_bot_code(bot_name,instr)
         except Exception as e:
@@ -860,7 +2121,9 @@ def main():
                 raise e
 
     sim.register_bot("hello_world",(0,0))
-    sim.run()
+    result = sim.run()
+    if result.reason == "exit":
+        sys.exit(result.exit_code)
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,449 @@
+#Binary checkpoints of a running Simulation
+#   a checkpoint holds the program table, the simulation counters, every
+#   live bot and every message in flight. Programs are named by
+#   Instruction_Set.content_hash and never written out, restore is handed
+#   the compiled programs and refuses any whose source changed.
+#
+#   A Checkpointer writes one full checkpoint, then deltas that only carry
+#   the bots whose state changed since the checkpoint before, plus the ids
+#   of bots that died. It watches the simulation as an Observer, so a delta
+#   only encodes the bots that ran, spawned or were sent something since the
+#   last save, blocked and idle bots cost nothing. Bots changed by hand
+#   between ticks aren't seen, save(full=True) after doing that. Messages
+#   are always written whole, they move every tick anyway.
+#
+#   Layout, all integers are LEB128 varints, signed ones zigzag encoded
+#       magic "CBCK", version, kind (full/delta), chain id, sequence
+#       dimensions, register_count, time, bot_id_itr
+#       programs: count, (name, is_sys, sha256) ...
+#       bot_type_counts: count, (program index, count) ...
+#       delta only: removed count, ids ...
+#       bots: count, (record length, record) ...
+#       messages: count, (coords, velocity, value, kill, expires + 1) ...
+#       crc32 of everything above, 4 bytes little endian
+import io
+import os
+import sys
+import zlib
+import hashlib
+
+from cell_bots import Simulation, Observer, Cell_Bot, Sys_Cell_Bot
+
+MAGIC = b"CBCK"
+VERSION = 2
+
+FULL = 0
+DELTA = 1
+
+#bot record flags
+COND_STATE = 1
+WAITING = 2
+HAS_ARG_BUFFER = 4
+SLEEPING = 8
+BLOCKED = 16
+
+class Checkpoint_Error(Exception):
+    pass
+
+def put_uint(out,n):
+    while n > 0x7F:
+        out.append((n & 0x7F) | 0x80)
+        n >>= 7
+    out.append(n)
+
+def put_int(out,n):
+    #zigzag, so small negatives stay small, python ints of any size
+    put_uint(out,n << 1 if n >= 0 else ((-n) << 1) - 1)
+
+def put_bytes(out,data):
+    put_uint(out,len(data))
+    out += data
+
+def put_value(out,value):
+    #registers, queues and messages only ever hold ints
+    if type(value) is not int and type(value) is not bool:
+        raise Checkpoint_Error(f"Can't checkpoint value {value!r}")
+    put_int(out,value)
+
+class Reader:
+    def __init__(self,data):
+        self.data = data
+        self.pos = 0
+
+    def uint(self):
+        data = self.data
+        pos = self.pos
+        result = 0
+        shift = 0
+        while True:
+            byte = data[pos]
+            pos += 1
+            result |= (byte & 0x7F) << shift
+            if byte < 0x80:
+                break
+            shift += 7
+        self.pos = pos
+        return result
+
+    def int(self):
+        n = self.uint()
+        return -((n + 1) >> 1) if n & 1 else n >> 1
+
+    def ints(self,count):
+        return tuple(self.int() for _ in range(count))
+
+    def bytes(self):
+        size = self.uint()
+        data = self.data[self.pos:self.pos + size]
+        if len(data) != size:
+            raise Checkpoint_Error("Checkpoint is truncated")
+        self.pos += size
+        return bytes(data)
+
+    def str(self):
+        return self.bytes().decode()
+
+def encode_bot(bot,program_index,sim,wake_tick):
+    out = bytearray()
+    put_uint(out,bot.id)
+    put_uint(out,program_index[bot.bot_name])
+    for n in bot.coords:
+        put_int(out,n)
+    for n in bot.heading:
+        put_int(out,n)
+    put_uint(out,bot.instr_ptr)
+
+    flags = 0
+    if bot.cond_state:
+        flags |= COND_STATE
+    if bot.waiting_for_mesg:
+        flags |= WAITING
+    if bot.arg_buffer is not None:
+        flags |= HAS_ARG_BUFFER
+    if wake_tick is not None:
+        flags |= SLEEPING
+    if bot.id in sim.blocked:
+        flags |= BLOCKED
+    put_uint(out,flags)
+
+    put_uint(out,bot.ttl)
+    put_uint(out,bot.queue_size)
+    for value in bot.registers:
+        put_value(out,value)
+    put_uint(out,bot.executed_inits)
+    put_uint(out,bot.q_len)
+    for value in bot.queue_values():
+        put_value(out,value)
+    put_uint(out,bot.remaining_args)
+    if bot.arg_buffer is not None:
+        put_uint(out,len(bot.arg_buffer))
+        for value in bot.arg_buffer:
+            put_value(out,value)
+    if wake_tick is not None:
+        put_uint(out,wake_tick)
+
+    if isinstance(bot,Sys_Cell_Bot):
+        put_bytes(out,(bot.stream or "").encode())
+        put_bytes(out,bot.byte_buffer)
+        put_uint(out,bot.byte_buffer_index)
+        put_uint(out,bot.byte_buffer_remaining)
+    return out
+
+def decode_bot(sim,data,names):
+    #rebuild a bot from its record, the caller places it
+    reader = Reader(data)
+    bot_id = reader.uint()
+    bot_name = names[reader.uint()]
+    coords = reader.ints(sim.dimensions)
+    heading = reader.ints(sim.dimensions)
+    if heading == sim.default_heading:
+        heading = sim.default_heading
+
+    if bot_name in sim.system_bots:
+        bot = Sys_Cell_Bot(bot_name,coords,sim,heading=heading)
+    else:
+        bot = Cell_Bot(bot_name,coords,sim,heading=heading)
+    bot.id = bot_id
+    bot.instr_ptr = reader.uint()
+
+    flags = reader.uint()
+    bot.cond_state = bool(flags & COND_STATE)
+    bot.waiting_for_mesg = bool(flags & WAITING)
+
+    bot.ttl = reader.uint()
+    bot.queue_size = reader.uint()
+    bot.registers = [reader.int() for _ in range(sim.register_count)]
+    bot.executed_inits = reader.uint()
+    queued = [reader.int() for _ in range(reader.uint())]
+    bot.queue = queued + [None]*(bot.queue_size - len(queued))
+    bot.q_head = 0
+    bot.q_len = len(queued)
+    bot.remaining_args = reader.uint()
+    if flags & HAS_ARG_BUFFER:
+        bot.arg_buffer = [reader.int() for _ in range(reader.uint())]
+    wake_tick = reader.uint() if flags & SLEEPING else None
+
+    if isinstance(bot,Sys_Cell_Bot):
+        bot.stream = reader.str() or None
+        if bot.stream in sim.file_maps:
+            bot.file_map = sim.file_maps[bot.stream]
+        elif bot.stream == "STDIN":
+            #the read position of a live stream can't be restored, reading
+            #   carries on from wherever the new handle is
+            bot.give_file_handle(sim.stdin if sim.stdin is not None else sys.stdin.buffer)
+        elif bot.stream == "STDOUT":
+            bot.give_file_handle(sim.stdout if sim.stdout is not None else sys.stdout)
+        elif bot.stream == "STDERR":
+            bot.give_file_handle(sim.stderr if sim.stderr is not None else sys.stderr)
+        elif bot.stream is not None:
+            raise Checkpoint_Error(f"No mapped file given for {bot.stream}")
+        bot.byte_buffer = reader.bytes()
+        bot.byte_buffer_index = reader.uint()
+        bot.byte_buffer_remaining = reader.uint()
+    return bot,bool(flags & BLOCKED),wake_tick
+
+def record_id(data):
+    return Reader(data).uint()
+
+def record_digest(record):
+    return hashlib.blake2b(record,digest_size=16).digest()
+
+class Checkpointer(Observer):
+    #writes a full checkpoint first, then deltas against the previous save
+    def __init__(self,sim):
+        self.sim = sim
+        #random, so deltas from different runs can't be chained together
+        self.chain = int.from_bytes(os.urandom(8),"little")
+        self.sequence = None
+        #bot id -> digest of the record last written for it
+        self.written = None
+        #bots that may have changed since the last save, and ids of bots
+        #   that died since then
+        self.dirty = set()
+        self.removed = set()
+        sim.observers.append(self)
+
+    def spawned(self,sim,bot):
+        self.dirty.add(bot)
+
+    def died(self,sim,bot):
+        #a pooled bot can come back under a new id before the next save
+        self.removed.add(bot.id)
+        self.dirty.add(bot)
+
+    def delivered(self,sim,bot,value,kill,accepted):
+        self.dirty.add(bot)
+
+    def tick_started(self,sim):
+        #every bot that runs this tick is runnable now, woken by a message
+        #   or done sitting out the ticks it ran ahead
+        self.dirty.update(sim.runnable.values())
+        self.dirty.update(sim.sleeping.get(sim.time,()))
+
+    def close(self):
+        #no more deltas, a later save would miss what happened since
+        if self in self.sim.observers:
+            self.sim.observers.remove(self)
+
+    def save(self,file_handle,full=False):
+        sim = self.sim
+        #output buffered before the checkpoint must not be lost or repeated
+        #   by a run restored from it
+        sim.flush_output()
+        programs = sorted(sim.bot_code.items())
+        program_index = {name: i for i,(name,_) in enumerate(programs)}
+        wake_ticks = {}
+        for wake_tick,bots in sim.sleeping.items():
+            for bot in bots:
+                wake_ticks[bot.id] = wake_tick
+
+        kind = FULL if full or self.written is None else DELTA
+        sequence = 0 if self.sequence is None else self.sequence + 1
+
+        records = []
+        if kind == FULL:
+            written = {}
+            bots = sim.bot_grid.values()
+            removed = []
+        else:
+            written = self.written
+            bots = [bot for bot in self.dirty if not bot.dead]
+            removed = sorted(bot_id for bot_id in self.removed if bot_id in written)
+            for bot_id in removed:
+                del written[bot_id]
+        for bot in sorted(bots,key=lambda bot: bot.id):
+            record = encode_bot(bot,program_index,sim,wake_ticks.get(bot.id))
+            digest = record_digest(record)
+            if written.get(bot.id) != digest:
+                written[bot.id] = digest
+                records.append(record)
+
+        out = bytearray(MAGIC)
+        for n in (VERSION,kind,self.chain,sequence,sim.dimensions,sim.register_count,sim.time,sim.bot_id_itr):
+            put_uint(out,n)
+
+        put_uint(out,len(programs))
+        for name,instruction_set in programs:
+            put_bytes(out,name.encode())
+            put_uint(out,name in sim.system_bots)
+            out += instruction_set.content_hash()
+
+        counts = [(program_index[name],count) for name,count in sim.bot_type_counts.items() if name in program_index]
+        put_uint(out,len(counts))
+        for index,count in counts:
+            put_uint(out,index)
+            put_int(out,count)
+
+        if kind == DELTA:
+            put_uint(out,len(removed))
+            for bot_id in removed:
+                put_uint(out,bot_id)
+
+        put_uint(out,len(records))
+        for record in records:
+            put_bytes(out,record)
+
+        put_uint(out,len(sim.messages))
+        for coords,velocity,value,kill,expires in sim.messages:
+            for n in coords:
+                put_int(out,n)
+            for n in velocity:
+                put_int(out,n)
+            put_value(out,value)
+            put_uint(out,bool(kill))
+            put_uint(out,0 if expires is None else expires + 1)
+
+        out += zlib.crc32(out).to_bytes(4,"little")
+        file_handle.write(out)
+
+        self.sequence = sequence
+        self.written = written
+        self.dirty.clear()
+        self.removed.clear()
+        return kind
+
+def save(sim,file_handle):
+    #one-off full checkpoint
+    checkpointer = Checkpointer(sim)
+    checkpointer.save(file_handle,full=True)
+    checkpointer.close()
+
+class Checkpoint:
+    #one parsed checkpoint file, bot records are left encoded until restore
+    def __init__(self,data):
+        if len(data) < len(MAGIC) + 4 or data[:len(MAGIC)] != MAGIC:
+            raise Checkpoint_Error("Not a cell bots checkpoint")
+        body = data[:-4]
+        if zlib.crc32(body) != int.from_bytes(data[-4:],"little"):
+            raise Checkpoint_Error("Checkpoint is corrupt")
+
+        reader = Reader(body)
+        reader.pos = len(MAGIC)
+        self.version = reader.uint()
+        if self.version != VERSION:
+            raise Checkpoint_Error(f"Unsupported checkpoint version {self.version}")
+        self.kind = reader.uint()
+        self.chain = reader.uint()
+        self.sequence = reader.uint()
+        self.dimensions = reader.uint()
+        self.register_count = reader.uint()
+        self.time = reader.uint()
+        self.bot_id_itr = reader.uint()
+
+        #(name, is_sys, content hash)
+        self.programs = []
+        for _ in range(reader.uint()):
+            name = reader.str()
+            is_sys = bool(reader.uint())
+            content_hash = bytes(reader.data[reader.pos:reader.pos + 32])
+            reader.pos += 32
+            self.programs.append((name,is_sys,content_hash))
+        names = [name for name,_,_ in self.programs]
+
+        self.bot_type_counts = {}
+        for _ in range(reader.uint()):
+            name = names[reader.uint()]
+            self.bot_type_counts[name] = reader.int()
+
+        self.removed = []
+        if self.kind == DELTA:
+            self.removed = [reader.uint() for _ in range(reader.uint())]
+
+        self.records = [reader.bytes() for _ in range(reader.uint())]
+
+        dimensions = self.dimensions
+        self.messages = []
+        for _ in range(reader.uint()):
+            coords = reader.ints(dimensions)
+            velocity = reader.ints(dimensions)
+            value = reader.int()
+            kill = bool(reader.uint())
+            expires = reader.uint()
+            self.messages.append((coords,velocity,value,kill,None if expires == 0 else expires - 1))
+
+def read(file_handle):
+    return Checkpoint(file_handle.read())
+
+def restore(file_handles,programs,stdin=None,stdout=None,stderr=None,mapped_files=None,**sim_args):
+    #file_handles is a full checkpoint followed by any deltas saved after it,
+    #   programs maps bot names to Instruction_Sets, sim_args go to Simulation
+    #   mapped_files maps bot names to (path, writable) for Simulation.map_file,
+    #   the files themselves are not part of a checkpoint
+    checkpoints = [read(file_handle) for file_handle in file_handles]
+    if not checkpoints or checkpoints[0].kind != FULL:
+        raise Checkpoint_Error("Restore must start from a full checkpoint")
+
+    #bot id -> (program names, record), updated by each delta in turn
+    records = {}
+    previous = None
+    for checkpoint in checkpoints:
+        if previous is not None:
+            if checkpoint.kind != DELTA or checkpoint.chain != previous.chain or checkpoint.sequence != previous.sequence + 1:
+                raise Checkpoint_Error(f"Checkpoint {checkpoint.sequence} doesn't follow checkpoint {previous.sequence}")
+        names = [name for name,_,_ in checkpoint.programs]
+        for bot_id in checkpoint.removed:
+            del records[bot_id]
+        for record in checkpoint.records:
+            records[record_id(record)] = (names,record)
+        previous = checkpoint
+    last = checkpoints[-1]
+
+    sim = Simulation(last.dimensions,last.register_count,**sim_args)
+    sim.stdin = stdin
+    sim.stdout = stdout
+    sim.stderr = stderr
+    for name,is_sys,content_hash in last.programs:
+        if name not in programs:
+            raise Checkpoint_Error(f"No program given for {name}")
+        instruction_set = programs[name]
+        if instruction_set.content_hash() != content_hash:
+            raise Checkpoint_Error(f"Program {name} doesn't match the checkpointed source")
+        if is_sys:
+            sim.add_sys_bot_code(name,instruction_set)
+        else:
+            sim.add_bot_code(name,instruction_set)
+
+    for bot_name,(path,writable) in (mapped_files or {}).items():
+        sim.map_file(bot_name,path,writable)
+
+    sim.time = last.time
+    sim.bot_id_itr = last.bot_id_itr
+    sim.bot_type_counts = dict(last.bot_type_counts)
+
+    #placed like spawns, so a hasher and the chunk index see every bot
+    for bot_id in sorted(records):
+        names,record = records[bot_id]
+        bot,blocked,wake_tick = decode_bot(sim,record,names)
+        sim.place_bot(bot,blocked,wake_tick)
+
+    for coords,velocity,value,kill,expires in last.messages:
+        sim.messages.add(coords,velocity,value,kill,expires)
+    return sim
+
+def fork(sim,**sim_args):
+    #an independent copy of sim at its current tick, sharing its programs
+    buffer = io.BytesIO()
+    save(sim,buffer)
+    buffer.seek(0)
+    mapped_files = {bot_name: (file_map.path,file_map.writable) for bot_name,file_map in sim.file_maps.items()}
+    return restore([buffer],sim.bot_code,stdin=sim.stdin,stdout=sim.stdout,stderr=sim.stderr,mapped_files=mapped_files,**sim_args)
@@ -0,0 +1,271 @@
+#Frame export, the grid drawn as an RGB image tick by tick
+#   a Frame_Exporter watches a Simulation as an Observer and keeps a pixel
+#   buffer for one Viewport up to date. Bots are redrawn when they spawn or
+#   die, so they cost what changed in a tick, never the size of the
+#   viewport. Messages are redrawn where they were and where they are, but
+#   finding them takes one pass over every message in flight per emitted
+#   frame, the same order of work as the tick's message phase (vectorised
+#   with the numpy backend).
+#
+#   viewport = Viewport((-64,-64),128,128)
+#   exporter = Frame_Exporter(sim,viewport,Raw_Sink(sys.stdout.buffer))
+#   sim.run()
+#
+#   cell_bots.py's main attaches no exporter, so put the lines above in a
+#   script of your own and pipe that into ffmpeg. Point sim.stdout
+#   elsewhere first, or bot output ends up in the frames
+#
+#   python render.py | ffmpeg -f rawvideo -pix_fmt rgb24 -s 128x128 -i - run.mp4
+#
+#Sinks get every emitted frame as (tick, exporter, changes), changes being
+#   the (pixel index, rgb) pairs that differ from the last emitted frame.
+#   Raw_Sink writes whole frames, Ppm_Sink writes every Nth frame as an
+#   image and Delta_Sink writes the changes with a whole frame every N.
+import collections
+import zlib
+
+from cell_bots import Observer, Numpy_Message_Transport, numpy
+from checkpoint import put_uint, Reader
+
+BACKGROUND = (0,0,0)
+MESSAGE = (255,255,255)
+
+class Viewport:
+    #width x height cells from origin, x along axes[0] and y along axes[1]
+    #   every other dimension is sliced at origin's value, or with flatten
+    #   every cell along it lands on the same pixel
+    def __init__(self,origin,width,height,axes=(0,1),flatten=False):
+        self.origin = tuple(origin)
+        self.width = width
+        self.height = height if len(axes) > 1 else 1
+        self.axes = tuple(axes)
+        self.flatten = flatten
+        #dimensions that must match origin for a cell to show
+        self.sliced = () if flatten else tuple(d for d in range(len(origin)) if d not in self.axes)
+
+    def pixel(self,coords):
+        #pixel index of a cell, None when it's outside the viewport
+        for d in self.sliced:
+            if coords[d] != self.origin[d]:
+                return None
+        x = coords[self.axes[0]] - self.origin[self.axes[0]]
+        if x < 0 or x >= self.width:
+            return None
+        if len(self.axes) == 1:
+            return x
+        y = coords[self.axes[1]] - self.origin[self.axes[1]]
+        if y < 0 or y >= self.height:
+            return None
+        return y * self.width + x
+
+def name_color(name):
+    #stable per program, kept away from the background and message colors
+    code = zlib.crc32(name.encode())
+    return (64 + (code & 0x7F),64 + ((code >> 8) & 0x7F),64 + ((code >> 16) & 0x7F))
+
+class Frame_Exporter(Observer):
+    #attach between ticks, a frame is emitted on every tick divisible by
+    #   every, starting with the state right now
+    def __init__(self,sim,viewport,sink,every=1,palette=None):
+        self.sim = sim
+        self.viewport = viewport
+        self.sink = sink
+        self.every = every
+        #bot name -> rgb, names not in it get name_color
+        self.palette = dict(palette or {})
+
+        self.pixels = bytearray(bytes(BACKGROUND) * (viewport.width * viewport.height))
+        #pixel -> {coords: bot name}, more than one only when flattened
+        self.bots = {}
+        #pixel -> messages on it at the last emitted frame
+        self.messages = {}
+        self.dirty = set()
+
+        #one pass over the grid, going through bots_in_box would switch on
+        #   the simulation's chunk index for good
+        for bot in sim.bot_grid.values():
+            self.spawned(sim,bot)
+        self.emit(sim)
+        sim.observers.append(self)
+
+    def spawned(self,sim,bot):
+        pixel = self.viewport.pixel(bot.coords)
+        if pixel is not None:
+            self.bots.setdefault(pixel,{})[bot.coords] = bot.bot_name
+            self.dirty.add(pixel)
+
+    def died(self,sim,bot):
+        pixel = self.viewport.pixel(bot.coords)
+        if pixel is not None:
+            cell = self.bots[pixel]
+            del cell[bot.coords]
+            if not cell:
+                del self.bots[pixel]
+            self.dirty.add(pixel)
+
+    def ticked(self,sim):
+        if sim.time % self.every == 0:
+            self.emit(sim)
+
+    def color(self,pixel):
+        cell = self.bots.get(pixel)
+        if cell:
+            name = cell[min(cell)]
+            color = self.palette.get(name)
+            if color is None:
+                color = self.palette[name] = name_color(name)
+            return color
+        if pixel in self.messages:
+            return MESSAGE
+        return BACKGROUND
+
+    def message_pixels(self,sim):
+        #pixel -> message count for everything in flight, messages have no
+        #   identity to follow them by so this walks all of them
+        messages = sim.messages
+        viewport = self.viewport
+        if isinstance(messages,Numpy_Message_Transport) and messages.count:
+            coords = messages.coords[:messages.count]
+            keep = numpy.ones(len(coords),dtype=bool)
+            for d in viewport.sliced:
+                keep &= coords[:,d] == viewport.origin[d]
+            x = coords[:,viewport.axes[0]] - viewport.origin[viewport.axes[0]]
+            keep &= (x >= 0) & (x < viewport.width)
+            index = x
+            if len(viewport.axes) > 1:
+                y = coords[:,viewport.axes[1]] - viewport.origin[viewport.axes[1]]
+                keep &= (y >= 0) & (y < viewport.height)
+                index = y * viewport.width + x
+            pixels,counts = numpy.unique(index[keep],return_counts=True)
+            found = dict(zip(pixels.tolist(),counts.tolist()))
+            for coords,*_ in messages.pending:
+                pixel = viewport.pixel(coords)
+                if pixel is not None:
+                    found[pixel] = found.get(pixel,0) + 1
+            return found
+        found = collections.Counter()
+        for coords,*_ in messages:
+            pixel = viewport.pixel(coords)
+            if pixel is not None:
+                found[pixel] += 1
+        return found
+
+    def emit(self,sim):
+        messages = self.message_pixels(sim)
+        dirty = self.dirty
+        dirty.update(self.messages.keys() ^ messages.keys())
+        self.messages = messages
+
+        pixels = self.pixels
+        changes = []
+        for pixel in dirty:
+            color = self.color(pixel)
+            offset = pixel * 3
+            if pixels[offset:offset + 3] != bytes(color):
+                pixels[offset:offset + 3] = bytes(color)
+                changes.append((pixel,color))
+        dirty.clear()
+        changes.sort()
+        self.sink.write(sim.time,self,changes)
+
+    def array(self):
+        #height x width x 3 uint8 view of the pixels, needs numpy
+        return numpy.frombuffer(self.pixels,dtype=numpy.uint8).reshape(self.viewport.height,self.viewport.width,3)
+
+    def close(self):
+        if self in self.sim.observers:
+            self.sim.observers.remove(self)
+        self.sink.close()
+
+def ppm(width,height,pixels):
+    return f"P6 {width} {height} 255\n".encode() + bytes(pixels)
+
+class Raw_Sink:
+    #every frame as width * height * 3 bytes of rgb24
+    def __init__(self,file_handle):
+        self.file_handle = file_handle
+
+    def write(self,tick,exporter,changes):
+        self.file_handle.write(exporter.pixels)
+
+    def close(self):
+        self.file_handle.flush()
+
+class Ppm_Sink:
+    #every Nth frame as its own binary PPM image
+    def __init__(self,path_pattern="frame_{tick:08d}.ppm",every=1):
+        self.path_pattern = path_pattern
+        self.every = every
+        self.frames = 0
+
+    def write(self,tick,exporter,changes):
+        if self.frames % self.every == 0:
+            with open(self.path_pattern.format(tick=tick),"wb") as image_fp:
+                image_fp.write(ppm(exporter.viewport.width,exporter.viewport.height,exporter.pixels))
+        self.frames += 1
+
+    def close(self):
+        pass
+
+#Delta_Sink records
+FULL = 0
+DELTA = 1
+
+class Delta_Sink:
+    #a frame stream of changed pixels, with a whole frame every full_every
+    #   frames to start playback from. Layout, integers are varints
+    #       magic "CBFR", width, height
+    #       frames: kind, tick, then for FULL the rgb24 pixels or for DELTA
+    #           count, (pixel index, r, g, b) ...
+    def __init__(self,file_handle,full_every=256):
+        self.file_handle = file_handle
+        self.full_every = full_every
+        self.frames = 0
+
+    def write(self,tick,exporter,changes):
+        out = bytearray()
+        if self.frames == 0:
+            out += b"CBFR"
+            put_uint(out,exporter.viewport.width)
+            put_uint(out,exporter.viewport.height)
+        if self.frames % self.full_every == 0:
+            put_uint(out,FULL)
+            put_uint(out,tick)
+            out += exporter.pixels
+        else:
+            put_uint(out,DELTA)
+            put_uint(out,tick)
+            put_uint(out,len(changes))
+            for pixel,color in changes:
+                put_uint(out,pixel)
+                out += bytes(color)
+        self.file_handle.write(out)
+        self.frames += 1
+
+    def close(self):
+        self.file_handle.flush()
+
+def read_deltas(data):
+    #(tick, width, height, pixels) for every frame of a Delta_Sink stream
+    if data[:4] != b"CBFR":
+        raise ValueError("Not a cell bot frame stream")
+    reader = Reader(data)
+    reader.pos = 4
+    width = reader.uint()
+    height = reader.uint()
+    size = width * height * 3
+    pixels = None
+    while reader.pos < len(data):
+        kind = reader.uint()
+        tick = reader.uint()
+        if kind == FULL:
+            pixels = bytearray(data[reader.pos:reader.pos + size])
+            reader.pos += size
+        else:
+            if pixels is None:
+                raise ValueError("Frame stream doesn't start with a full frame")
+            for _ in range(reader.uint()):
+                offset = reader.uint() * 3
+                pixels[offset:offset + 3] = data[reader.pos:reader.pos + 3]
+                reader.pos += 3
+        yield tick,width,height,bytes(pixels)
@@ -0,0 +1,158 @@
+#Opt-in profiling of a running simulation
+#   hand a Profiler to Simulation and it watches as an Observer, while
+#   Simulation.tick and tick_bot time each phase and count each instruction
+#   for it; without one the only cost is a None check on tick, block and wake
+#
+#   profiler = Profiler()
+#   sim = Simulation(2,2,profiler=profiler)
+#   ...
+#   print(profiler.table(sim))
+#   profiler.write_folded(sim,open("bots.folded","w"))
+import time
+
+from cell_bots import Observer
+
+class Profiler(Observer):
+    def __init__(self):
+        #(bot_name,instr_ptr) -> executions, opcodes are looked up at export
+        self.executions = {}
+        #bot_name -> ticks bots spent parked on a Q read
+        self.blocked_ticks = {}
+        #bot id -> tick it blocked on
+        self.blocked_since = {}
+
+        #per bot type, messages sent by the type and delivered to or dropped by it
+        self.sends = {}
+        self.deliveries = {}
+        self.drops = {}
+        #messages whose TTL ran out before reaching anything
+        self.expired = 0
+
+        self.spawns = {}
+        self.deaths = {}
+
+        #wall time per tick phase, output is the end-of-tick flush
+        self.phase_time = {"messages": 0.0,"bots": 0.0,"output": 0.0}
+        self.ticks = 0
+
+        #when the current phase began, and what the message phase started
+        #   with and handed to bots
+        self.phase_start = 0.0
+        self.queued = 0
+        self.arrived = 0
+        #the bot tick_bot is running, as it was before it ran
+        self.bot_name = None
+        self.bot_queued = 0
+
+    def tick_started(self,sim):
+        self.phase_start = time.perf_counter()
+        self.queued = len(sim.messages)
+        self.arrived = 0
+
+    def phase_ended(self,sim,phase):
+        now = time.perf_counter()
+        self.phase_time[phase] += now - self.phase_start
+        self.phase_start = now
+        if phase == "messages":
+            self.expired += max(0,self.queued - self.arrived - len(sim.messages))
+        elif phase == "output":
+            self.ticks += 1
+
+    def bot_started(self,sim,bot):
+        #exec restarts the same object as a new bot, keep what it was
+        self.bot_name = bot.bot_name
+        self.bot_queued = len(sim.messages)
+        self.count(bot)
+
+    def bot_ended(self,sim):
+        sent = len(sim.messages) - self.bot_queued
+        if sent:
+            self.sends[self.bot_name] = self.sends.get(self.bot_name,0) + sent
+
+    def count(self,bot):
+        key = (bot.bot_name,bot.instr_ptr)
+        self.executions[key] = self.executions.get(key,0) + 1
+
+    def delivered(self,sim,bot,value,kill,accepted):
+        self.arrived += 1
+        counts = self.deliveries if accepted else self.drops
+        counts[bot.bot_name] = counts.get(bot.bot_name,0) + 1
+
+    def spawned(self,sim,bot):
+        self.spawns[bot.bot_name] = self.spawns.get(bot.bot_name,0) + 1
+
+    def died(self,sim,bot):
+        self.deaths[bot.bot_name] = self.deaths.get(bot.bot_name,0) + 1
+        if bot.id in self.blocked_since:
+            self.woke(bot,sim.time)
+
+    def blocked(self,bot,now):
+        self.blocked_since[bot.id] = now
+
+    def woke(self,bot,now):
+        since = self.blocked_since.pop(bot.id)
+        self.blocked_ticks[bot.bot_name] = self.blocked_ticks.get(bot.bot_name,0) + now - since
+
+    def blocked_totals(self,sim):
+        #bots still blocked count up to the current tick
+        totals = dict(self.blocked_ticks)
+        for bot_id,since in self.blocked_since.items():
+            bot = sim.blocked.get(bot_id)
+            if bot is not None:
+                totals[bot.bot_name] = totals.get(bot.bot_name,0) + sim.time - since
+        return totals
+
+    def instruction(self,sim,bot_name,instr_ptr):
+        return sim.bot_code[bot_name].instructions[instr_ptr]
+
+    def opcode_counts(self,sim):
+        counts = {}
+        for (bot_name,instr_ptr),count in self.executions.items():
+            instr_type = self.instruction(sim,bot_name,instr_ptr).instr_type
+            counts[instr_type] = counts.get(instr_type,0) + count
+        return counts
+
+    def table(self,sim,top=20):
+        lines = []
+        total_time = sum(self.phase_time.values()) or 1.0
+        lines.append(f"{'phase':<12}{'seconds':>12}{'share':>8}")
+        for phase,seconds in self.phase_time.items():
+            lines.append(f"{phase:<12}{seconds:>12.6f}{seconds / total_time:>8.1%}")
+        lines.append(f"{self.ticks} ticks, {self.expired} messages expired")
+
+        total = sum(self.executions.values()) or 1
+        lines.append("")
+        lines.append(f"{'opcode':<16}{'executions':>12}{'share':>8}")
+        for instr_type,count in sorted(self.opcode_counts(sim).items(),key=lambda item: -item[1]):
+            lines.append(f"{instr_type:<16}{count:>12}{count / total:>8.1%}")
+
+        blocked = self.blocked_totals(sim)
+        executed = {}
+        for (bot_name,_),count in self.executions.items():
+            executed[bot_name] = executed.get(bot_name,0) + count
+        bot_names = sorted(set(executed) | set(blocked) | set(self.sends) | set(self.deliveries) | set(self.drops) | set(self.spawns))
+        lines.append("")
+        lines.append(f"{'bot':<20}{'executions':>12}{'blocked':>10}{'sent':>10}{'delivered':>10}{'dropped':>10}{'spawns':>8}{'deaths':>8}")
+        for bot_name in bot_names:
+            lines.append(f"{bot_name:<20}{executed.get(bot_name,0):>12}{blocked.get(bot_name,0):>10}"
+                         f"{self.sends.get(bot_name,0):>10}{self.deliveries.get(bot_name,0):>10}{self.drops.get(bot_name,0):>10}"
+                         f"{self.spawns.get(bot_name,0):>8}{self.deaths.get(bot_name,0):>8}")
+
+        lines.append("")
+        lines.append(f"{'bot':<20}{'ip':>6}{'executions':>12}  instruction")
+        hottest = sorted(self.executions.items(),key=lambda item: -item[1])[:top]
+        for (bot_name,instr_ptr),count in hottest:
+            lines.append(f"{bot_name:<20}{instr_ptr:>6}{count:>12}  {self.instruction(sim,bot_name,instr_ptr)!r}")
+        return "\n".join(lines)
+
+    def folded(self,sim):
+        #one "bot;opcode;ip stack count" line per instruction, the input
+        #   format of flamegraph.pl and speedscope
+        for (bot_name,instr_ptr),count in sorted(self.executions.items()):
+            instr_type = self.instruction(sim,bot_name,instr_ptr).instr_type
+            yield f"{bot_name};{instr_type};{bot_name}@{instr_ptr} {count}"
+
+    def write_folded(self,sim,file_handle):
+        for line in self.folded(sim):
+            file_handle.write(line)
+            file_handle.write("\n")
@@ -0,0 +1,372 @@
+#Event log of a running simulation, and random access to it offline
+#   a Recorder watches a Simulation as an Observer and appends what happens
+#   to a binary log: spawns, deaths, messages sent and delivered, moves and
+#   sys bot I/O. The log is cut into chunks that each open with a keyframe
+#   of every bot and message, so a Recording can rebuild the grid at any
+#   tick from the nearest keyframe. Bot code is never run, only messages
+#   are moved, the same way Message_Transport moves them.
+#
+#   recorder = Recorder(sim,open("run.cbrl","wb"),keyframe_every=4096)
+#   sim.run()
+#   recorder.close()
+#
+#   recording = Recording(open("run.cbrl","rb"))
+#   frame = recording.frame(10000000)
+#
+#   Layout, integers are varints as in checkpoint
+#       magic "CBRL", version, dimensions
+#       chunks: first tick, body length, zlib compressed body
+#           keyframe: bots: count, (id, name, stream, coords, heading) ...
+#                     messages: count, (coords, velocity, value, kill, expires + 1) ...
+#           events: kind, fields ..., TICK where ticks start
+#
+#   A chunk is only written once it is complete, a crashed run loses at
+#       most the ticks since the last keyframe
+import bisect
+import zlib
+
+from cell_bots import Observer, Message_Transport
+from checkpoint import put_uint, put_int, put_bytes, put_value, Reader
+
+MAGIC = b"CBRL"
+VERSION = 1
+
+#event kinds
+TICK = 0        #count of message phases that ran back to back
+SPAWN = 1       #id, name, stream, coords, heading
+DEATH = 2       #id
+SEND = 3        #coords, velocity, value, kill, expires + 1
+DELIVER = 4     #id, value, kill, accepted
+MOVE = 5        #id, position
+READ = 6        #id, value, offset + 1
+WRITE = 7       #id, value, offset + 1
+
+EVENT_NAMES = {TICK: "tick",SPAWN: "spawn",DEATH: "death",SEND: "send",DELIVER: "deliver",
+               MOVE: "move",READ: "read",WRITE: "write"}
+
+class Recording_Error(Exception):
+    pass
+
+class Recorder(Observer):
+    #attach between ticks, the first keyframe is the state right now
+    def __init__(self,sim,file_handle,keyframe_every=4096,level=6):
+        self.sim = sim
+        self.file_handle = file_handle
+        self.keyframe_every = keyframe_every
+        self.level = level
+        self.dimensions = sim.dimensions
+
+        header = bytearray(MAGIC)
+        put_uint(header,VERSION)
+        put_uint(header,sim.dimensions)
+        file_handle.write(header)
+
+        #ticks started since the last event, written as one TICK
+        self.ticks = 0
+        self.start_chunk()
+        sim.observers.append(self)
+
+    def start_chunk(self):
+        sim = self.sim
+        self.chunk_tick = sim.time
+        out = self.chunk = bytearray()
+        bots = sorted(sim.bot_grid.values(),key=lambda bot: bot.id)
+        put_uint(out,len(bots))
+        for bot in bots:
+            self.put_bot(out,bot)
+        messages = list(sim.messages)
+        put_uint(out,len(messages))
+        for coords,velocity,value,kill,expires in messages:
+            self.put_message(out,coords,velocity,value,kill,expires)
+
+    def write_chunk(self):
+        self.put_ticks()
+        body = zlib.compress(bytes(self.chunk),self.level)
+        out = bytearray()
+        put_uint(out,self.chunk_tick)
+        put_uint(out,len(body))
+        self.file_handle.write(out)
+        self.file_handle.write(body)
+        self.chunk = None
+
+    def put_bot(self,out,bot):
+        put_uint(out,bot.id)
+        put_bytes(out,bot.bot_name.encode())
+        put_bytes(out,(getattr(bot,"stream",None) or "").encode())
+        for n in bot.coords:
+            put_int(out,n)
+        for n in bot.heading:
+            put_int(out,n)
+
+    def put_message(self,out,coords,velocity,value,kill,expires):
+        for n in coords:
+            put_int(out,n)
+        for n in velocity:
+            put_int(out,n)
+        put_value(out,value)
+        put_uint(out,kill)
+        put_uint(out,0 if expires is None else expires + 1)
+
+    def put_ticks(self):
+        if self.ticks:
+            put_uint(self.chunk,TICK)
+            put_uint(self.chunk,self.ticks)
+            self.ticks = 0
+
+    def event(self,kind):
+        self.put_ticks()
+        put_uint(self.chunk,kind)
+        return self.chunk
+
+    def spawned(self,sim,bot):
+        self.put_bot(self.event(SPAWN),bot)
+
+    def died(self,sim,bot):
+        put_uint(self.event(DEATH),bot.id)
+
+    def sent(self,sim,coords,velocity,value,kill,expires):
+        self.put_message(self.event(SEND),coords,velocity,value,kill,expires)
+
+    def delivered(self,sim,bot,value,kill,accepted):
+        out = self.event(DELIVER)
+        put_uint(out,bot.id)
+        put_value(out,value)
+        put_uint(out,kill)
+        put_uint(out,accepted)
+
+    def moved(self,sim,bot,position):
+        out = self.event(MOVE)
+        put_uint(out,bot.id)
+        for n in position:
+            put_int(out,n)
+
+    def io(self,sim,bot,op,value,offset=None):
+        out = self.event(READ if op == "read" else WRITE)
+        put_uint(out,bot.id)
+        put_value(out,value)
+        put_uint(out,0 if offset is None else offset + 1)
+
+    def tick_started(self,sim):
+        #the reader moves messages wherever a tick starts, so anything
+        #   done between ticks lands before the message phase it precedes
+        self.ticks += 1
+
+    def ticked(self,sim):
+        if sim.time - self.chunk_tick >= self.keyframe_every:
+            self.write_chunk()
+            self.start_chunk()
+
+    def close(self):
+        #writes the open chunk, the file handle stays the caller's
+        if self.chunk is not None:
+            self.write_chunk()
+        if self in self.sim.observers:
+            self.sim.observers.remove(self)
+        self.file_handle.flush()
+
+class Recorded_Bot:
+    __slots__ = ("id","name","stream","coords","heading","frame")
+
+    def __init__(self,bot_id,name,stream,coords,heading):
+        self.id = bot_id
+        self.name = name
+        self.stream = stream
+        self.coords = coords
+        self.heading = heading
+        #the Frame whose grid holds the bot
+        self.frame = None
+
+    def recv(self,value,kill=False):
+        #replaying a message phase, a kill message removes the bot straight
+        #   away just like Simulation.kill
+        if kill:
+            self.frame.remove(self.id)
+        return True
+
+    def __repr__(self):
+        return f"Recorded_Bot({self.id} {self.name} at {self.coords})"
+
+class Frame:
+    #the grid and messages in flight at the start of tick time
+    def __init__(self,time,dimensions):
+        self.time = time
+        #coords -> Recorded_Bot
+        self.grid = {}
+        self.messages = Message_Transport(dimensions)
+        self.by_id = {}
+
+    def add(self,bot):
+        old = self.grid.get(bot.coords)
+        if old is not None:
+            self.remove(old.id)
+        self.grid[bot.coords] = bot
+        self.by_id[bot.id] = bot
+        bot.frame = self
+
+    def remove(self,bot_id):
+        bot = self.by_id.pop(bot_id,None)
+        if bot is not None:
+            del self.grid[bot.coords]
+
+    def message_list(self):
+        #(coords, velocity, value, kill, expires) in delivery order
+        return list(self.messages)
+
+class Recording:
+    def __init__(self,file_handle):
+        self.file_handle = file_handle
+        header = file_handle.read(len(MAGIC))
+        if header != MAGIC:
+            raise Recording_Error("Not a cell bot recording")
+        version = read_uint(file_handle)
+        if version != VERSION:
+            raise Recording_Error(f"Unsupported recording version {version}")
+        self.dimensions = read_uint(file_handle)
+
+        #(first tick, body offset, body length) per chunk, found by hopping
+        #   from chunk header to chunk header
+        self.chunks = []
+        start = file_handle.tell()
+        end = file_handle.seek(0,2)
+        file_handle.seek(start)
+        while True:
+            try:
+                first_tick = read_uint(file_handle)
+            except EOFError:
+                break
+            length = read_uint(file_handle)
+            offset = file_handle.tell()
+            if offset + length > end:
+                raise Recording_Error("Recording is truncated")
+            file_handle.seek(offset + length)
+            self.chunks.append((first_tick,offset,length))
+        if not self.chunks:
+            raise Recording_Error("Recording has no chunks")
+        self.chunk_ticks = [chunk[0] for chunk in self.chunks]
+        self.first_tick = self.chunks[0][0]
+
+    def chunk_reader(self,index):
+        _,offset,length = self.chunks[index]
+        self.file_handle.seek(offset)
+        return Reader(zlib.decompress(self.file_handle.read(length)))
+
+    def read_bot(self,reader):
+        bot_id = reader.uint()
+        name = reader.str()
+        stream = reader.str() or None
+        coords = reader.ints(self.dimensions)
+        heading = reader.ints(self.dimensions)
+        return Recorded_Bot(bot_id,name,stream,coords,heading)
+
+    def read_message(self,reader):
+        coords = reader.ints(self.dimensions)
+        velocity = reader.ints(self.dimensions)
+        value = reader.int()
+        kill = bool(reader.uint())
+        expires = reader.uint()
+        return coords,velocity,value,kill,(None if expires == 0 else expires - 1)
+
+    def read_event(self,reader,kind):
+        #fields of one event as a tuple
+        if kind == TICK:
+            return (reader.uint(),)
+        if kind == SPAWN:
+            return (self.read_bot(reader),)
+        if kind == DEATH:
+            return (reader.uint(),)
+        if kind == SEND:
+            return self.read_message(reader)
+        if kind == DELIVER:
+            return (reader.uint(),reader.int(),bool(reader.uint()),bool(reader.uint()))
+        if kind == MOVE:
+            return (reader.uint(),reader.ints(self.dimensions))
+        if kind == READ or kind == WRITE:
+            event = (reader.uint(),reader.int())
+            offset = reader.uint()
+            return event + (None if offset == 0 else offset - 1,)
+        raise Recording_Error(f"Unknown event kind {kind}")
+
+    def keyframe(self,index):
+        reader = self.chunk_reader(index)
+        frame = Frame(self.chunks[index][0],self.dimensions)
+        for _ in range(reader.uint()):
+            frame.add(self.read_bot(reader))
+        for _ in range(reader.uint()):
+            frame.messages.add(*self.read_message(reader))
+        return frame,reader
+
+    def frame(self,tick):
+        #grid and messages as tick is about to start, from the keyframe at
+        #   or before it
+        index = bisect.bisect_right(self.chunk_ticks,tick) - 1
+        if index < 0:
+            raise Recording_Error(f"Tick {tick} is before the recording starts at {self.first_tick}")
+        frame,reader = self.keyframe(index)
+        #every tick is its message phase, then the events logged after it
+        while True:
+            if reader.pos >= len(reader.data):
+                if frame.time == tick:
+                    return frame
+                raise Recording_Error(f"Tick {tick} is past the end of the recording at {frame.time}")
+            kind = reader.uint()
+            event = self.read_event(reader,kind)
+            if kind == TICK:
+                for _ in range(event[0]):
+                    if frame.time == tick:
+                        return frame
+                    frame.messages.tick(frame.grid,None,frame.time)
+                    frame.time += 1
+            elif kind == SPAWN:
+                frame.add(event[0])
+            elif kind == DEATH:
+                frame.remove(event[0])
+            elif kind == SEND:
+                frame.messages.add(*event)
+
+    def events(self,start=None,end=None):
+        #(tick, event name, fields) for every event from start up to end,
+        #   anything done between two ticks counts toward the later one
+        start = self.first_tick if start is None else start
+        index = max(0,bisect.bisect_right(self.chunk_ticks,start) - 1)
+        for index in range(index,len(self.chunks)):
+            time = self.chunks[index][0]
+            if end is not None and time >= end:
+                return
+            _,reader = self.keyframe(index)
+            started = False
+            while reader.pos < len(reader.data):
+                kind = reader.uint()
+                event = self.read_event(reader,kind)
+                if kind == TICK:
+                    time += event[0] if started else event[0] - 1
+                    started = True
+                    if end is not None and time >= end:
+                        return
+                elif time >= start:
+                    yield time,EVENT_NAMES[kind],event
+
+    def output(self,stream="STDOUT"):
+        #every byte bots wrote to stream, in order
+        frame,_ = self.keyframe(0)
+        streams = {bot_id: bot.stream for bot_id,bot in frame.by_id.items()}
+        data = bytearray()
+        for _,name,event in self.events():
+            if name == "spawn":
+                streams[event[0].id] = event[0].stream
+            elif name == "write" and streams.get(event[0]) == stream:
+                data.append(event[1] & 0xFF)
+        return bytes(data)
+
+def read_uint(file_handle):
+    result = 0
+    shift = 0
+    while True:
+        byte = file_handle.read(1)
+        if not byte:
+            if shift:
+                raise Recording_Error("Recording is truncated")
+            raise EOFError
+        result |= (byte[0] & 0x7F) << shift
+        if byte[0] < 0x80:
+            return result
+        shift += 7
@@ -0,0 +1,495 @@
+#Sharded simulation, one worker process per group of slabs along D0
+#   every worker steps the same tick, anything that crosses a slab boundary
+#   is exchanged at tick barriers in an order that reproduces Simulation
+#
+#Ordering rules the barriers have to keep:
+#   messages are ordered by (birth tick, sender id), which is the order a
+#       single Simulation appends them in, and each bot gets its deliveries
+#       for a tick in that order
+#   a spawn or crush into another region happens before that region runs
+#       any bot younger than the spawner, so the bot phase is cut into
+#       segments at every bot whose instruction this tick crosses a boundary
+#   new bots get their final ids at the end of the tick, in spawner order
+#   STDOUT/STDERR writes are replayed in bot order, and an __EXIT__ drops
+#       whatever younger bots wrote in the same tick
+#
+#KILL messages and STDIN are not supported while sharded, a bot that sends
+#   or spawns one stops the run with a Sharding_Error.
+import heapq
+import multiprocessing
+import sys
+import time
+import traceback
+
+from cell_bots import Simulation, Byte_Sink, Run_Result, ray_index, ray_hits
+
+class Sharding_Error(Exception):
+    pass
+
+class Output_Capture:
+    #stands in for stdout/stderr inside a worker
+    def __init__(self,region,stream):
+        self.region = region
+        self.stream = stream
+
+    def write_byte(self,byte):
+        #unbuffered, every byte is tagged with the bot that wrote it
+        output = self.region.output
+        output.append((self.region.current_bot.id,len(output),self.stream,byte))
+
+    def flush(self):
+        pass
+
+class Region_Simulation(Simulation):
+    def __init__(self,index,workers,slab_width,dimensions,register_count,**sim_args):
+        super().__init__(dimensions,register_count,**sim_args)
+        self.index = index
+        self.workers = workers
+        self.slab_width = slab_width
+
+        #(key,coords,velocity,value,expires) sorted by key=(birth tick,sender id)
+        self.region_messages = []
+        #messages sent this tick that start in this region
+        self.new_messages = []
+        #messages sent this tick that start in another region, by worker
+        self.outbox = [[] for _ in range(workers)]
+        self.deliveries = []
+
+        #spawns and crushes aimed at other regions, as (worker,effect)
+        self.effects = []
+        #(spawner id,provisional id) for every bot registered this tick
+        self.registrations = []
+        self.next_provisional = -1
+        self.output = []
+
+        self.current_bot = None
+        self.order = []
+        self.cursor = 0
+        self.exit = None
+
+        self.stdout = Output_Capture(self,"STDOUT")
+        self.stderr = Output_Capture(self,"STDERR")
+
+    def owner(self,coords):
+        return (coords[0] // self.slab_width) % self.workers
+
+    def register_initial(self,bot_name,coords,heading,bot_id):
+        self.bot_id_itr = bot_id
+        Simulation.register_bot(self,bot_name,coords,heading=heading)
+
+    def register_bot(self,bot_name,coords,heading=None):
+        if bot_name == "STDIN":
+            raise Sharding_Error("STDIN is not available to a sharded simulation")
+        spawner = self.current_bot.id
+        owner = self.owner(coords)
+        if owner != self.index:
+            self.effects.append((owner,("spawn",bot_name,coords,heading,spawner)))
+            return
+        self.register_local(bot_name,coords,heading,spawner)
+
+    def register_local(self,bot_name,coords,heading,spawner):
+        #ids are handed out by the coordinator once every region is done
+        self.bot_id_itr = self.next_provisional
+        Simulation.register_bot(self,bot_name,coords,heading=heading)
+        self.registrations.append((spawner,self.next_provisional))
+        self.next_provisional -= 1
+
+    def register_message(self,coords,velocity,value,kill=False,ttl=0):
+        if kill:
+            raise Sharding_Error("KILL messages are not supported while sharded")
+        expires = self.time + ttl if ttl > 0 else None
+        message = ((self.time,self.current_bot.id),coords,velocity,value,expires)
+        owner = self.owner(coords)
+        if owner == self.index:
+            self.new_messages.append(message)
+        else:
+            self.outbox[owner].append(message)
+
+    def crush(self,coords):
+        owner = self.owner(coords)
+        if owner != self.index:
+            self.effects.append((owner,("crush",coords)))
+            return
+        Simulation.crush(self,coords)
+
+    def renumber(self,final_ids):
+        for provisional,final in final_ids.items():
+            bot = self.runnable.pop(provisional,None)
+            if bot is None:
+                #spawned and overwritten in the same tick
+                continue
+            bot.id = final
+            self.runnable[final] = bot
+        if final_ids:
+            self.runnable_sorted = False
+
+    def cmd_messages(self,final_ids,incoming):
+        self.renumber(final_ids)
+        fresh = sorted(self.new_messages + incoming)
+        self.new_messages = []
+        self.region_messages = list(heapq.merge(self.region_messages,fresh))
+
+        #check before moving, move, then check after moving for messages that
+        #   stay in this region, the rest are checked by their new owner
+        now = self.time
+        grid = self.bot_grid
+        step = self.add_coords
+        survivors = []
+        leaving = [[] for _ in range(self.workers)]
+        for key,coords,velocity,value,expires in self.region_messages:
+            bot = grid.get(coords)
+            if bot is not None:
+                self.deliveries.append((key,bot,value))
+                continue
+            position = step(coords,velocity)
+            owner = self.owner(position)
+            if owner != self.index:
+                leaving[owner].append((key,position,velocity,value,expires))
+                continue
+            bot = grid.get(position)
+            if bot is not None:
+                self.deliveries.append((key,bot,value))
+                continue
+            if expires == now:
+                continue
+            survivors.append((key,position,velocity,value,expires))
+        self.region_messages = survivors
+        return leaving
+
+    def cmd_arrivals(self,arrivals):
+        now = self.time
+        arrived = []
+        for key,position,velocity,value,expires in sorted(arrivals):
+            bot = self.bot_grid.get(position)
+            if bot is not None:
+                self.deliveries.append((key,bot,value))
+                continue
+            if expires == now:
+                continue
+            arrived.append((key,position,velocity,value,expires))
+        self.region_messages = list(heapq.merge(self.region_messages,arrived))
+
+        #nothing kills during delivery, so only the per-bot order matters
+        self.deliveries.sort(key=lambda delivery: delivery[0])
+        for _,bot,value in self.deliveries:
+            bot.recv(value)
+        self.deliveries = []
+
+        self.prepare_runnable()
+        self.order = list(self.runnable.values())
+        self.cursor = 0
+        self.next_provisional = -1
+        return self.crossing_ids()
+
+    def crossing_ids(self):
+        #bots whose instruction this tick spawns or crushes in another region
+        crossing = []
+        for bot in self.order:
+            instruction = bot.instruction_list[bot.instr_ptr]
+            if instruction.instr_type == "spawn":
+                arg = instruction.args[1]
+                direction = bot.heading if arg[1] == "DIR" else bot.dir_to_coords(arg)
+            elif instruction.instr_type == "move":
+                direction = bot.heading
+            else:
+                continue
+            if self.owner(self.add_coords(bot.coords,direction)) != self.index:
+                crossing.append(bot.id)
+        return crossing
+
+    def cmd_step(self,effects,limit,run_id):
+        #apply what older bots elsewhere did to this region, run every bot
+        #   older than limit, then the crossing bot itself if it lives here
+        for effect in effects:
+            if effect[0] == "spawn":
+                _,bot_name,coords,heading,spawner = effect
+                self.register_local(bot_name,coords,heading,spawner)
+            else:
+                Simulation.crush(self,effect[1])
+
+        order = self.order
+        while self.cursor < len(order) and (limit is None or order[self.cursor].id < limit):
+            self.cursor += 1
+            self.run_bot(order[self.cursor - 1])
+        if run_id is not None:
+            self.cursor += 1
+            self.run_bot(order[self.cursor - 1])
+
+        result = {"effects":self.effects,"output":self.output,"exit":self.exit}
+        self.effects = []
+        self.output = []
+        if limit is None:
+            self.time += 1
+            if self.recently_deceased:
+                self.recycle_bots()
+            result["registrations"] = self.registrations
+            result["outbox"] = self.outbox
+            result["bots"] = len(self.bot_grid)
+            result["idle"] = not self.runnable and not self.sleeping
+            self.registrations = []
+            self.outbox = [[] for _ in range(self.workers)]
+        return result
+
+    def run_bot(self,bot):
+        if self.exit is not None:
+            return
+        self.current_bot = bot
+        try:
+            self.tick_bot(bot)
+        except SystemExit as e:
+            self.exit = (bot.id,e.code)
+
+    def cmd_snapshot(self):
+        bots = [(bot.coords,bot.bot_name,bot.id,bot.instr_ptr,tuple(bot.registers),
+                 bot.cond_state,bot.heading,tuple(bot.queue_values()),bot.waiting_for_mesg)
+                for bot in self.bot_grid.values()]
+        messages = [(key,coords,velocity,value,expires) for key,coords,velocity,value,expires in self.region_messages + self.new_messages]
+        return bots,messages,dict(self.bot_type_counts)
+
+def worker_main(region,connection):
+    while True:
+        command,args = connection.recv()
+        if command == "stop":
+            break
+        try:
+            result = getattr(region,"cmd_" + command)(*args)
+        except Sharding_Error as e:
+            connection.send(("unsupported",str(e)))
+            break
+        except BaseException:
+            connection.send(("error",traceback.format_exc()))
+            break
+        connection.send(("ok",result))
+    connection.close()
+
+class Sharded_Simulation:
+    def __init__(self,dimensions,register_count,workers=2,slab_width=64,**sim_args):
+        self.dimensions = dimensions
+        self.workers = workers
+        self.slab_width = slab_width
+        self.regions = [Region_Simulation(i,workers,slab_width,dimensions,register_count,**sim_args) for i in range(workers)]
+        self.connections = None
+        self.processes = None
+
+        self.time = 0
+        self.bot_id_itr = 0
+        self.bot_count = 0
+        #every region ended the last tick with no bot able to run
+        self.idle = False
+        self.final_ids = [{} for _ in range(workers)]
+        self.incoming = [[] for _ in range(workers)]
+
+        #where replayed STDOUT/STDERR writes go, None means sys.stdout/sys.stderr
+        self.stdout = None
+        self.stderr = None
+        #Byte_Sink per file handle, kept so text handles keep their decoder
+        self.sinks = {}
+
+    def owner(self,coords):
+        return (coords[0] // self.slab_width) % self.workers
+
+    def add_bot_code(self,bot_name,instruction_list):
+        for region in self.regions:
+            region.add_bot_code(bot_name,instruction_list)
+
+    def add_sys_bot_code(self,bot_name,instruction_list):
+        for region in self.regions:
+            region.add_sys_bot_code(bot_name,instruction_list)
+
+    def register_bot(self,bot_name,coords,heading=None):
+        #only before the first tick, after that bots spawn bots
+        assert self.connections is None
+        if bot_name == "STDIN":
+            raise Sharding_Error("STDIN is not available to a sharded simulation")
+        region = self.regions[self.owner(coords)]
+        had_bot = coords in region.bot_grid
+        region.register_initial(bot_name,coords,heading,self.bot_id_itr)
+        self.bot_id_itr += 1
+        if not had_bot:
+            self.bot_count += 1
+        return self.bot_id_itr
+
+    def start(self):
+        #fork so compiled (and jitted) programs are inherited, not pickled
+        context = multiprocessing.get_context("fork")
+        self.connections = []
+        self.processes = []
+        for region in self.regions:
+            parent,child = context.Pipe()
+            process = context.Process(target=worker_main,args=(region,child),daemon=True)
+            process.start()
+            child.close()
+            self.connections.append(parent)
+            self.processes.append(process)
+        #the workers own the state from here on
+        self.regions = None
+
+    def close(self):
+        if self.connections is None:
+            return
+        for connection in self.connections:
+            try:
+                connection.send(("stop",()))
+            except (BrokenPipeError,OSError):
+                pass
+        for process in self.processes:
+            process.join()
+        self.connections = []
+
+    def call_all(self,command,args):
+        for connection,worker_args in zip(self.connections,args):
+            connection.send((command,worker_args))
+        results = []
+        for connection in self.connections:
+            status,result = connection.recv()
+            if status == "unsupported":
+                self.close()
+                raise Sharding_Error(result)
+            if status == "error":
+                self.close()
+                raise RuntimeError("worker failed:\n" + result)
+            results.append(result)
+        return results
+
+    def tick(self):
+        if self.connections is None:
+            self.start()
+        workers = range(self.workers)
+
+        #message phase, messages that move into another region are checked there
+        leaving = self.call_all("messages",[(self.final_ids[i],self.incoming[i]) for i in workers])
+        arrivals = [[] for _ in workers]
+        for by_owner in leaving:
+            for owner,messages in enumerate(by_owner):
+                arrivals[owner].extend(messages)
+        crossing = self.call_all("arrivals",[(arrivals[i],) for i in workers])
+
+        #bot phase, cut at every bot that reaches into another region
+        cuts = sorted((bot_id,worker) for worker,ids in enumerate(crossing) for bot_id in ids)
+        cuts.append((None,None))
+        effects = [[] for _ in workers]
+        output = []
+        exit = None
+        for limit,runner in cuts:
+            results = self.call_all("step",[(effects[i],limit,limit if i == runner else None) for i in workers])
+            effects = [[] for _ in workers]
+            for result in results:
+                for owner,effect in result["effects"]:
+                    effects[owner].append(effect)
+                output.extend(result["output"])
+                if result["exit"] is not None and (exit is None or result["exit"] < exit):
+                    exit = result["exit"]
+            if exit is not None:
+                break
+
+        if exit is not None:
+            self.write_output([record for record in output if record[0] <= exit[0]])
+            self.close()
+            sys.exit(exit[1])
+        self.write_output(output)
+
+        #hand out final ids in the order a single simulation would have
+        registrations = sorted((spawner,worker,provisional)
+                               for worker,result in enumerate(results)
+                               for spawner,provisional in result["registrations"])
+        self.final_ids = [{} for _ in workers]
+        for _,worker,provisional in registrations:
+            self.final_ids[worker][provisional] = self.bot_id_itr
+            self.bot_id_itr += 1
+
+        self.incoming = [[] for _ in workers]
+        for result in results:
+            for owner,messages in enumerate(result["outbox"]):
+                self.incoming[owner].extend(messages)
+
+        self.bot_count = sum(result["bots"] for result in results)
+        self.idle = all(result["idle"] for result in results)
+        self.time += 1
+
+    def write_output(self,output):
+        #one write per stream per tick
+        if not output:
+            return
+        output.sort()
+        sinks = {}
+        for _,_,stream,byte in output:
+            sink = sinks.get(stream)
+            if sink is None:
+                if stream == "STDOUT":
+                    file_handle = self.stdout if self.stdout is not None else sys.stdout
+                else:
+                    file_handle = self.stderr if self.stderr is not None else sys.stderr
+                if file_handle not in self.sinks:
+                    self.sinks[file_handle] = Byte_Sink(file_handle)
+                sink = sinks[stream] = self.sinks[file_handle]
+            sink.write_byte(byte)
+        for sink in sinks.values():
+            sink.flush()
+
+    def run(self,max_ticks=None,deadline=None):
+        #same stopping rules and Run_Result as Simulation.run, peak_bots is
+        #   sampled per tick and peak_messages isn't tracked, workers are
+        #   kept when a budget ran out so run can be called again
+        last_tick = None if max_ticks is None else self.time + max_ticks
+        result = Run_Result(self.time)
+        result.peak_bots = self.bot_count
+        start = time.perf_counter()
+        try:
+            while True:
+                if self.bot_count == 0:
+                    result.reason = "empty"
+                    break
+                if self.idle and self.quiescent():
+                    result.reason = "quiescent"
+                    break
+                if last_tick is not None and self.time >= last_tick:
+                    result.reason = "max_ticks"
+                    break
+                if deadline is not None and time.monotonic() >= deadline:
+                    result.reason = "deadline"
+                    break
+                self.tick()
+                result.peak_bots = max(result.peak_bots,self.bot_count)
+        except SystemExit as e:
+            result.reason = "exit"
+            result.exit_code = e.code
+        except BaseException:
+            self.close()
+            raise
+        if result.reason not in ("max_ticks","deadline"):
+            self.close()
+        result.ticks = self.time - result.ticks
+        result.elapsed = time.perf_counter() - start
+        return result
+
+    def quiescent(self):
+        #Simulation.quiescent over every region at once, messages cross
+        #   regions so the rays are checked against the whole grid
+        bots,messages,_ = self.snapshot()
+        grid = dict.fromkeys(bot[0] for bot in bots)
+        index = ray_index(grid)
+        for _,coords,velocity,_,expires in messages:
+            moves = None if expires is None else expires - self.time + 1
+            if ray_hits(index,grid,coords,velocity,moves):
+                return False
+        return True
+
+    def snapshot(self):
+        #every bot and message, with bot ids as a single Simulation would
+        #   number them, for comparing runs
+        if self.connections is None:
+            self.start()
+        bots = []
+        messages = []
+        counts = {}
+        for worker,(region_bots,region_messages,region_counts) in enumerate(self.call_all("snapshot",[()] * self.workers)):
+            final_ids = self.final_ids[worker]
+            bots.extend((coords,name,final_ids.get(bot_id,bot_id)) + tuple(rest) for coords,name,bot_id,*rest in region_bots)
+            messages.extend(region_messages)
+            for name,count in region_counts.items():
+                counts[name] = counts.get(name,0) + count
+        for worker_messages in self.incoming:
+            messages.extend(worker_messages)
+        bots.sort()
+        messages.sort()
+        return bots,messages,counts
@@ -0,0 +1,188 @@
+#Incremental hashing of the whole simulation state, for spotting cycles
+#   hand a State_Hasher to Simulation and it watches as an Observer. The hash
+#   is the XOR of one 64 bit term per bot and one per message in flight, so a
+#   bot's term is only recomputed on ticks it ran, received a message,
+#   spawned or died, and idle bots cost nothing
+#
+#   hasher = State_Hasher(skip_cycles=True)
+#   sim = Simulation(2,2,hasher=hasher)
+#   ...
+#   sim.run(max_ticks=10**9)   stops with "cycle", or skips whole periods
+#
+#Terms only use ints and tuples of ints, whose hashes don't depend on
+#   PYTHONHASHSEED, so equal states hash equal across runs and message
+#   backends. Bot ids aren't hashed, bots are told apart by their cell.
+#
+#Bots that read files would make the state depend on the file, so READ_FILE
+#   and MAPPED_FILE bots can't be hashed. Writers are fine but output can't
+#   be skipped over, so any WRITE_FILE bot turns skip_cycles off.
+import collections
+import zlib
+
+from cell_bots import Observer
+
+MASK = (1 << 64) - 1
+
+def mix(value):
+    #splitmix64 finalizer, spreads python's hash over all 64 bits
+    value = (value + 0x9E3779B97F4A7C15) & MASK
+    value = ((value ^ (value >> 30)) * 0xBF58476D1CE4E5B9) & MASK
+    value = ((value ^ (value >> 27)) * 0x94D049BB133111EB) & MASK
+    return value ^ (value >> 31)
+
+class State_Hasher(Observer):
+    def __init__(self,window=1 << 16,skip_cycles=False):
+        #cycles up to window ticks long are found
+        self.window = window
+        #let Simulation.run jump time past whole periods of a found cycle
+        self.skip_cycles = skip_cycles
+
+        self.value = 0
+        self.bots_hash = 0
+        #bot -> its current term
+        self.bot_terms = {}
+        #bots whose term is out of date
+        self.dirty = set()
+        self.name_codes = {}
+        self.writes = False
+
+        #hash -> last tick it was seen, and (tick,hash) oldest first
+        self.seen = {}
+        self.history = collections.deque()
+        #(tick,period,exact state,bot_id_itr) of a repeat waiting to be
+        #   confirmed one period later
+        self.candidate = None
+        #(first tick,period) once a repeat is confirmed
+        self.cycle = None
+        #ids bots spawned during one period use up
+        self.ids_per_period = 0
+        self.first_cycle_id = 0
+
+    def check_simulation(self,sim):
+        if sim.fast_forward:
+            raise ValueError("State hashing can't follow bots that run ahead, turn fast_forward off")
+
+    def touched(self,bot):
+        #a bot spawned or died
+        if bot.bot_name in ("READ_FILE","MAPPED_FILE"):
+            raise ValueError(f"{bot.bot_name} bots read outside state and can't be hashed")
+        if bot.bot_name == "WRITE_FILE":
+            self.writes = True
+        self.dirty.add(bot)
+
+    def spawned(self,sim,bot):
+        self.touched(bot)
+
+    def died(self,sim,bot):
+        self.touched(bot)
+
+    def delivered(self,sim,bot,value,kill,accepted):
+        self.dirty.add(bot)
+
+    def tick_started(self,sim):
+        #every bot that runs this tick is runnable now or woken by a message
+        self.dirty.update(sim.runnable.values())
+
+    def ticked(self,sim):
+        self.update(sim)
+        self.find_cycle(sim)
+
+    def update(self,sim):
+        bot_terms = self.bot_terms
+        for bot in self.dirty:
+            old = bot_terms.pop(bot,None)
+            if old is not None:
+                self.bots_hash ^= old
+            if not bot.dead:
+                term = bot_terms[bot] = mix(hash(self.bot_state(bot)))
+                self.bots_hash ^= term
+        self.dirty.clear()
+
+        #every message moves every tick, so their terms are all new anyway
+        messages_hash = 0
+        now = sim.time
+        for coords,velocity,value,kill,expires in sim.messages:
+            messages_hash ^= mix(hash((coords,velocity,value,kill,-1 if expires is None else expires - now)))
+        self.value = self.bots_hash ^ messages_hash
+        return self.value
+
+    def state_hash(self,sim):
+        #the hash of sim as it is now, between ticks
+        return self.update(sim)
+
+    def bot_state(self,bot):
+        name_code = self.name_codes.get(bot.bot_name)
+        if name_code is None:
+            name_code = self.name_codes[bot.bot_name] = zlib.crc32(bot.bot_name.encode())
+        return (name_code,bot.coords,bot.instr_ptr,tuple(bot.registers),tuple(bot.queue_values()),
+                bot.queue_size,bot.ttl,bot.cond_state,bot.executed_inits,bot.heading,
+                bot.waiting_for_mesg,bot.remaining_args,tuple(bot.arg_buffer or ()))
+
+    def exact_state(self,sim):
+        #what a hash match is confirmed against, bots in tick order and
+        #   messages in delivery order
+        bots = [self.bot_state(bot) for _,bot in sorted((bot.id,bot) for bot in sim.bot_grid.values())]
+        now = sim.time
+        messages = [(coords,velocity,value,kill,None if expires is None else expires - now)
+                    for coords,velocity,value,kill,expires in sim.messages]
+        return bots,messages
+
+    def find_cycle(self,sim):
+        if self.cycle is not None:
+            return
+        now = sim.time
+
+        #a repeated hash is only a candidate until the state one period
+        #   later is exactly the same, after that it repeats forever
+        if self.candidate is not None:
+            start,period,state,first_id = self.candidate
+            if now == start + period:
+                self.candidate = None
+                if self.exact_state(sim) == state:
+                    self.cycle = (start,period)
+                    self.first_cycle_id = first_id
+                    self.ids_per_period = sim.bot_id_itr - first_id
+                    self.seen.clear()
+                    self.history.clear()
+                    return
+
+        seen_at = self.seen.get(self.value)
+        if seen_at is not None and self.candidate is None:
+            self.candidate = (now,now - seen_at,self.exact_state(sim),sim.bot_id_itr)
+        self.seen[self.value] = now
+        self.history.append((now,self.value))
+        while self.history[0][0] <= now - self.window:
+            old_tick,old_value = self.history.popleft()
+            if self.seen.get(old_value) == old_tick:
+                del self.seen[old_value]
+
+    def can_skip(self,sim):
+        #other observers would miss the skipped ticks
+        return (self.skip_cycles and self.cycle is not None and not self.writes
+                and all(observer is self for observer in sim.observers))
+
+    def skip(self,sim,ticks):
+        #jump as many whole periods as fit in ticks, the state afterwards is
+        #   what ticking would have reached, returns the ticks skipped
+        _,period = self.cycle
+        periods = ticks // period
+        if periods <= 0:
+            return 0
+        skipped = periods * period
+        sim.time += skipped
+        sim.messages.shift_expiry(skipped)
+
+        #bots spawned in the last period carry the ids they would have had
+        id_shift = periods * self.ids_per_period
+        if id_shift:
+            for table in (sim.runnable,sim.blocked):
+                for bot in list(table.values()):
+                    if bot.id >= self.first_cycle_id:
+                        bot.id += id_shift
+                renumbered = {bot.id: bot for bot in table.values()}
+                table.clear()
+                table.update(renumbered)
+            sim.bot_id_itr += id_shift
+            self.first_cycle_id += id_shift
+            sim.runnable_sorted = False
+        return skipped
@@ -0,0 +1,93 @@
+#shared by the tests, a simulation with the repo's programs and some extras
+import os
+import random
+
+from cell_bots import Simulation, Instruction_Set
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def compile_program(code):
+    instructions = Instruction_Set()
+    instructions.compile(code.splitlines(True))
+    return instructions
+
+def load_programs(sim,extra=None):
+    for code_dir,add in (("bots",sim.add_bot_code),("sys_bots",sim.add_sys_bot_code)):
+        for file_name in sorted(os.listdir(os.path.join(ROOT,code_dir))):
+            if file_name.endswith(".cb"):
+                instructions = Instruction_Set()
+                instructions.load(os.path.join(ROOT,code_dir,file_name))
+                add(file_name.split(".")[0],instructions)
+    for bot_name,code in (extra or {}).items():
+        sim.add_bot_code(bot_name,compile_program(code))
+
+def make_simulation(dimensions=2,register_count=2,extra=None,**sim_args):
+    sim = Simulation(dimensions,register_count,**sim_args)
+    load_programs(sim,extra)
+    return sim
+
+#a chain builder that keeps spawning, a bot parked on Q reads, and one
+#   doing local work between sends that run out into empty space
+LIST_DRIVER = "spawn 1_2_list X+\nput 50 X+\nloop:\nput 1 X+\nput 3 X+\nput 0 X+\njmp loop\n"
+WAITER = "put Q r0\nput Q r1\njmp waiter\nwaiter:\nput Q r0\n"
+SHOUTER = "@ttl 4\nloop:\nadd r0 1 r0\nadd r1 2 r1\nput r0 Y+\nput r1 Y-\njmp loop\n"
+
+def busy_simulation(ticks=0,**sim_args):
+    #four list drivers, two waiters at (-5,-5) and (-7,-5) and a shouter at
+    #   (-20,0), ticked ticks times
+    sim = make_simulation(extra={"list_driver":LIST_DRIVER,"waiter":WAITER,"shouter":SHOUTER},**sim_args)
+    for i in range(4):
+        sim.register_bot("list_driver",(0,i * 3))
+    sim.register_bot("waiter",(-5,-5))
+    sim.register_bot("waiter",(-7,-5))
+    sim.register_bot("shouter",(-20,0))
+    for _ in range(ticks):
+        sim.tick()
+    return sim
+
+#a bot that counts and sends both ways, parking on Q reads now and then
+RANDOM_PROGRAM = """
+@put {start} r0
+@ttl {ttl}
+loop:
+    put r0 {first}
+    add r0 1 r0
+    put r0 {second}
+    tgt r0 {limit}
+    +put Q r1
+    +add r1 r0 {first}
+    +put 0 r0
+    jmp loop
+"""
+
+def random_simulation(seed,dimensions=2,bots=40,**sim_args):
+    sim = make_simulation(dimensions,**sim_args)
+    populate(sim,seed,bots)
+    return sim
+
+def populate(sim,seed,bots=40):
+    #five random variants of RANDOM_PROGRAM and the repo's list and spawn
+    #   programs, scattered around the origin
+    dimensions = sim.dimensions
+    rng = random.Random(seed)
+    def direction():
+        axis = rng.randrange(dimensions)
+        name = "XYZ"[axis] if axis < 3 and rng.random() < 0.5 else f"D{axis}"
+        return name + rng.choice("+-")
+    for i in range(5):
+        code = RANDOM_PROGRAM.format(start=rng.randrange(5),ttl=rng.choice([0,1,2,5,30]),first=direction(),
+                                     second=direction(),limit=rng.randrange(3,9))
+        sim.add_bot_code(f"random_{i}",compile_program(code))
+    bot_names = [f"random_{i}" for i in range(5)] + ["1_2_list","spawn_and_wait"]
+    used = set()
+    for _ in range(bots):
+        coords = tuple(rng.randrange(-8,9) for _ in range(dimensions))
+        if coords not in used:
+            used.add(coords)
+            sim.register_bot(rng.choice(bot_names),coords)
+
+def snapshot(sim):
+    #everything a bot or message carries, comparable across runs
+    bots = sorted((bot.id,bot.bot_name,bot.coords,bot.instr_ptr,tuple(bot.registers),tuple(bot.queue_values()),bot.waiting_for_mesg)
+                  for bot in sim.bot_grid.values())
+    return sim.time,sim.bot_id_itr,bots,sorted(map(repr,sim.messages))
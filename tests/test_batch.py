@@ -0,0 +1,45 @@
+#batch manifests expanded into runs
+import pytest
+
+import batch
+
+def test_defaults_overlay():
+    runs = batch.expand_runs({"defaults": {"max_ticks": 50,"dimensions": 3},
+                              "runs": [{"name": "a","entry": "hello_world","dimensions": 2}]})
+    assert len(runs) == 1
+    run = runs[0]
+    assert run["name"] == "a" and run["max_ticks"] == 50 and run["dimensions"] == 2
+    assert run["register_count"] == batch.RUN_DEFAULTS["register_count"]
+
+def test_sweep_naming():
+    runs = batch.expand_runs({"runs": [
+        {"name": "list","entry": "main_list_test","sweep": {"register_count": [2,4],"dimensions": [2,3]}},
+        {"entry": "hello_world","sweep": {"max_ticks": [10]}},
+    ]})
+    #keys in sorted order, the last one varying fastest
+    assert [run["name"] for run in runs] == [
+        "list[dimensions=2,register_count=2]",
+        "list[dimensions=2,register_count=4]",
+        "list[dimensions=3,register_count=2]",
+        "list[dimensions=3,register_count=4]",
+        "hello_world[max_ticks=10]",
+    ]
+    assert [(run["dimensions"],run["register_count"]) for run in runs[:4]] == [(2,2),(2,4),(3,2),(3,4)]
+    assert runs[4]["max_ticks"] == 10
+
+def test_runs_without_a_sweep_keep_their_name():
+    runs = batch.expand_runs({"runs": [{"entry": "hello_world"},{"name": "b","entry": "hello_world","sweep": {}}]})
+    assert [run["name"] for run in runs] == [None,"b"]
+
+@pytest.mark.parametrize("manifest",[
+    {"defaults": {"tick_limit": 5},"runs": [{"entry": "hello_world"}]},
+    {"runs": [{"entry": "hello_world","tick_limit": 5}]},
+    {"runs": [{"entry": "hello_world","sweep": {"tick_limit": [5,6]}}]},
+])
+def test_unknown_keys_are_refused(manifest):
+    with pytest.raises(ValueError,match="Unknown run setting: tick_limit"):
+        batch.expand_runs(manifest)
+
+def test_entry_is_required():
+    with pytest.raises(ValueError,match="no entry bot"):
+        batch.expand_runs({"runs": [{"name": "nothing"}]})
@@ -0,0 +1,146 @@
+#checkpoint save and restore
+import io
+
+import pytest
+
+import checkpoint
+import profiling
+import state_hash
+from programs import busy_simulation, random_simulation
+
+def build(**sim_args):
+    return busy_simulation(30,**sim_args)
+
+def round_trip(sim,**sim_args):
+    buffer = io.BytesIO()
+    checkpoint.save(sim,buffer)
+    buffer.seek(0)
+    return checkpoint.restore([buffer],sim.bot_code,**sim_args)
+
+def test_restore_feeds_the_hasher():
+    sim = build(hasher=state_hash.State_Hasher())
+    restored = round_trip(sim,hasher=state_hash.State_Hasher())
+    assert restored.hasher.state_hash(restored) == sim.hasher.state_hash(sim)
+    for _ in range(20):
+        sim.tick()
+        restored.tick()
+    assert restored.hasher.state_hash(restored) == sim.hasher.state_hash(sim)
+
+def test_restore_blocked_bots_under_profiler():
+    sim = build()
+    assert sim.blocked
+    restored = round_trip(sim,profiler=profiling.Profiler())
+    assert set(restored.profiler.blocked_since) == set(sim.blocked)
+    #reaches the waiter at (-5,-5) two ticks in and wakes it
+    restored.register_message((-5,-3),(0,-1),7)
+    for _ in range(5):
+        restored.tick()
+    assert restored.profiler.blocked_ticks["waiter"] > 0
+
+def test_restore_keeps_the_chunk_index():
+    sim = build()
+    before = sorted(bot.id for bot in sim.bots_in_box((-30,-30),(200,200)))
+    restored = round_trip(sim)
+    restored.chunk_index()
+    assert sorted(bot.id for bot in restored.bots_in_box((-30,-30),(200,200))) == before
+    for _ in range(10):
+        sim.tick()
+        restored.tick()
+    assert sorted(bot.id for bot in restored.bots_in_box((-30,-30),(200,200))) == sorted(bot.id for bot in sim.bot_grid.values())
+
+def full_state(sim):
+    #everything restore must bring back, including which table a bot is in
+    bots = [(coords,bot.bot_name,bot.id,bot.instr_ptr,tuple(bot.registers),bot.cond_state,tuple(bot.heading),
+             tuple(bot.queue_values()),bot.queue_size,bot.ttl,bot.waiting_for_mesg,bot.remaining_args,
+             tuple(bot.arg_buffer or ()),bot.executed_inits,bot.id in sim.runnable,bot.id in sim.blocked)
+            for coords,bot in sorted(sim.bot_grid.items())]
+    sleeping = sorted((tick,bot.id) for tick,bots in sim.sleeping.items() for bot in bots if not bot.dead)
+    return sim.time,sim.bot_id_itr,sorted(sim.bot_type_counts.items()),bots,sleeping,list(sim.messages)
+
+@pytest.mark.parametrize("dimensions",[1,2,3])
+@pytest.mark.parametrize("sim_args",[{},{"fast_forward":8,"jit":True}])
+def test_restored_runs_carry_on_the_same(dimensions,sim_args):
+    #full and incremental saves every 40 ticks, each restored from the
+    #   chain so far and ticked alongside the original from then on
+    sim = random_simulation(dimensions,dimensions,**sim_args)
+    checkpointer = checkpoint.Checkpointer(sim)
+    files = []
+    kinds = set()
+    restored = []
+    for tick in range(200):
+        if tick % 40 == 7:
+            buffer = io.BytesIO()
+            kinds.add(checkpointer.save(buffer))
+            files.append(buffer.getvalue())
+            restored.append(checkpoint.restore([io.BytesIO(data) for data in files],sim.bot_code,**sim_args))
+        for other in restored:
+            assert full_state(other) == full_state(sim),tick
+            other.tick()
+        sim.tick()
+    assert kinds == {checkpoint.FULL,checkpoint.DELTA}
+
+def test_fork_carries_on_the_same():
+    sim = random_simulation(5,fast_forward=8)
+    for _ in range(50):
+        sim.tick()
+    fork = checkpoint.fork(sim,fast_forward=8)
+    for _ in range(100):
+        assert full_state(fork) == full_state(sim)
+        sim.tick()
+        fork.tick()
+
+def test_delta_only_encodes_bots_that_changed(monkeypatch):
+    #a crowd of blocked waiters and one shouter, only the shouter runs
+    sim = busy_simulation()
+    for i in range(50):
+        sim.register_bot("waiter",(-40,i * 2))
+    for _ in range(5):
+        sim.tick()
+    checkpointer = checkpoint.Checkpointer(sim)
+    checkpointer.save(io.BytesIO())
+    for _ in range(3):
+        sim.tick()
+
+    encoded = []
+    encode_bot = checkpoint.encode_bot
+    def counting(bot,*args):
+        encoded.append(bot.bot_name)
+        return encode_bot(bot,*args)
+    monkeypatch.setattr(checkpoint,"encode_bot",counting)
+    buffer = io.BytesIO()
+    assert checkpointer.save(buffer) == checkpoint.DELTA
+    assert "waiter" not in encoded
+    assert len(encoded) == len(sim.runnable)
+
+    #nothing ran, nothing is written
+    encoded.clear()
+    checkpointer.save(io.BytesIO())
+    assert encoded == []
+
+def test_delta_drops_bots_that_died_and_came_back():
+    #a bot recycled from the pool keeps the object but not the id
+    sim = busy_simulation(10)
+    checkpointer = checkpoint.Checkpointer(sim)
+    files = []
+    for _ in range(4):
+        buffer = io.BytesIO()
+        checkpointer.save(buffer)
+        files.append(buffer.getvalue())
+        for _ in range(7):
+            sim.tick()
+        victim = min(sim.bot_grid.values(),key=lambda bot: bot.id)
+        coords = victim.coords
+        victim.die()
+        sim.recycle_bots()
+        sim.register_bot("waiter",coords)
+        assert sim.bot_grid[coords] is victim
+    buffer = io.BytesIO()
+    checkpointer.save(buffer)
+    files.append(buffer.getvalue())
+    restored = checkpoint.restore([io.BytesIO(data) for data in files],sim.bot_code)
+    assert full_state(restored) == full_state(sim)
+
+def test_one_off_saves_leave_no_observer():
+    sim = busy_simulation(3)
+    fork = checkpoint.fork(sim)
+    assert sim.observers == [] and fork.observers == []
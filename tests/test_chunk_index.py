@@ -0,0 +1,71 @@
+#Chunk_Index queries against a brute force scan of the same bots
+import random
+
+import pytest
+
+from cell_bots import Chunk_Index
+from programs import random_simulation
+
+class Point:
+    def __init__(self,coords):
+        self.coords = coords
+
+def in_box(coords,low,high):
+    return all(l <= c < h for c,l,h in zip(coords,low,high))
+
+def scattered(rng,dimensions,spread,bots):
+    index = Chunk_Index(dimensions,chunk_size=rng.choice([None,2,3]))
+    grid = {}
+    for _ in range(bots):
+        coords = tuple(rng.randrange(-spread,spread) for _ in range(dimensions))
+        if coords not in grid:
+            grid[coords] = Point(coords)
+            index.add(coords,grid[coords])
+    return index,grid
+
+def random_box(rng,dimensions,spread):
+    low = tuple(rng.randrange(-spread - 2,spread) for _ in range(dimensions))
+    #empty, thin and larger than the whole colony
+    high = tuple(l + rng.choice([0,1,2,5,3 * spread]) for l in low)
+    return low,high
+
+@pytest.mark.parametrize("dimensions",[1,2,3,4])
+def test_queries_match_a_scan(dimensions):
+    rng = random.Random(dimensions)
+    spread = {1: 40,2: 12,3: 6,4: 4}[dimensions]
+    for _ in range(20):
+        index,grid = scattered(rng,dimensions,spread,rng.randrange(1,60))
+        for _ in range(30):
+            low,high = random_box(rng,dimensions,spread)
+            expected = sorted(coords for coords in grid if in_box(coords,low,high))
+            assert sorted(bot.coords for bot in index.box(low,high)) == expected
+            assert index.count(low,high) == len(expected)
+
+            centre = rng.choice(list(grid))
+            radius = rng.choice([1,2])
+            near = sorted(coords for coords in grid if coords != centre and all(abs(c - o) <= radius for c,o in zip(coords,centre)))
+            assert sorted(bot.coords for bot in index.neighbours(centre,radius)) == near
+
+def test_empty_chunks_are_dropped():
+    rng = random.Random(7)
+    index,grid = scattered(rng,2,10,80)
+    keys = {index.chunk_key(coords) for coords in grid}
+    assert set(index.chunks) == keys
+    coords_list = list(grid)
+    rng.shuffle(coords_list)
+    for coords in coords_list:
+        index.remove(coords)
+        del grid[coords]
+        assert set(index.chunks) == {index.chunk_key(c) for c in grid}
+    assert not index.chunks
+    assert list(index.box((-20,-20),(20,20))) == []
+
+def test_simulation_keeps_the_index():
+    #spawns and deaths after the index is built keep it in step
+    sim = random_simulation(2,2)
+    sim.chunk_index()
+    for _ in range(60):
+        sim.tick()
+        for low,high in (((-30,-30),(30,30)),((-3,-5),(4,2)),((0,0),(1,1))):
+            expected = sorted(bot.id for bot in sim.bot_grid.values() if in_box(bot.coords,low,high))
+            assert sorted(bot.id for bot in sim.bots_in_box(low,high)) == expected
@@ -0,0 +1,65 @@
+#frames kept up to date from observer hooks against a full render of the grid
+import io
+
+import pytest
+
+import cell_bots
+from frames import Viewport, Frame_Exporter, Delta_Sink, read_deltas, name_color, MESSAGE, BACKGROUND
+from programs import random_simulation
+
+BACKENDS = ["python",pytest.param("numpy",marks=pytest.mark.skipif(cell_bots.numpy is None,reason="needs numpy"))]
+
+def render(sim,viewport):
+    #the whole viewport drawn from scratch
+    pixels = bytearray(bytes(BACKGROUND) * (viewport.width * viewport.height))
+    for coords,*_ in sim.messages:
+        pixel = viewport.pixel(coords)
+        if pixel is not None:
+            pixels[pixel * 3:pixel * 3 + 3] = bytes(MESSAGE)
+    cells = {}
+    for bot in sim.bot_grid.values():
+        pixel = viewport.pixel(bot.coords)
+        if pixel is not None:
+            cells.setdefault(pixel,{})[bot.coords] = bot.bot_name
+    for pixel,cell in cells.items():
+        pixels[pixel * 3:pixel * 3 + 3] = bytes(name_color(cell[min(cell)]))
+    return bytes(pixels)
+
+class Frame_List:
+    def __init__(self):
+        self.frames = []
+
+    def write(self,tick,exporter,changes):
+        self.frames.append((tick,bytes(exporter.pixels)))
+
+    def close(self):
+        pass
+
+@pytest.mark.parametrize("message_backend",BACKENDS)
+@pytest.mark.parametrize("dimensions,flatten",[(1,False),(2,False),(3,False),(3,True)])
+@pytest.mark.parametrize("every",[1,3])
+def test_deltas_match_a_full_render(message_backend,dimensions,flatten,every):
+    sim = random_simulation(dimensions,dimensions,message_backend=message_backend)
+    #attached mid run, seeded from what is already there
+    for _ in range(4):
+        sim.tick()
+    axes = (0,) if dimensions == 1 else (0,1)
+    viewport = Viewport((-6,) * dimensions,13,11,axes=axes,flatten=flatten)
+    frames = Frame_List()
+    stream = io.BytesIO()
+    Frame_Exporter(sim,viewport,frames,every=every)
+    exporter = Frame_Exporter(sim,viewport,Delta_Sink(stream,full_every=5),every=every)
+    expected = [(sim.time,render(sim,viewport))]
+    for tick in range(120):
+        if tick % 11 == 0:
+            coords = tuple((tick * 7 + d) % 13 - 6 for d in range(dimensions))
+            if coords not in sim.bot_grid:
+                sim.register_bot("random_1",coords)
+        sim.tick()
+        if sim.time % every == 0:
+            expected.append((sim.time,render(sim,viewport)))
+    exporter.close()
+    assert frames.frames == expected
+    assert [(tick,pixels) for tick,_,_,pixels in read_deltas(stream.getvalue())] == expected
+    #seeding mustn't leave the simulation paying for a chunk index
+    assert sim.bot_chunks is None
@@ -0,0 +1,72 @@
+#the closure JIT against the interpreter, on random programs
+import random
+
+from cell_bots import Simulation, Instruction_Set
+
+OPS = ["put","add","sub","mul"]
+TESTS = ["teq","tgt","tlt"]
+
+def random_program(rng,length=10):
+    labels = [f"l{i}" for i in range(3)]
+    placed = {rng.randrange(length): label for label in labels}
+    lines = []
+    for offset in range(length):
+        if offset in placed:
+            lines.append(f"{placed[offset]}:")
+        prefix = rng.choice(["","","@"]) + rng.choice(["","","+","-"])
+        source = lambda: rng.choice([f"r{rng.randrange(3)}",str(rng.randrange(5))])
+        kind = rng.randrange(6)
+        if kind == 0:
+            lines.append(f"{prefix}jmp {rng.choice(list(placed.values()))}")
+        elif kind == 1:
+            lines.append(f"{prefix}{rng.choice(TESTS)} {source()} {source()}")
+        elif kind == 2:
+            lines.append(f"{prefix}nop")
+        elif rng.randrange(8) == 0:
+            lines.append(f"{prefix}put {source()} X+")
+        else:
+            op = rng.choice(OPS)
+            srcs = " ".join(source() for _ in range(1 if op == "put" else 2))
+            lines.append(f"{prefix}{op} {srcs} r{rng.randrange(3)}")
+    return "\n".join(lines) + "\n"
+
+def trace(source,jit,ticks=60):
+    instructions = Instruction_Set()
+    instructions.compile(source.splitlines(True))
+    sim = Simulation(1,3,jit=jit)
+    sim.add_bot_code("prog",instructions)
+    sim.register_bot("prog",(0,))
+    states = []
+    for _ in range(ticks):
+        if not sim.bot_grid:
+            break
+        sim.tick()
+        states.append([(bot.instr_ptr,tuple(bot.registers),bot.cond_state,bot.executed_inits)
+                       for bot in sim.bot_grid.values()])
+    return states
+
+def test_jit_matches_interpreter():
+    rng = random.Random(9)
+    for _ in range(300):
+        source = random_program(rng)
+        assert trace(source,False) == trace(source,True),source
+
+def test_init_jmp():
+    #@jmp marks its target as run, in both tiers
+    source = "@jmp two\nput 1 r0\ntwo:\n@add r1 1 r1\njmp two\n"
+    assert trace(source,False) == trace(source,True)
+
+def test_shared_set_keeps_tier_per_simulation():
+    instructions = Instruction_Set()
+    instructions.compile("loop:\nadd r0 1 r0\njmp loop\n".splitlines(True))
+    fast = Simulation(1,1,jit=True)
+    fast.add_bot_code("prog",instructions)
+    slow = Simulation(1,1)
+    slow.add_bot_code("prog",instructions)
+    assert any(instr.fast is not None for instr in fast.bot_code["prog"].instructions)
+    assert all(instr.fast is None for instr in slow.bot_code["prog"].instructions)
+    assert slow.bot_code["prog"].label_index is fast.bot_code["prog"].label_index
+    #and back again, a third jit simulation reuses the jitted set as is
+    third = Simulation(1,1,jit=True)
+    third.add_bot_code("prog",instructions)
+    assert third.bot_code["prog"] is fast.bot_code["prog"]
@@ -0,0 +1,75 @@
+#File_Map and the MAPPED_FILE bots built on it
+import pytest
+
+from cell_bots import File_Map
+from programs import make_simulation
+
+DATA = bytes(range(1,17))
+
+#asks the bot it spawns for the 2 bytes at offset 2, then the size
+ASKER = "@spawn {name} X+\n@put 0 X+\n@put 2 X+\n@put 2 X+\n@put 2 X+\nput Q r0\nput Q r1\ndone:\njmp done\n"
+
+@pytest.fixture
+def data_path(tmp_path):
+    path = tmp_path / "data.bin"
+    path.write_bytes(DATA)
+    return str(path)
+
+@pytest.mark.parametrize("width",range(1,9))
+def test_read_widths(data_path,width):
+    file_map = File_Map(data_path)
+    assert file_map.read(3,width) == int.from_bytes(DATA[3:3 + width],"little")
+    assert file_map.read(len(DATA) - width,width) == int.from_bytes(DATA[-width:],"little")
+    file_map.close()
+
+@pytest.mark.parametrize("offset,width",[(-1,1),(16,1),(12,8),(0,0),(0,9)])
+def test_out_of_range_reads(data_path,offset,width):
+    file_map = File_Map(data_path)
+    assert file_map.read(offset,width) == -1
+    file_map.close()
+
+def test_read_only_maps_drop_writes(data_path):
+    file_map = File_Map(data_path)
+    file_map.write(0,4,0xFFFFFFFF)
+    assert file_map.read(0,4) == int.from_bytes(DATA[:4],"little")
+    file_map.close()
+    with open(data_path,"rb") as file_handle:
+        assert file_handle.read() == DATA
+
+def test_writes_reach_the_file(data_path):
+    file_map = File_Map(data_path,writable=True)
+    file_map.write(4,2,0x12345)
+    file_map.write(15,2,1)
+    assert file_map.read(4,2) == 0x2345
+    file_map.close()
+    with open(data_path,"rb") as file_handle:
+        assert file_handle.read() == DATA[:4] + b"\x45\x23" + DATA[6:]
+
+def test_empty_files(tmp_path):
+    path = tmp_path / "empty.bin"
+    path.write_bytes(b"")
+    file_map = File_Map(str(path),writable=True)
+    assert file_map.size == 0
+    assert file_map.read(0,1) == -1
+    file_map.write(0,1,7)
+    file_map.close()
+    assert path.read_bytes() == b""
+
+def test_mapped_file_bot(data_path):
+    sim = make_simulation(extra={"asker":ASKER.format(name="DATA")})
+    sim.map_file("DATA",data_path)
+    sim.register_bot("asker",(0,0))
+    for _ in range(40):
+        sim.tick()
+    assert sim.bot_grid[(0,0)].registers == [int.from_bytes(DATA[2:4],"little"),len(DATA)]
+    file_map = sim.file_maps["DATA"]
+    sim.close()
+    assert file_map.file_handle.closed
+
+def test_spawned_by_its_own_name():
+    #no file was mapped for it, so it acts as an empty one
+    sim = make_simulation(extra={"asker":ASKER.format(name="MAPPED_FILE")})
+    sim.register_bot("asker",(0,0))
+    for _ in range(40):
+        sim.tick()
+    assert sim.bot_grid[(0,0)].registers == [-1,0]
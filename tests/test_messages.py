@@ -0,0 +1,63 @@
+#message TTLs, on both transports
+import pytest
+
+import cell_bots
+from programs import make_simulation
+
+BACKENDS = ["python",pytest.param("numpy",marks=pytest.mark.skipif(cell_bots.numpy is None,reason="needs numpy"))]
+
+RECEIVER = "put Q r0\nloop:\njmp loop\n"
+
+def sender(ttl):
+    return f"@ttl {ttl}\nput 7 X+\nloop:\njmp loop\n"
+
+def received(message_backend,ttl,distance,ticks=30):
+    #whether a receiver distance cells along X+ gets the sender's message
+    sim = make_simulation(extra={"sender":sender(ttl),"receiver":RECEIVER},message_backend=message_backend)
+    sim.register_bot("sender",(0,0))
+    sim.register_bot("receiver",(distance,0))
+    for _ in range(ticks):
+        sim.tick()
+    return sim.bot_grid[(distance,0)].registers[0] == 7
+
+@pytest.mark.parametrize("message_backend",BACKENDS)
+@pytest.mark.parametrize("ttl",[1,2,5])
+def test_message_moves_ttl_times(message_backend,ttl):
+    #sent into the next cell, then ttl moves before it expires
+    assert received(message_backend,ttl,ttl + 1)
+    assert not received(message_backend,ttl,ttl + 2)
+
+@pytest.mark.parametrize("message_backend",BACKENDS)
+def test_expired_messages_are_dropped(message_backend):
+    sim = make_simulation(extra={"sender":sender(3)},message_backend=message_backend)
+    sim.register_bot("sender",(0,0))
+    #@ttl runs first, the message is sent on the second tick
+    for _ in range(2):
+        sim.tick()
+    for _ in range(3):
+        assert len(sim.messages) == 1
+        sim.tick()
+    assert len(sim.messages) == 0
+
+@pytest.mark.parametrize("message_backend",BACKENDS)
+def test_ttl_zero_never_expires(message_backend):
+    assert received(message_backend,0,400,ticks=420)
+    sim = make_simulation(message_backend=message_backend)
+    sim.register_message((1,0),(1,0),5)
+    sim.register_message((0,1),(0,1),6,ttl=0)
+    for _ in range(1000):
+        sim.tick()
+    assert sorted(value for _,_,value,_,_ in sim.messages) == [5,6]
+
+@pytest.mark.parametrize("message_backend",BACKENDS)
+def test_flood_stays_bounded(message_backend):
+    #a bot sending forever into empty space only ever has ttl ticks of
+    #   messages in flight
+    flood = "@ttl 4\nloop:\nput 1 X+\nput 2 Y+\njmp loop\n"
+    sim = make_simulation(extra={"flood":flood},message_backend=message_backend)
+    sim.register_bot("flood",(0,0))
+    peak = 0
+    for _ in range(500):
+        sim.tick()
+        peak = max(peak,len(sim.messages))
+    assert peak <= 5
@@ -0,0 +1,52 @@
+#Instruction_Set.parse_instruction, @ and +/- prefixes alone or glued on
+import pytest
+
+from cell_bots import Instruction_Set
+
+#every spelling of one line, all must parse to the same instruction
+SPELLINGS = [
+    ["put 1 r0"],
+    ["@put 1 r0","@ put 1 r0"],
+    ["+put 1 r0","+ put 1 r0"],
+    ["-teq 2 1","- teq 2 1"],
+    ["@+put 1 r0","@+ put 1 r0","@ +put 1 r0","@ + put 1 r0"],
+    ["@-teq 2 1","@- teq 2 1","@ -teq 2 1","@ - teq 2 1"],
+    ["@+jmp end","@ + jmp end"],
+]
+
+def parse(line):
+    return Instruction_Set().parse_instruction(line.split())
+
+@pytest.mark.parametrize("spellings",SPELLINGS,ids=lambda spellings: spellings[0])
+def test_prefix_spellings(spellings):
+    records = [parse(line).to_record()[:4] for line in spellings]
+    assert all(record == records[0] for record in records)
+
+def test_prefix_flags():
+    act = parse("@ -teq 2 1")
+    assert act.is_init and act.is_cond and act.cond_type is False
+    assert act.instr_type == "teq"
+    act = parse("@+put 1 r0")
+    assert act.is_init and act.cond_type is True
+    assert act.args == [["I",1],["R",0]]
+
+def test_repr_compiles_back():
+    #__repr__ writes prefixes glued on, the same text must compile again
+    for line in ("@+put 1 r0","@-teq 2 1","+put 1 r0","@put 1 r0"):
+        prefix = repr(parse(line)).split()[0]
+        assert prefix == line.split()[0]
+        assert parse(line).to_record() == parse(f"{prefix} {' '.join(line.split()[1:])}").to_record()
+
+@pytest.mark.parametrize("line",["@","@ +","+","@+"])
+def test_prefix_without_instruction(line):
+    with pytest.raises(ValueError):
+        parse(line)
+
+def test_unknown_instruction():
+    with pytest.raises(ValueError,match="Unimplemented instruction 'frob'"):
+        parse("@+frob 1")
+
+def test_program_with_prefixes():
+    instructions = Instruction_Set()
+    instructions.compile("@+ put 1 r0\n@-teq 2 1\nstart:\n  + jmp start\n  @ nop\n".splitlines(True))
+    assert [repr(act).split()[0] for act in instructions.instructions] == ["@+put","@-teq","+jmp","@nop"]
@@ -0,0 +1,94 @@
+#dead Cell_Bots are restarted from Simulation.bot_pool, which must not be
+#   visible in anything the run does
+import collections
+import io
+
+import pytest
+
+from cell_bots import Observer
+from programs import make_simulation, snapshot
+
+#spawns and deaths every tick, and bots that exec into each other or into
+#   a sys bot
+CHURN = {"spawner": "loop:\nspawn blip Y+\nput 1 X+\njmp loop\n",
+         "blip": "put 7 r1\nadd r1 1 r1\ndie\n",
+         "ping": "add r0 1 r0\nexec pong\n",
+         "pong": "put 3 r1\nput 4 r0\nexec ping\n",
+         "waiter": "put Q r0\nput Q r1\nexec ping\n",
+         "gun": "@put 5 r0\nloop:\nput r0 Y-\nspawn waiter X+\nsub r0 1 r0\ntgt r0 0\n+jmp loop\nexec spawner\n",
+         "mover": "loop:\nmove\nspawn blip X-\nflip\njmp loop\n",
+         "writer": "put 1 r0\nexec STDOUT\n"}
+
+class Spawn_Log(Observer):
+    def __init__(self):
+        self.ids = []
+        #held on to, so an unpooled run can't reuse their memory either
+        self.objects = {}
+
+    def spawned(self,sim,bot):
+        self.ids.append(bot.id)
+        self.objects[id(bot)] = bot
+
+def churn(pool_limit,ticks=150,**sim_args):
+    sim = make_simulation(extra=CHURN,**sim_args)
+    sim.bot_pool_limit = pool_limit
+    sim.stdout = io.BytesIO()
+    log = Spawn_Log()
+    sim.observers.append(log)
+    for i,bot_name in enumerate(["spawner","ping","gun","mover","waiter","pong","writer"]):
+        sim.register_bot(bot_name,(i * 3,i % 2))
+    states = []
+    for _ in range(ticks):
+        sim.tick()
+        live = collections.Counter(bot.bot_name for bot in sim.bot_grid.values())
+        assert {name: count for name,count in sim.bot_type_counts.items() if count} == dict(live)
+        states.append(snapshot(sim))
+    return sim,log,states
+
+@pytest.mark.parametrize("sim_args",[{},{"fast_forward":6},{"jit":True}])
+def test_pooled_run_matches_unpooled(sim_args):
+    _,unpooled_log,unpooled = churn(0,**sim_args)
+    sim,log,pooled = churn(1 << 16,**sim_args)
+    assert pooled == unpooled
+    #ids only ever go up, pooled objects get new ones
+    assert log.ids == list(range(sim.bot_id_itr))
+    assert log.ids == unpooled_log.ids
+    assert len(log.objects) < len(unpooled_log.objects)
+
+def test_pool_limit():
+    sim,_,_ = churn(3)
+    assert len(sim.bot_pool) <= 3
+    sim,_,_ = churn(0)
+    assert not sim.bot_pool
+
+def test_reset_clears_bot_state():
+    sim = make_simulation(extra={"messy": "qmax 9\nttl 3\nadd Q Q r0\n","plain": "done:\njmp done\n"})
+    sim.register_bot("messy",(0,0))
+    sim.register_message((0,3),(0,-1),5)
+    for _ in range(5):
+        sim.tick()
+    bot = sim.bot_grid[(0,0)]
+    assert (bot.queue_size,bot.ttl,list(bot.arg_buffer),bot.waiting_for_mesg) == (9,3,[5],True)
+    bot.die()
+    sim.tick()
+    assert sim.bot_pool == [bot]
+
+    sim.register_bot("plain",(5,5))
+    assert sim.bot_grid[(5,5)] is bot
+    assert (bot.bot_name,bot.queue_size,bot.q_len,bot.ttl,bot.waiting_for_mesg,bot.remaining_args) == ("plain",4,0,255,False,0)
+    assert not bot.arg_buffer
+    assert bot.registers == [0,0] and bot.executed_inits == 0
+    assert bot.id == 1 and sim.runnable[1] is bot
+
+def test_exec_into_a_sys_bot_respects_the_limit():
+    #the sys bot can't reuse the object, so it waits for the tick to end
+    #   like any other death and the limit applies
+    sim = make_simulation(extra={"writer": CHURN["writer"]})
+    sim.stdout = io.BytesIO()
+    sim.bot_pool_limit = 0
+    sim.register_bot("writer",(0,0))
+    writer = sim.bot_grid[(0,0)]
+    sim.tick()
+    sim.tick()
+    assert sim.bot_grid[(0,0)].bot_name == "WRITE_FILE"
+    assert writer.dead and not sim.bot_pool
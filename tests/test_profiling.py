@@ -0,0 +1,44 @@
+#the profiler rides along in Simulation.tick, it must count without steering
+import pytest
+
+import profiling
+from programs import busy_simulation, snapshot
+
+TICKS = 60
+
+def build(**sim_args):
+    sim = busy_simulation(**sim_args)
+    sim.register_message((-5,-2),(0,-1),7)
+    for _ in range(TICKS):
+        sim.tick()
+    return sim
+
+@pytest.mark.parametrize("fast_forward",[0,6])
+def test_profiling_leaves_the_run_alone(fast_forward):
+    plain = build(fast_forward=fast_forward)
+    profiled = build(fast_forward=fast_forward,profiler=profiling.Profiler())
+    assert snapshot(profiled) == snapshot(plain)
+
+@pytest.mark.parametrize("fast_forward",[0,6])
+def test_counts_add_up(fast_forward):
+    profiler = profiling.Profiler()
+    sim = build(fast_forward=fast_forward,profiler=profiler)
+    assert profiler.ticks == TICKS
+    assert sum(profiler.spawns.values()) == sim.bot_id_itr
+    assert sum(profiler.deaths.values()) == sim.bot_id_itr - len(sim.bot_grid)
+    #every message sent is delivered, dropped, expired or still moving
+    sent = sum(profiler.sends.values()) + 1
+    gone = sum(profiler.deliveries.values()) + sum(profiler.drops.values()) + profiler.expired
+    assert profiler.expired > 0
+    assert sent == gone + len(sim.messages)
+    assert profiler.blocked_totals(sim)["waiter"] > 0
+    assert all(seconds >= 0 for seconds in profiler.phase_time.values())
+
+@pytest.mark.parametrize("fast_forward",[0,6])
+def test_run_ahead_is_counted_per_instruction(fast_forward):
+    #the shouter's adds run ahead with fast_forward, r0 counts them too
+    profiler = profiling.Profiler()
+    sim = build(fast_forward=fast_forward,profiler=profiler)
+    shouter = sim.bot_grid[(-20,0)]
+    assert shouter.instruction_list[1].instr_type == "add"
+    assert profiler.executions[("shouter",1)] == shouter.registers[0]
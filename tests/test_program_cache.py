@@ -0,0 +1,71 @@
+#Program_Cache, warm loads and caches that can't be written
+import os
+import stat
+
+import pytest
+
+from cell_bots import Program_Cache
+
+SOURCE = "loop:\n@put 1 r0\nadd r0 1 r0\njmp loop\n".splitlines(True)
+
+def records(instructions):
+    return [act.to_record() for act in instructions.instructions]
+
+def test_warm_load(tmp_path):
+    cold = Program_Cache(str(tmp_path / "cache"))
+    first = cold.compile(SOURCE)
+    warm = Program_Cache(str(tmp_path / "cache"))
+    assert records(warm.compile(SOURCE)) == records(first)
+    assert (cold.misses,warm.hits) == (1,1)
+
+def test_cache_dir_is_a_file(tmp_path):
+    blocker = tmp_path / "cache"
+    blocker.write_text("not a directory")
+    cache = Program_Cache(str(blocker))
+    assert not cache.writable
+    assert records(cache.compile(SOURCE)) == records(Program_Cache(str(tmp_path / "other")).compile(SOURCE))
+
+@pytest.mark.skipif(hasattr(os,"geteuid") and os.geteuid() == 0,reason="root ignores directory permissions")
+def test_read_only_cache_dir(tmp_path):
+    cache_dir = tmp_path / "cache"
+    Program_Cache(str(cache_dir)).compile(SOURCE)
+    cache_dir.chmod(stat.S_IRUSR | stat.S_IXUSR)
+    try:
+        cache = Program_Cache(str(cache_dir))
+        cache.compile(SOURCE)
+        cache.compile("nop\n".splitlines(True))
+        assert cache.hits == 1 and not cache.writable
+    finally:
+        cache_dir.chmod(stat.S_IRWXU)
+
+def test_write_failure_falls_back(tmp_path,monkeypatch):
+    cache = Program_Cache(str(tmp_path / "cache"))
+    def refuse(*args,**kwargs):
+        raise PermissionError("read-only file system")
+    monkeypatch.setattr(os,"replace",refuse)
+    assert cache.compile(SOURCE).instructions
+    assert not cache.writable
+    assert not [name for name in os.listdir(tmp_path / "cache") if name.endswith(".tmp")]
+
+def test_eviction_lists_the_cache_only_when_full(tmp_path,monkeypatch):
+    cache = Program_Cache(str(tmp_path / "cache"),max_entries=3)
+    listings = []
+    listdir = os.listdir
+    def counting(path):
+        listings.append(path)
+        return listdir(path)
+    monkeypatch.setattr(os,"listdir",counting)
+    sources = [f"put {i} r0\n".splitlines(True) for i in range(5)]
+    for offset,code in enumerate(sources[:3]):
+        cache.compile(code)
+        #oldest first, whatever the file system's timestamp resolution
+        os.utime(cache.entry_path(code),(offset,offset))
+    cache.compile(sources[0])
+    assert listings == [] and cache.entry_count == 3
+
+    #the hit made the first entry the most recently used
+    cache.compile(sources[3])
+    assert len(listings) == 1
+    names = sorted(name for name in listdir(tmp_path / "cache") if name.endswith(".cbc"))
+    assert names == sorted(os.path.basename(cache.entry_path(sources[i])) for i in (0,2,3))
+    assert cache.entry_count == 3
@@ -0,0 +1,80 @@
+#bot message queues, a fixed capacity ring buffer resized by qmax
+import random
+import collections
+
+from programs import make_simulation
+
+IDLE = "loop:\njmp loop\n"
+
+def idle_bot(code=IDLE):
+    sim = make_simulation(extra={"idle":code})
+    sim.register_bot("idle",(0,0))
+    return sim,sim.bot_grid[(0,0)]
+
+def check(bot,model):
+    assert bot.queue_values() == list(model)
+    assert bot.q_len == len(model)
+
+def test_wraparound_keeps_fifo():
+    #against a deque that turns messages away when full
+    _,bot = idle_bot()
+    model = collections.deque()
+    rng = random.Random(3)
+    value = 0
+    for _ in range(2000):
+        if rng.random() < 0.55:
+            value += 1
+            accepted = bot.recv(value)
+            assert accepted == (len(model) < bot.queue_size)
+            if accepted:
+                model.append(value)
+        elif model:
+            assert bot.queue_pop() == model.popleft()
+        check(bot,model)
+    #the head went all the way round the buffer
+    assert value > 4 * bot.queue_size
+
+def test_qmax_keeps_order_across_the_wrap():
+    _,bot = idle_bot()
+    for value in range(1,5):
+        bot.recv(value)
+    bot.queue_pop()
+    bot.queue_pop()
+    bot.recv(5)
+    bot.recv(6)
+    assert bot.q_head != 0
+    bot.f_qmax(srcs=[6])
+    check(bot,[3,4,5,6])
+    assert bot.recv(7) and bot.recv(8) and not bot.recv(9)
+    check(bot,[3,4,5,6,7,8])
+    assert [bot.queue_pop() for _ in range(6)] == [3,4,5,6,7,8]
+
+def test_qmax_shrink_drops_newest():
+    _,bot = idle_bot()
+    for value in range(1,5):
+        bot.recv(value)
+    bot.f_qmax(srcs=[2])
+    check(bot,[1,2])
+    assert not bot.recv(5)
+    bot.f_qmax(srcs=[0])
+    check(bot,[])
+    assert not bot.recv(6)
+
+def test_qmax_is_clamped():
+    _,bot = idle_bot()
+    bot.f_qmax(srcs=[1000])
+    assert bot.queue_size == 255
+    bot.f_qmax(srcs=[-3])
+    assert bot.queue_size == 0
+
+def test_qmax_instruction_then_q_reads():
+    sim,bot = idle_bot("@qmax 8\nput Q r0\nloop:\nadd r0 Q r0\njmp loop\n")
+    sim.tick()
+    assert bot.queue_size == 8
+    assert all(bot.recv(value) for value in range(1,9))
+    assert not bot.recv(9)
+    for _ in range(40):
+        sim.tick()
+    #every queued message read and summed, then blocked on an empty queue
+    assert bot.registers[0] == sum(range(1,9))
+    assert bot.q_len == 0 and bot.id in sim.blocked
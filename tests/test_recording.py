@@ -0,0 +1,55 @@
+#frames rebuilt from a recording against the live simulation it recorded
+import io
+
+import pytest
+
+import profiling
+from recording import Recorder, Recording
+from state_hash import State_Hasher
+from programs import random_simulation
+
+def grid(sim):
+    return sorted((bot.coords,bot.id,bot.bot_name) for bot in sim.bot_grid.values()),sorted(map(repr,sim.messages))
+
+def frame_grid(frame):
+    return sorted((bot.coords,bot.id,bot.name) for bot in frame.grid.values()),sorted(map(repr,frame.message_list()))
+
+def record(sim,ticks,keyframe_every,between=None):
+    #grid at the start of every tick, and a Recording of the run
+    buffer = io.BytesIO()
+    recorder = Recorder(sim,buffer,keyframe_every=keyframe_every)
+    grids = {}
+    for _ in range(ticks):
+        if between is not None:
+            between(sim)
+        grids[sim.time] = grid(sim)
+        sim.tick()
+    grids[sim.time] = grid(sim)
+    recorder.close()
+    buffer.seek(0)
+    return grids,Recording(buffer)
+
+@pytest.mark.parametrize("dimensions",[1,2,3])
+@pytest.mark.parametrize("sim_args",[{},{"message_backend":"numpy"},{"jit":True,"fast_forward":8}])
+def test_frames_match_the_run(dimensions,sim_args):
+    sim = random_simulation(dimensions,dimensions,**sim_args)
+    for _ in range(5):
+        sim.tick()
+    grids,recording = record(sim,150,37)
+    for tick,expected in grids.items():
+        assert frame_grid(recording.frame(tick)) == expected
+
+@pytest.mark.parametrize("sim_args",[{},{"profiler":profiling.Profiler()},{"hasher":State_Hasher()}])
+def test_injected_kills_are_replayed(sim_args):
+    #kill messages and spawns from outside between ticks, next to the
+    #   profiler and hasher observers
+    def between(sim):
+        if sim.time % 7 == 0:
+            sim.register_message((sim.time % 13 - 6,sim.time % 5 - 2),(1,0),5,kill=sim.time % 2 == 0)
+            coords = (sim.time % 11 - 5,sim.time % 9 - 4)
+            if coords not in sim.bot_grid:
+                sim.register_bot("random_1",coords)
+    sim = random_simulation(7,**sim_args)
+    grids,recording = record(sim,120,10,between)
+    for tick,expected in grids.items():
+        assert frame_grid(recording.frame(tick)) == expected
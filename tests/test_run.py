@@ -0,0 +1,23 @@
+#Simulation.run, why it stops and what it leaves behind
+import io
+
+from programs import make_simulation
+
+#prints "hi" then blocks on a Q read nothing will ever fill
+PRINT_AND_WAIT = "@spawn STDOUT X+\nput 104 X+\nput 105 X+\nput 10 X+\nput Q r0\n"
+
+def test_quiescent_run_flushes_output():
+    sim = make_simulation(extra={"hi":PRINT_AND_WAIT})
+    sim.stdout = io.BytesIO()
+    sim.register_bot("hi",(0,0))
+    result = sim.run()
+    assert result.reason == "quiescent"
+    assert sim.stdout.getvalue() == b"hi\n"
+
+def test_budget_stop_flushes_output():
+    sim = make_simulation(extra={"hi":PRINT_AND_WAIT})
+    sim.stdout = io.BytesIO()
+    sim.register_bot("hi",(0,0))
+    result = sim.run(max_ticks=5)
+    assert result.reason == "max_ticks" and result.ticks == 5
+    assert sim.stdout.getvalue() == b"hi\n"
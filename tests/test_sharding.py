@@ -0,0 +1,77 @@
+#a sharded run must be the single process run, tick for tick
+import io
+
+import pytest
+
+import sharding
+from programs import make_simulation, load_programs, populate, compile_program
+
+#spawns both ways and moves, so bots keep crossing slab boundaries
+SPAWNER = "@put 0 r0\nspawn spawn_and_wait DIR\nflip\nl: add r0 1 r0\ntlt r0 6\n+jmp l\nmove\nspawn 1_2_list X-\nput 4 X-\nput 0 r0\n"
+
+def fill(sim,seed):
+    sim.add_bot_code("spawner",compile_program(SPAWNER))
+    populate(sim,seed,bots=30)
+    for i in range(3):
+        sim.register_bot("spawner",(20 + i * 3,) + (0,) * (sim.dimensions - 1))
+
+def single_state(sim):
+    bots = sorted((bot.coords,bot.bot_name,bot.id,bot.instr_ptr,tuple(bot.registers),bot.cond_state,bot.heading,
+                   tuple(bot.queue_values()),bot.waiting_for_mesg) for bot in sim.bot_grid.values())
+    return bots,sorted((coords,velocity,value,expires) for coords,velocity,value,kill,expires in sim.messages)
+
+def sharded_state(sim):
+    bots,messages,_ = sim.snapshot()
+    return sorted(bots),sorted((coords,velocity,value,expires) for _,coords,velocity,value,expires in messages)
+
+@pytest.mark.parametrize("seed,dimensions,workers,slab_width,sim_args",[
+    (0,1,2,1,{}),
+    (1,2,3,3,{}),
+    (2,3,4,2,{}),
+    (3,2,2,1,{"message_backend":"numpy"}),
+    (0,2,3,2,{"fast_forward":8,"jit":True}),
+])
+def test_matches_single_process(seed,dimensions,workers,slab_width,sim_args):
+    single = make_simulation(dimensions,**sim_args)
+    fill(single,seed)
+    sharded = sharding.Sharded_Simulation(dimensions,2,workers=workers,slab_width=slab_width,**sim_args)
+    load_programs(sharded)
+    fill(sharded,seed)
+    try:
+        for tick in range(150):
+            assert sharded_state(sharded) == single_state(single),tick
+            single.tick()
+            sharded.tick()
+    finally:
+        sharded.close()
+
+def run_to_end(sim,bot_name):
+    sim.stdout = io.StringIO()
+    sim.register_bot(bot_name,(0,0))
+    result = sim.run(max_ticks=10000)
+    return sim.stdout.getvalue(),result.exit_code
+
+@pytest.mark.parametrize("bot_name",["hello_world","main_list_test"])
+def test_output_matches_single_process(bot_name):
+    expected = run_to_end(make_simulation(),bot_name)
+    sharded = sharding.Sharded_Simulation(2,2,workers=3,slab_width=2)
+    load_programs(sharded)
+    try:
+        assert run_to_end(sharded,bot_name) == expected
+    finally:
+        sharded.close()
+
+def test_stdin_spawn_stops_cleanly():
+    sharded = sharding.Sharded_Simulation(2,2,workers=2,slab_width=2)
+    load_programs(sharded)
+    sharded.add_bot_code("reader",compile_program("spawn STDIN X+\n"))
+    sharded.register_bot("reader",(3,0))
+    with pytest.raises(sharding.Sharding_Error,match="STDIN"):
+        sharded.run(max_ticks=10)
+    assert not any(process.is_alive() for process in sharded.processes)
+
+def test_stdin_refused_up_front():
+    sharded = sharding.Sharded_Simulation(2,2,workers=2)
+    load_programs(sharded)
+    with pytest.raises(sharding.Sharding_Error):
+        sharded.register_bot("STDIN",(0,0))
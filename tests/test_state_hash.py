@@ -0,0 +1,85 @@
+#the hasher follows a simulation through observer hooks, so its running hash
+#   has to match one taken from scratch, and skipping has to match ticking
+import pytest
+
+import profiling
+from state_hash import State_Hasher
+from programs import make_simulation, random_simulation, snapshot
+
+#a ping pong pair and a spawner whose children die, the state repeats every
+#   1870 ticks from tick 1885 on
+PROGRAMS = {"ping": "@put 1 X+\nl:\nput Q r0\nadd r0 1 r0\nput r0 X+\njmp l\n",
+            "pong": "l:\nput Q r0\ntgt r0 5\n+put 0 r0\nput r0 X-\njmp l\n",
+            "spawner": "l:\nspawn blip X+\nput 3 r1\nw:\nsub r1 1 r1\nteq r1 0\n-jmp w\njmp l\n",
+            "blip": "put 9 Y+\nttl 4\nput 8 Y-\nput 1 r0\ndie\n",
+            "waiter": "put Q r0\nput Q r1\n"}
+
+def build(**sim_args):
+    sim = make_simulation(extra=PROGRAMS,**sim_args)
+    sim.register_bot("ping",(0,0))
+    sim.register_bot("pong",(6,0))
+    sim.register_bot("spawner",(0,10))
+    sim.register_bot("waiter",(1,13))
+    return sim
+
+def fresh_hash(sim):
+    hasher = State_Hasher()
+    for bot in sim.bot_grid.values():
+        hasher.touched(bot)
+    return hasher.state_hash(sim)
+
+@pytest.mark.parametrize("sim_args",[{},{"message_backend":"numpy"},{"jit":True}])
+def test_running_hash_matches_fresh(sim_args):
+    hasher = State_Hasher()
+    sim = random_simulation(3,hasher=hasher,**sim_args)
+    for _ in range(80):
+        sim.tick()
+        assert hasher.value == fresh_hash(sim)
+
+def test_equal_states_hash_equal():
+    values = set()
+    for sim_args in ({},{"message_backend":"numpy"},{"jit":True}):
+        hasher = State_Hasher()
+        sim = build(hasher=hasher,**sim_args)
+        for _ in range(77):
+            sim.tick()
+        values.add(hasher.state_hash(sim))
+    assert len(values) == 1
+
+@pytest.mark.parametrize("ticks",[12345,40001])
+def test_skipping_matches_ticking(ticks):
+    hasher = State_Hasher(skip_cycles=True)
+    skipped = build(hasher=hasher)
+    result = skipped.run(max_ticks=ticks)
+    assert result.reason == "max_ticks"
+    assert result.period == hasher.cycle[1]
+    ticked = build()
+    for _ in range(ticks):
+        ticked.tick()
+    assert snapshot(skipped) == snapshot(ticked)
+
+def test_cycle_stops_run():
+    hasher = State_Hasher()
+    sim = build(hasher=hasher)
+    result = sim.run(max_ticks=10000)
+    assert result.reason == "cycle"
+    start,period = hasher.cycle
+    assert (start,period) == (1885,1870)
+    assert sim.time == start + period
+
+def test_hashed_and_profiled():
+    hasher = State_Hasher(skip_cycles=True)
+    profiler = profiling.Profiler()
+    sim = build(hasher=hasher,profiler=profiler)
+    alone = build(hasher=State_Hasher())
+    for _ in range(4000):
+        sim.tick()
+        alone.tick()
+    assert hasher.value == alone.hasher.value
+    assert profiler.ticks == 4000
+    #the profiler would miss skipped ticks
+    assert hasher.cycle is not None and not hasher.can_skip(sim)
+
+def test_fast_forward_is_refused():
+    with pytest.raises(ValueError):
+        build(hasher=State_Hasher(),fast_forward=4)
@@ -0,0 +1,32 @@
+#traces of the bots a Tracer was asked for
+import io
+import json
+
+import pytest
+
+from tracing import Tracer, Jsonl_Sink
+from programs import make_simulation, WAITER
+
+def traced(**tracer_args):
+    output = io.StringIO()
+    sim = make_simulation(extra={"waiter":WAITER},tracer=Tracer(Jsonl_Sink(output),**tracer_args))
+    sim.register_bot("count_to_ten",(0,0))
+    sim.register_bot("waiter",(0,5))
+    sim.run(max_ticks=10)
+    return [json.loads(line) for line in output.getvalue().splitlines()]
+
+def test_bot_ids_include_blocked_bots():
+    records = traced(bot_ids=[1])
+    assert [record["tick"] for record in records] == list(range(10))
+    assert all(record["bot"] == "waiter" for record in records)
+    assert records[-1]["waiting"]
+
+def test_bot_names():
+    records = traced(bot_names=["count_to_ten"],every=3)
+    assert [record["tick"] for record in records] == [0,3,6,9]
+    assert all(record["id"] == 0 for record in records)
+
+def test_fast_forward_is_refused():
+    #bots that ran ahead are missing from runnable and blocked
+    with pytest.raises(ValueError):
+        make_simulation(fast_forward=8,tracer=Tracer(Jsonl_Sink(io.StringIO()),bot_ids=[0]))
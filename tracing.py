@@ -0,0 +1,91 @@
+#Sampled tracing of simulation state
+#   nothing here runs unless a Tracer is handed to Simulation, and a Tracer
+#   only builds records on the ticks, bots and sinks it was asked for
+import json
+import logging
+
+class Tracer:
+    def __init__(self,sink,every=1,bot_ids=None,bot_names=None):
+        self.sink = sink
+        self.every = every
+        self.bot_ids = None if bot_ids is None else set(bot_ids)
+        self.bot_names = None if bot_names is None else set(bot_names)
+
+    def check_simulation(self,sim):
+        #a bot that ran ahead is in neither runnable nor blocked and its
+        #   registers are already ticks in the future
+        if sim.fast_forward:
+            raise ValueError("Tracing can't follow bots that run ahead, turn fast_forward off")
+
+    def wants(self,time):
+        return time % self.every == 0 and self.sink.enabled()
+
+    def selected_bots(self,sim):
+        if self.bot_ids is not None:
+            #look selected ids up directly instead of scanning the grid
+            bots = []
+            for bot_id in sorted(self.bot_ids):
+                bot = sim.runnable.get(bot_id) or sim.blocked.get(bot_id)
+                if bot is not None:
+                    bots.append(bot)
+        else:
+            bots = sim.bot_grid.values()
+
+        if self.bot_names is not None:
+            bots = [bot for bot in bots if bot.bot_name in self.bot_names]
+        return bots
+
+    def trace(self,sim):
+        records = [bot_record(sim.time,bot) for bot in self.selected_bots(sim)]
+        self.sink.write(sim.time,records)
+
+def bot_record(time,bot):
+    return {
+        "tick": time,
+        "id": bot.id,
+        "bot": bot.bot_name,
+        "ip": bot.instr_ptr,
+        "instr": repr(bot.instruction_list[bot.instr_ptr]),
+        "registers": list(bot.registers),
+        "queue": bot.queue_values(),
+        "arg_buffer": list(bot.arg_buffer or ()),
+        "coords": list(bot.coords),
+        "heading": list(bot.heading),
+        "waiting": bot.waiting_for_mesg,
+    }
+
+class Jsonl_Sink:
+    #one JSON object per traced bot per sampled tick
+    def __init__(self,file_handle):
+        self.file_handle = file_handle
+
+    def enabled(self):
+        return True
+
+    def write(self,time,records):
+        for record in records:
+            self.file_handle.write(json.dumps(record))
+            self.file_handle.write("\n")
+
+    def close(self):
+        self.file_handle.flush()
+
+class Logging_Sink:
+    #the old print_summary layout, only built when the logger would emit it
+    def __init__(self,logger=None,level=logging.DEBUG):
+        self.logger = logger or logging.getLogger()
+        self.level = level
+
+    def enabled(self):
+        return self.logger.isEnabledFor(self.level)
+
+    def write(self,time,records):
+        self.logger.log(self.level,"Step %s:",time)
+        for record in records:
+            self.logger.log(self.level,"\t%s id:%s ip@%s R:%s Q:%s coords:%s arg_buf:%s",
+                record["bot"],record["id"],record["ip"],record["registers"],
+                record["queue"],record["coords"],record["arg_buffer"])
+            self.logger.log(self.level,"\t\t%s",record["instr"])
+
+    def close(self):
+        pass